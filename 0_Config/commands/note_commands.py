@@ -1,11 +1,14 @@
 import argparse
 import os
 import sys
+import time
 
 # Modularized Logic Imports
 from ..logic.note_core import create_atomic_note, edit_existing_note
 from ..logic.note_metadata import update_note_metadata, propagate_rename
 from ..logic.note_batch import execute_integration_plan
+from ..logic.note_history import compact_note_history, compact_all_history
+from ..logic.commit_queue import pending_commits, flush_commits, run_committer, get_commit_mode
 from ..utils.command_utils import execute_script
 
 def add_note_parser(subparsers):
@@ -40,6 +43,16 @@ def add_note_parser(subparsers):
     rename_parser.add_argument("file_path", help="The current path to the Markdown note.")
     rename_parser.add_argument("new_name", help="The new filename (without .md extension).")
 
+    # compact-history command
+    compact_parser = note_subparsers.add_parser("compact-history", help="Regenerates the readable =3_Archived/<note>_History.md views from the history segments.")
+    compact_parser.add_argument("note_name", nargs="?", help="Note name (without .md). Default: every note whose view is missing versions.")
+    compact_parser.add_argument("--rebuild", action="store_true", help="Regenerate the views from every archived version (discards manual edits to them).")
+
+    # commits command
+    commits_parser = note_subparsers.add_parser("commits", help="Shows or flushes the queue of pending Git commits.")
+    commits_parser.add_argument("--flush", action="store_true", help="Commit every queued change now and wait for Git.")
+    commits_parser.add_argument("--run-committer", metavar="TOKEN", help=argparse.SUPPRESS)
+
 
 def handle_note_commands(args):
     if args.note_command == "prepend-update":
@@ -68,4 +81,20 @@ def handle_note_commands(args):
         success, report = execute_integration_plan(args.plan, args.source)
         return success, report
 
+    elif args.note_command == "compact-history":
+        if args.note_name:
+            return compact_note_history(args.note_name, rebuild=args.rebuild)
+        return compact_all_history(rebuild=args.rebuild)
+
+    elif args.note_command == "commits":
+        if args.run_committer:
+            return run_committer(args.run_committer)
+        if args.flush:
+            return flush_commits()
+        pending = pending_commits()
+        lines = [f"{len(pending)} queued commit(s) ({get_commit_mode()} mode)."]
+        for files, message, queued in pending:
+            lines.append(f"  - {message} ({len(files)} files, queued {time.strftime('%H:%M:%S', time.localtime(queued))})")
+        return True, "\n".join(lines)
+
     return False, "Unknown note command."
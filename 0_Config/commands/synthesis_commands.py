@@ -10,9 +10,12 @@ import glob # For cleaning up files
 
 # Modularized Logic Imports
 from ..logic.synthesis import run_preliminary_workflow, run_critique_workflow, run_combine_workflow, run_refinement_workflow
-from ..logic.synthesis.final import run_final_workflow, extract_keywords_agent
+from ..logic.synthesis.final import run_final_workflow, extract_keywords
+from ..utils.keyword_extractor import KEYWORDS_ENGINES, set_keywords_engine
 from ..logic.synthesis.integrate import run_integrate_workflow
 from ..logic.synthesis.init import run_init_workflow
+from ..logic.synthesis.batch import run_batch_workflow, get_batch_dir, is_batch_active, DEFAULT_BATCH_WORKERS
+from ..logic.synthesis.workspace import get_runs_root, resolve_run_dir, remove_run_dir, write_run_file, run_dir_of, is_run_removable, DEFAULT_MAX_AGE_HOURS
 
 # Modularized Prompt Imports (Still needed for final/integrate/init)
 from ..prompts import synthesis_prompts, critique_prompts
@@ -44,6 +47,7 @@ def add_synthesis_parser(subparsers):
     final_parser.add_argument("preliminary", help="Path to the preliminary synthesis file.")
     final_parser.add_argument("--keywords", help="Optional: Comma-separated keywords to trigger internal RAG and Final Note prompt.")
     final_parser.add_argument("--source", help="Optional: Path to the original source fleeting note.")
+    final_parser.add_argument("--keywords-engine", choices=KEYWORDS_ENGINES, help="Optional: How keywords are extracted when --keywords is not given: agent (Sub-Agent, default), local (offline RAKE/TF-IDF) or hybrid (local, agent when unsure).")
     final_parser.add_argument("--skip-rag", action="store_true", help="Optional: Skip RAG generation and use existing consolidated_rag_context.md.")
 
     # integrate command (Generator for Safe Integration)
@@ -51,6 +55,7 @@ def add_synthesis_parser(subparsers):
     integrate_parser.add_argument("source", help="The idea (raw content) or path to SYNTH-... note.")
     integrate_parser.add_argument("--keywords", help="Optional: Comma-separated keywords to trigger internal RAG and Integration prompt.")
     integrate_parser.add_argument("--tags", help="Optional: Initial tags to suggest.")
+    integrate_parser.add_argument("--keywords-engine", choices=KEYWORDS_ENGINES, help="Optional: How keywords are extracted when --keywords is not given: agent (Sub-Agent, default), local (offline RAKE/TF-IDF) or hybrid (local, agent when unsure).")
 
     # combine command
     combine_parser = synthesis_subparsers.add_parser("combine", help="Combines multiple preliminary synthesis files into one.")
@@ -58,15 +63,26 @@ def add_synthesis_parser(subparsers):
 
     # init command
     init_parser = synthesis_subparsers.add_parser("init", help="Executes the full synthesis workflow from input to knowledge integration.")
-    init_parser.add_argument("--source", required=True, help="Path to input file or direct content for the full synthesis workflow.")
+    init_source_group = init_parser.add_mutually_exclusive_group(required=True)
+    init_source_group.add_argument("--source", help="Path to input file or direct content for the full synthesis workflow.")
+    init_source_group.add_argument("--batch", help="Directory or glob of source files; runs them concurrently and applies their plans one at a time.")
     init_parser.add_argument("--input-mode", choices=['direct', 'reference'], default='direct', help="How to handle the source input.")
-    init_parser.add_argument("--resume", action="store_true", help="Optional: Resume from existing state recorder.")
+    init_parser.add_argument("--resume", action="store_true", help="Optional: Resume from the first incomplete step of the journaled run.")
+    init_parser.add_argument("--keywords-engine", choices=KEYWORDS_ENGINES, help="Optional: How keywords are extracted for RAG retrieval: agent (Sub-Agent, default), local (offline RAKE/TF-IDF) or hybrid (local, agent when unsure).")
+    init_parser.add_argument("--overlap", action="store_true", help="Optional: Run keyword extraction and RAG retrieval per verified chunk while preliminary synthesis continues.")
+    init_parser.add_argument("--parallel", type=int, default=DEFAULT_BATCH_WORKERS, help=f"Optional: Sources processed concurrently with --batch (default {DEFAULT_BATCH_WORKERS}).")
+    init_parser.add_argument("--stop-after", choices=["plan"], help="Optional: Stop once the integration plan is journaled (used by --batch).")
+    init_parser.add_argument("--run-dir", help="Optional: Run directory to use instead of a new one under $GEMINI_TEMP_DIR/runs/ (used by --batch).")
 
     # cleanup command
-    cleanup_parser = synthesis_subparsers.add_parser("cleanup", help="Deletes temporary synthesis artifacts (preliminary files, consolidated context, integration plans).")
+    cleanup_parser = synthesis_subparsers.add_parser("cleanup", help="Deletes temporary synthesis artifacts of finished or abandoned runs (or only --run).")
+    cleanup_parser.add_argument("--run", help="Optional: Remove only this run directory (must be under $GEMINI_TEMP_DIR/runs/).")
+    cleanup_parser.add_argument("--older-than", type=float, default=DEFAULT_MAX_AGE_HOURS, help=f"Optional: Remove unfinished runs idle for more than this many hours (default {DEFAULT_MAX_AGE_HOURS}).")
 
 
 def handle_synthesis_commands(args):
+    if getattr(args, "keywords_engine", None):
+        set_keywords_engine(args.keywords_engine) # Inherited by --batch subprocesses
     if args.synthesis_command == "preliminary":
         # Mode Selection based on arguments
         if args.source and args.draft and args.report:
@@ -102,15 +118,16 @@ def handle_synthesis_commands(args):
         except Exception as e:
             return False, f"Error reading preliminary file: {e}"
 
+        # Artifacts go to the run that produced the preliminary file (or a new run)
+        run_dir = resolve_run_dir(near=preliminary_file, label="final")
+        rag_output_path = os.path.join(run_dir, "consolidated_rag_context.md")
+
         if skip_rag:
              # Stage 2 (Skip RAG): Use existing context
-            temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-            rag_output_path = os.path.join(temp_dir, "consolidated_rag_context.md")
-            
             if not os.path.exists(rag_output_path):
                  return False, f"Error: --skip-rag used but {rag_output_path} not found."
 
-            success, final_path = run_final_workflow(preliminary_file, rag_output_path)
+            success, final_path = run_final_workflow(preliminary_file, rag_output_path, run_dir=run_dir)
             if success:
                 return True, f"Final Synthesis Note Generated: {final_path}\n\nNEXT STEP: synthesis integrate \"{final_path}\""
             else:
@@ -122,7 +139,7 @@ def handle_synthesis_commands(args):
 
         if not keywords:
             print("Auto-extracting keywords...")
-            keywords = extract_keywords_agent(preliminary_file)
+            keywords = extract_keywords(preliminary_file)
             if not keywords:
                 keywords = "PKM" # Fallback
             print(f"Keywords: {keywords}")
@@ -131,16 +148,13 @@ def handle_synthesis_commands(args):
         print(f"Generating RAG context for refinement using keywords: {keywords}")
         from .rag_commands import handle_rag_commands
         
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        rag_output_path = os.path.join(temp_dir, "consolidated_rag_context.md")
-        
         # We explicitly ask for output to a file
         success_rag, rag_msg = handle_rag_commands(argparse.Namespace(rag_command="prepare-context", keywords=keywords, source=None, output=rag_output_path, limit=10))
 
         if not success_rag:
             return False, f"RAG preparation failed: {rag_msg}"
 
-        success, final_path = run_final_workflow(preliminary_file, rag_output_path)
+        success, final_path = run_final_workflow(preliminary_file, rag_output_path, run_dir=run_dir)
         if success:
             return True, f"Final Synthesis Note Generated: {final_path}\n\nNEXT STEP: synthesis integrate \"{final_path}\""
         else:
@@ -162,16 +176,15 @@ def handle_synthesis_commands(args):
             input_content = source
             source_note_path = None
 
+        run_dir = resolve_run_dir(near=source_note_path, label="integrate")
+
         if not keywords:
             print("Auto-extracting keywords...")
             kw_source_path = source_note_path
             if not kw_source_path:
-                temp_kw_file = os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), "temp_kw_source.md")
-                with open(temp_kw_file, 'w', encoding='utf-8') as f:
-                     f.write(input_content)
-                kw_source_path = temp_kw_file
+                kw_source_path = write_run_file(run_dir, "kw_source", input_content)
             
-            keywords = extract_keywords_agent(kw_source_path)
+            keywords = extract_keywords(kw_source_path)
             if not keywords:
                  keywords = "PKM"
             print(f"Keywords: {keywords}")
@@ -180,8 +193,7 @@ def handle_synthesis_commands(args):
         print(f"Generating RAG context for integration using keywords: {keywords}")
         from .rag_commands import handle_rag_commands
         
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        rag_output_path = os.path.join(temp_dir, "consolidated_rag_context.md")
+        rag_output_path = os.path.join(run_dir, "consolidated_rag_context.md")
 
         # We explicitly ask for output to a file
         success_rag, rag_msg = handle_rag_commands(argparse.Namespace(rag_command="prepare-context", keywords=keywords, source=None, output=rag_output_path, limit=10))
@@ -189,7 +201,7 @@ def handle_synthesis_commands(args):
         if not success_rag:
             return False, f"RAG preparation failed: {rag_msg}"
 
-        success, json_path = run_integrate_workflow(rag_output_path, source_note_path, input_content, suggested_tags)
+        success, json_path = run_integrate_workflow(rag_output_path, source_note_path, input_content, suggested_tags, run_dir=run_dir)
         
         if success:
             # Warn about conflicts for next step
@@ -208,43 +220,58 @@ FINAL STEP: Run `synthesis cleanup`."""
             return False, f"Integration Plan Generation Failed: {json_path}"
 
     elif args.synthesis_command == "init":
-        success, msg = run_init_workflow(args.source, args.input_mode, args.resume)
+        if getattr(args, "batch", None):
+            return run_batch_workflow(args.batch, args.input_mode, args.resume, args.parallel)
+        success, msg = run_init_workflow(args.source, args.input_mode, args.resume, getattr(args, "overlap", False), getattr(args, "stop_after", None), getattr(args, "run_dir", None))
         return success, msg
 
     elif args.synthesis_command == "cleanup":
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        patterns = [
-            os.path.join(temp_dir, "preliminary_synthesis_*.md"),
-            os.path.join(temp_dir, "chunk_*.md"),
-            os.path.join(temp_dir, "prelim_chunk_*.md"),
-            os.path.join(temp_dir, "preliminary_combined_*.md"),
-            os.path.join(temp_dir, "integration_output_*.json"),
-            os.path.join(temp_dir, "conflict_resolution_output_*.json"),
-            os.path.join(temp_dir, "relevant_rag_files.txt"),
-            os.path.join(temp_dir, "critique_report_*.md"),
-            os.path.join(temp_dir, "synthesis_state.json"),
-            "preliminary_synthesis_*.md",
-            "final_synthesis_*.md",
-            "preliminary_combined_*.md",
-            "critique_report_*.md",
-            "consolidated_rag_context.md",
-            "create_integration_json.py",
-            "relevant_rag_files.txt",
-            "synthesis_state.json"
-        ]
-        
+        # Every artifact lives in a run directory; removing a run is one rmtree.
+        # Runs other processes may still be using are kept: only runs whose journal records the
+        # cleanup step or that have been idle longer than --older-than are removed by default.
+        max_age_seconds = getattr(args, "older_than", DEFAULT_MAX_AGE_HOURS) * 3600
         removed_files = []
-        for pattern in patterns:
-            files = glob.glob(pattern)
-            for f in files:
-                try:
+        kept = 0
+        if getattr(args, "run", None):
+            if not os.path.isdir(args.run) or os.path.abspath(run_dir_of(args.run) or "") != os.path.abspath(args.run):
+                return False, f"Not a run directory under {get_runs_root()}: {args.run}"
+            run_dirs = [args.run]
+        else:
+            run_dirs = []
+            for run_dir in sorted(glob.glob(os.path.join(get_runs_root(), "*"))):
+                if os.path.isdir(run_dir) and is_run_removable(run_dir, max_age_seconds):
+                    run_dirs.append(run_dir)
+                else:
+                    kept += 1
+            if os.path.isdir(get_batch_dir()):
+                if is_batch_active(max_age_seconds):
+                    kept += 1
+                else:
+                    run_dirs.append(get_batch_dir())
+
+        for run_dir in run_dirs:
+            if os.path.isdir(run_dir):
+                success, message = remove_run_dir(run_dir)
+                if success:
+                    removed_files.append(run_dir)
+                else:
+                    print(message)
+
+        # Shared state (only when no run or batch may still use it) and files left in the vault root by the RAG scripts
+        if not getattr(args, "run", None):
+            temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
+            shared_files = ["relevant_rag_files.txt"]
+            if not kept:
+                shared_files += [os.path.join(temp_dir, "workflow_memo.sqlite"), os.path.join(temp_dir, "workflow_memo.json")]
+            for f in shared_files:
+                if os.path.exists(f):
                     os.remove(f)
                     removed_files.append(f)
-                except Exception as e:
-                    print(f"Error deleting {f}: {e}")
-        
+        if kept:
+            print(f"[Status] Kept {kept} run(s) or batch workspace still in progress (active within {max_age_seconds / 3600:g}h). Use --run or --older-than to remove them.")
+
         if removed_files:
-            msg = f"Successfully cleaned up {len(removed_files)} temporary files:\n" + "\n".join([f"  - {os.path.basename(f)}" for f in removed_files])
+            msg = f"Successfully cleaned up {len(removed_files)} temporary artifacts:\n" + "\n".join([f"  - {os.path.basename(f)}" for f in removed_files])
             return True, msg
         else:
             return True, "No temporary synthesis files found for cleanup."
@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+import subprocess
+
+# Backlink index: for every Markdown note in the vault, its size, mtime and the note names it links to.
+# propagate_rename consults it to open only the files that link to the renamed note instead of reading
+# the whole vault. Stored in SQLite ($GEMINI_TEMP_DIR/backlink_index.sqlite), so a lookup or an update
+# touches only the rows involved, and renames record their changes in a single transaction.
+#
+# Before each use the index is brought up to date with edits made elsewhere (Obsidian, git, other
+# commands). In a git vault the candidates are the notes changed between the indexed commit and HEAD
+# plus those git status reports (and those it reported last time); otherwise every note is stat'ed.
+# Only notes whose size or mtime changed are re-read. Notes ignored by git are only re-checked by
+# a full walk (`rebuild`).
+
+INDEX_VERSION = "1"
+INDEX_FILENAME = "backlink_index.sqlite"
+IGNORED_DIRS = {".git", ".obsidian", ".trash"}
+
+WIKILINK_PATTERN = re.compile(r"\[\[([^\[\]]+?)\]\]")
+
+def get_index_path() -> str:
+    return os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), INDEX_FILENAME)
+
+def link_key(target: str) -> str:
+    """Index key of a link target: the note name without folders, heading anchor or display text, case-folded."""
+    target = target.split("|")[0].split("#")[0]
+    return re.split(r"[\\/]", target)[-1].strip().lower()
+
+def extract_link_keys(content: str) -> set:
+    return {key for key in (link_key(m) for m in WIKILINK_PATTERN.findall(content)) if key}
+
+def write_atomic(path: str, content: str) -> None:
+    """Writes content to a temporary file next to path and moves it into place."""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _is_indexed_path(rel_path: str) -> bool:
+    return rel_path.endswith(".md") and not any(part in IGNORED_DIRS for part in rel_path.split(os.sep))
+
+def _git(vault_root: str, *args) -> str:
+    """Output of a git command in the vault, or None if git fails."""
+    try:
+        result = subprocess.run(["git", "-C", vault_root, *args], capture_output=True, text=True, encoding='utf-8', timeout=60)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+class BacklinkIndex:
+    def __init__(self, vault_root: str = ".", path: str = None):
+        self.vault_root = os.path.abspath(vault_root)
+        self.path = path or get_index_path()
+        self.stats = {"checked": 0, "reread": 0, "removed": 0, "full_walks": 0}
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS links (target TEXT, path TEXT)")
+        conn.execute("CREATE INDEX IF NOT EXISTS links_target ON links (target)")
+        conn.execute("CREATE INDEX IF NOT EXISTS links_path ON links (path)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        return conn
+
+    def relpath(self, path: str) -> str:
+        return os.path.normpath(os.path.relpath(os.path.abspath(path), self.vault_root))
+
+    def _index_file(self, conn, rel_path: str) -> None:
+        """(Re-)reads one note into the index, or drops it if it no longer exists."""
+        full_path = os.path.join(self.vault_root, rel_path)
+        conn.execute("DELETE FROM links WHERE path = ?", (rel_path,))
+        try:
+            stat_result = os.stat(full_path)
+            with open(full_path, 'r', encoding='utf-8') as f:
+                keys = extract_link_keys(f.read())
+        except FileNotFoundError:
+            conn.execute("DELETE FROM files WHERE path = ?", (rel_path,))
+            self.stats["removed"] += 1
+            return
+        except (OSError, UnicodeDecodeError):
+            keys = set() # Unreadable or not UTF-8: nothing a rename could update
+            stat_result = os.stat(full_path)
+        conn.execute("INSERT OR REPLACE INTO files (path, mtime, size) VALUES (?, ?, ?)", (rel_path, stat_result.st_mtime_ns, stat_result.st_size))
+        conn.executemany("INSERT INTO links (target, path) VALUES (?, ?)", [(key, rel_path) for key in keys])
+        self.stats["reread"] += 1
+
+    def _check(self, conn, rel_paths) -> None:
+        """Re-reads the given notes whose size or mtime differ from the index."""
+        for rel_path in rel_paths:
+            self.stats["checked"] += 1
+            row = conn.execute("SELECT mtime, size FROM files WHERE path = ?", (rel_path,)).fetchone()
+            try:
+                stat_result = os.stat(os.path.join(self.vault_root, rel_path))
+            except OSError:
+                if row:
+                    self._index_file(conn, rel_path)
+                continue
+            if not row or row[0] != stat_result.st_mtime_ns or row[1] != stat_result.st_size:
+                self._index_file(conn, rel_path)
+
+    def _walk(self, conn) -> None:
+        """Stats every note in the vault and drops the entries of deleted ones."""
+        self.stats["full_walks"] += 1
+        known = {path: (mtime, size) for path, mtime, size in conn.execute("SELECT path, mtime, size FROM files")}
+        seen = set()
+        for root, dirs, files in os.walk(self.vault_root):
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+            for file in files:
+                if not file.endswith(".md"):
+                    continue
+                rel_path = os.path.relpath(os.path.join(root, file), self.vault_root)
+                seen.add(rel_path)
+                self.stats["checked"] += 1
+                try:
+                    stat_result = os.stat(os.path.join(root, file))
+                except OSError:
+                    continue
+                if known.get(rel_path) != (stat_result.st_mtime_ns, stat_result.st_size):
+                    self._index_file(conn, rel_path)
+        for rel_path in set(known) - seen:
+            self._index_file(conn, rel_path)
+
+    def _git_state(self):
+        """(HEAD commit, paths git status reports) when the vault root is a git work tree, else None."""
+        output = _git(self.vault_root, "rev-parse", "--show-toplevel", "HEAD")
+        lines = output.split("\n") if output else []
+        if len(lines) < 2 or os.path.realpath(lines[0]) != os.path.realpath(self.vault_root):
+            return None
+        status = _git(self.vault_root, "status", "--porcelain", "-z", "--untracked-files=all", "--no-renames")
+        if status is None:
+            return None
+        dirty = {entry[3:].replace("/", os.sep) for entry in status.split("\0") if len(entry) > 3}
+        return lines[1].strip(), dirty
+
+    def _git_changes(self, old_head: str, new_head: str):
+        """Paths changed between two commits, or None if the old commit is gone."""
+        if old_head == new_head:
+            return set()
+        output = _git(self.vault_root, "diff", "--name-only", "-z", "--no-renames", old_head, new_head)
+        if output is None:
+            return None
+        return {path.replace("/", os.sep) for path in output.split("\0") if path}
+
+    def refresh(self, full: bool = False) -> None:
+        """Brings the index up to date with the notes on disk (see the module comment)."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            if meta.get("version") != INDEX_VERSION or meta.get("vault_root") != self.vault_root:
+                conn.execute("DELETE FROM files")
+                conn.execute("DELETE FROM links")
+                meta = {}
+
+            git_state = self._git_state()
+            candidates = None
+            if git_state and meta.get("git_head") and not full:
+                changed = self._git_changes(meta["git_head"], git_state[0])
+                if changed is not None:
+                    candidates = changed | git_state[1] | set(json.loads(meta.get("git_dirty", "[]")))
+
+            if candidates is None:
+                self._walk(conn)
+            else:
+                self._check(conn, sorted(p for p in candidates if _is_indexed_path(p)))
+
+            new_meta = {"version": INDEX_VERSION, "vault_root": self.vault_root,
+                        "git_head": git_state[0] if git_state else "", "git_dirty": json.dumps(sorted(git_state[1]) if git_state else [])}
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", new_meta.items())
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def rebuild(self) -> None:
+        """Re-checks every note (full stat walk), e.g. after editing notes that git ignores."""
+        self.refresh(full=True)
+
+    def files_linking_to(self, name: str) -> list:
+        """Vault-relative paths of the notes with a wikilink to name (case-insensitive superset of exact matches)."""
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT DISTINCT path FROM links WHERE target = ? ORDER BY path", (link_key(name),))]
+        finally:
+            conn.close()
+
+    def record(self, updated: list = None, moved: list = None) -> None:
+        """
+        Records this process's own writes in one transaction: updated notes are re-read,
+        moved (old path, new path) pairs drop the old entry and index the new path.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for old_path, new_path in moved or []:
+                self._index_file(conn, self.relpath(old_path))
+                self._index_file(conn, self.relpath(new_path))
+            for path in updated or []:
+                self._index_file(conn, self.relpath(path))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+def get_backlink_index(vault_root: str = ".") -> BacklinkIndex:
+    """The backlink index of vault_root, refreshed against the notes on disk."""
+    index = BacklinkIndex(vault_root)
+    index.refresh()
+    return index
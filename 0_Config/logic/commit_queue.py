@@ -0,0 +1,282 @@
+import os
+import sys
+import time
+import json
+import uuid
+import atexit
+import sqlite3
+import threading
+import subprocess
+from ..utils.command_utils import execute_script
+
+# Group commit for the vault's git operations.
+# Integrations queue their files and commit message in a small SQLite file instead of running
+# `git add` + `git commit` themselves. Queued entries are committed together, with one `git add` and
+# one `git commit` per window: when COMMIT_BATCH_SIZE entries are pending or the oldest has waited
+# COMMIT_WINDOW_SECONDS. The queue is shared by every main_cli process working in the vault.
+#
+# GEMINI_COMMIT_MODE=background (default): a detached committer process drains the queue, so the
+#   CLI returns before git runs. One committer runs per vault (a lease row in the database).
+# GEMINI_COMMIT_MODE=sync: no committer process; a full window is committed right away and the rest
+#   is committed synchronously when the process exits.
+
+QUEUE_FILENAME = "commit_queue.sqlite"
+LOG_FILENAME = "commit_queue.log"
+COMMIT_MODE_ENV = "GEMINI_COMMIT_MODE"
+COMMIT_WINDOW_SECONDS = 5.0
+COMMIT_BATCH_SIZE = 20
+LEASE_SECONDS = 120.0 # A committer that has not checked in for this long is considered dead
+POLL_SECONDS = 0.5
+
+_exit_flush_registered = False
+_register_lock = threading.Lock()
+
+def get_commit_mode() -> str:
+    mode = os.environ.get(COMMIT_MODE_ENV, "background").lower()
+    return mode if mode in ["background", "sync"] else "background"
+
+def _get_setting(name: str, default: float) -> float:
+    try:
+        return max(float(os.environ.get(name, default)), 0)
+    except ValueError:
+        return default
+
+def _get_queue_path() -> str:
+    return os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), QUEUE_FILENAME)
+
+def _vault() -> str:
+    return os.path.abspath(os.getcwd())
+
+def _connect():
+    path = _get_queue_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT, vault TEXT, files TEXT, message TEXT, queued REAL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS committer (vault TEXT PRIMARY KEY, token TEXT, heartbeat REAL)")
+    return conn
+
+def _transaction(function):
+    """Runs function(conn) in one BEGIN IMMEDIATE transaction (the database write lock across processes)."""
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        result = function(conn)
+        conn.execute("COMMIT")
+        return result
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def _lease_holder(conn, vault: str) -> str:
+    """Token of the live committer of the vault, or None."""
+    row = conn.execute("SELECT token, heartbeat FROM committer WHERE vault = ?", (vault,)).fetchone()
+    if row and time.time() - row[1] < LEASE_SECONDS:
+        return row[0]
+    return None
+
+def _take_lease(conn, vault: str, token: str) -> bool:
+    holder = _lease_holder(conn, vault)
+    if holder not in [None, token]:
+        return False
+    conn.execute("INSERT OR REPLACE INTO committer (vault, token, heartbeat) VALUES (?, ?, ?)", (vault, token, time.time()))
+    return True
+
+def _release_lease(vault: str, token: str) -> None:
+    _transaction(lambda conn: conn.execute("DELETE FROM committer WHERE vault = ? AND token = ?", (vault, token)))
+
+def pending_commits() -> list:
+    """The vault's queued entries as (files, message, queued time), oldest first."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT files, message, queued FROM queue WHERE vault = ? ORDER BY id", (_vault(),)).fetchall()
+    finally:
+        conn.close()
+    return [(json.loads(files), message, queued) for files, message, queued in rows]
+
+def queue_commit(files: list, message: str) -> (bool, str):
+    """
+    Queues files and a commit message for the next group commit.
+    Returns (success, message for the caller's report).
+    """
+    vault = _vault()
+    mode = get_commit_mode()
+    spawn_token = uuid.uuid4().hex
+
+    def insert(conn):
+        conn.execute("INSERT INTO queue (vault, files, message, queued) VALUES (?, ?, ?, ?)",
+                     (vault, json.dumps(list(files)), message, time.time()))
+        pending = conn.execute("SELECT COUNT(*) FROM queue WHERE vault = ?", (vault,)).fetchone()[0]
+        # Claim the lease for a new committer in the same transaction, so an exiting committer
+        # (which checks for an empty queue in its own transaction) cannot miss this entry
+        spawn = mode == "background" and _take_lease(conn, vault, spawn_token)
+        return pending, spawn
+
+    try:
+        pending, spawn = _transaction(insert)
+    except sqlite3.Error as e:
+        # Without the queue, commit right away as before
+        return _commit_now(files, message, reason=f"commit queue unavailable ({e})")
+
+    if mode == "sync":
+        _register_exit_flush()
+        if pending >= _get_setting("GEMINI_COMMIT_BATCH", COMMIT_BATCH_SIZE):
+            return flush_commits()
+    elif spawn and not _start_committer(spawn_token):
+        _release_lease(vault, spawn_token)
+        return flush_commits()
+    return True, f"Commit queued ({pending} pending, {mode} mode)."
+
+def _commit_now(files: list, message: str, reason: str) -> (bool, str):
+    execute_script("git", ["add"] + list(files))
+    success, output = execute_script("git", ["commit", "-m", message])
+    if success:
+        return True, f"Committed to Git ({reason})."
+    return False, f"Failed to commit changes to Git: {output}"
+
+def _register_exit_flush() -> None:
+    global _exit_flush_registered
+    with _register_lock:
+        if not _exit_flush_registered:
+            atexit.register(_flush_at_exit)
+            _exit_flush_registered = True
+
+def _flush_at_exit() -> None:
+    success, message = flush_commits()
+    if pending_commits() or not success:
+        print(f"[Warning] Commit queue: {message}")
+    elif message != "Nothing to commit.":
+        print(f"[Status] {message}")
+
+def _start_committer(token: str) -> bool:
+    """Starts the detached committer process; False if it could not be started."""
+    main_cli = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_cli.py")
+    log_path = os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), LOG_FILENAME)
+    if os.name == "nt":
+        detach = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {"start_new_session": True}
+    try:
+        with open(log_path, "a", encoding="utf-8") as log:
+            subprocess.Popen([sys.executable, main_cli, "note", "commits", "--run-committer", token],
+                             stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, **detach)
+        return True
+    except OSError as e:
+        print(f"[Warning] Could not start the background committer: {e}")
+        return False
+
+def _commit_rows(rows: list) -> (bool, str):
+    """One `git add` and one `git commit` for queued rows [(id, files, message)]."""
+    files = list(dict.fromkeys(f for _, row_files, _ in rows for f in json.loads(row_files)))
+    # A queued note may have been renamed since: stage removals of tracked files, skip the rest
+    missing = [f for f in files if not os.path.exists(f)]
+    tracked_missing = set()
+    if missing:
+        success, output = execute_script("git", ["ls-files", "--"] + missing)
+        tracked_missing = {os.path.normpath(line) for line in output.splitlines()} if success else set()
+    paths = [f for f in files if os.path.exists(f) or os.path.normpath(f) in tracked_missing]
+
+    messages = [message for _, _, message in rows]
+    if len(messages) == 1:
+        commit_args = ["-m", messages[0]]
+    else:
+        commit_args = ["-m", f"chore: Group commit of {len(messages)} vault changes", "-m", "\n".join(f"- {m}" for m in messages)]
+
+    if paths:
+        add_success, add_output = execute_script("git", ["add", "-A", "--"] + paths)
+        if not add_success:
+            return False, f"Failed to stage queued files: {add_output}"
+    success, output = execute_script("git", ["commit"] + commit_args)
+    if not success and "nothing to commit" in output:
+        return True, "Nothing to commit."
+    if not success:
+        return False, f"Failed to commit changes to Git: {output}"
+    return True, f"Committed {len(rows)} queued change(s) to Git: {messages[0] if len(messages) == 1 else commit_args[1]}"
+
+def _flush_once(vault: str, token: str) -> (bool, str):
+    """Commits every queued row (lease held by token); committed rows are removed."""
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT id, files, message FROM queue WHERE vault = ? ORDER BY id", (vault,)).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return True, "Nothing to commit."
+    success, message = _commit_rows(rows)
+    if success:
+        last_id = rows[-1][0]
+        _transaction(lambda conn: conn.execute("DELETE FROM queue WHERE vault = ? AND id <= ?", (vault, last_id)))
+    return success, message
+
+def flush_commits(timeout: float = LEASE_SECONDS) -> (bool, str):
+    """
+    Commits the vault's queue now and waits for it. If a committer process holds the lease, waits
+    until it has committed the entries queued so far.
+    """
+    vault = _vault()
+    token = uuid.uuid4().hex
+    deadline = time.time() + timeout
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT MAX(id) FROM queue WHERE vault = ?", (vault,)).fetchone()
+    finally:
+        conn.close()
+    target_id = row[0]
+    if target_id is None:
+        return True, "Nothing to commit."
+
+    while True:
+        if _transaction(lambda conn: _take_lease(conn, vault, token)):
+            try:
+                return _flush_once(vault, token)
+            finally:
+                _release_lease(vault, token)
+        conn = _connect()
+        try:
+            remaining = conn.execute("SELECT COUNT(*) FROM queue WHERE vault = ? AND id <= ?", (vault, target_id)).fetchone()[0]
+        finally:
+            conn.close()
+        if not remaining:
+            return True, "Queued changes committed by the background committer."
+        if time.time() > deadline:
+            return False, f"Timed out waiting for the background committer ({remaining} entries pending)."
+        time.sleep(POLL_SECONDS)
+
+def run_committer(token: str) -> (bool, str):
+    """
+    The background committer: commits the queue window by window until it is empty. Exits at once
+    if another committer holds the vault's lease.
+    """
+    vault = _vault()
+    window = _get_setting("GEMINI_COMMIT_WINDOW", COMMIT_WINDOW_SECONDS)
+    batch_size = _get_setting("GEMINI_COMMIT_BATCH", COMMIT_BATCH_SIZE)
+    if not _transaction(lambda conn: _take_lease(conn, vault, token)):
+        return True, "Another committer is running."
+
+    def check(conn):
+        """(pending count, oldest queued time); drops the lease in the same transaction if empty."""
+        count, oldest = conn.execute("SELECT COUNT(*), MIN(queued) FROM queue WHERE vault = ?", (vault,)).fetchone()
+        if count:
+            conn.execute("UPDATE committer SET heartbeat = ? WHERE vault = ? AND token = ?", (time.time(), vault, token))
+        else:
+            conn.execute("DELETE FROM committer WHERE vault = ? AND token = ?", (vault, token))
+        return count, oldest
+
+    try:
+        while True:
+            count, oldest = _transaction(check)
+            if not count:
+                return True, "Commit queue empty."
+            if count >= batch_size or time.time() - oldest >= window:
+                success, message = _flush_once(vault, token)
+                print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+                if not success:
+                    _release_lease(vault, token)
+                    return False, message
+            else:
+                time.sleep(min(POLL_SECONDS, window - (time.time() - oldest)))
+    except Exception:
+        _release_lease(vault, token)
+        raise
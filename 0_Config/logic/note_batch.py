@@ -2,9 +2,21 @@ import os
 import json
 import sys
 import re
-from .note_core import create_atomic_note, edit_existing_note
-from .note_metadata import update_note_metadata, propagate_rename
-from ..utils.command_utils import execute_script
+from concurrent.futures import ThreadPoolExecutor
+from .note_core import create_atomic_note, edit_existing_note, atomic_note_path
+from .note_metadata import update_note_metadata, propagate_renames
+from .note_overlay import buffered_notes, note_lock
+from .note_history import history_archive_path
+from .commit_queue import queue_commit
+from ..utils.command_utils import execute_script, sanitize_filename
+
+DEFAULT_PLAN_WORKERS = 4
+
+def get_plan_workers() -> int:
+    try:
+        return max(int(os.environ.get("GEMINI_PLAN_WORKERS", DEFAULT_PLAN_WORKERS)), 1)
+    except ValueError:
+        return DEFAULT_PLAN_WORKERS
 
 def _fix_invalid_json(json_str: str) -> str:
     """
@@ -53,10 +65,202 @@ def _fix_invalid_json(json_str: str) -> str:
         
     return "".join(fixed_chars)
 
-def execute_integration_plan(processed_json_file: str, source_note_path: str = None) -> (bool, str):
+def _rename_paths(item: dict) -> set:
+    old_path = os.path.normpath(item["file"])
+    # Same target path as propagate_renames
+    return {old_path, os.path.join(os.path.dirname(old_path), f"{sanitize_filename(item['new_name'])}.md")}
+
+def _group_renames(items: list) -> list:
+    """
+    The plan's steps in order: ("item", item) or ("renames", [rename items]). Consecutive rename_note
+    items form one batch unless one renames a note the batch creates. Any other item ends the batch:
+    it may add links to a note renamed after it, which only a later rename can rewrite.
+    """
+    steps = []
+    batch, batch_paths = None, set()
+    for item in items:
+        if item.get("type") == "rename_note" and item.get("file") and item.get("new_name"):
+            paths = _rename_paths(item)
+            if batch is not None and not paths & batch_paths:
+                batch.append(item)
+            else:
+                batch, batch_paths = [item], set()
+                steps.append(("renames", batch))
+            batch_paths |= paths
+            continue
+        steps.append(("item", item))
+        batch, batch_paths = None, set()
+    return steps
+
+def _is_manual_review(item: dict) -> bool:
+    return item.get("type") == "manual_review" or (item.get("type") == "edit_note" and item.get("mode") == "manual_review")
+
+def _normalize(path: str) -> str:
+    return os.path.normpath(os.path.abspath(path))
+
+def _item_path(item: dict) -> str:
+    """The note a plan item writes (normalized), or None if it writes none."""
+    if _is_manual_review(item):
+        return None
+    if item.get("type") == "new_note":
+        default_dir = "2_Literature_Notes" if "SYNTH-" in item.get("title", "") else "3_Permanent_Notes"
+        path = atomic_note_path(item.get("content", ""), item.get("title"), item.get("directory") or default_dir)
+    elif item.get("type") in ["edit_note", "update_metadata"]:
+        path = item.get("file")
+    else:
+        return None
+    return _normalize(path) if isinstance(path, str) else None
+
+def _item_paths(item: dict) -> list:
+    """Every file a plan item may write: its note and, for prepend_to_file, the note's history archive."""
+    path = _item_path(item)
+    if path is None:
+        return []
+    if item.get("type") == "edit_note" and item.get("mode") == "prepend_to_file":
+        return [path, _normalize(history_archive_path(os.path.splitext(os.path.basename(path))[0]))]
+    return [path]
+
+def _execute_item(item: dict) -> (list, list, str):
+    """Applies one plan item. Returns (report messages, files to add to Git, modified note or None)."""
+    messages = []
+    git_files = []
+    file_changed = False
+    current_file_path = ""
+
+    if item["type"] == "new_note":
+        # Default to 2_Literature_Notes for synthesis, 3_Permanent_Notes otherwise
+        default_dir = "2_Literature_Notes" if "SYNTH-" in item.get("title", "") else "3_Permanent_Notes"
+        target_directory = item.get("directory") or default_dir
+    
+        success, message, file_path = create_atomic_note(
+            item.get("content", ""), 
+            item.get("title"), 
+            item.get("tags"), 
+            target_directory,
+            aliases=item.get("aliases")
+        )
+        messages.append(message)
+        if success and file_path:
+            git_files.append(file_path)
+            file_changed = True
+            current_file_path = file_path
+
+    elif item["type"] == "edit_note":
+        success, message, file_path = edit_existing_note(item["file"], item.get("content", ""), item["mode"], item.get("title"))
+        messages.append(message)
+        if success and file_path:
+            git_files.append(file_path)
+            file_changed = True
+            current_file_path = file_path
+
+    elif item["type"] == "update_metadata":
+        success, message = update_note_metadata(
+            item["file"], 
+            item.get("new_title"), 
+            item.get("add_tags"), 
+            item.get("add_aliases"),
+            remove_tags=item.get("remove_tags"),
+            remove_aliases=item.get("remove_aliases")
+        )
+        messages.append(message)
+        if success:
+            git_files.append(item["file"])
+            file_changed = True
+
+    elif item["type"] == "rename_note":
+        messages.append("Warning: rename_note item without 'file' or 'new_name' skipped.")
+
+    else:
+        messages.append(f"Warning: Unknown insight type '{item.get('type')}' in JSON.")
+
+    return messages, git_files, (current_file_path if file_changed and current_file_path else None)
+
+def _execute_renames(items: list) -> (list, list, str):
+    """Applies a batch of rename_note items (see propagate_renames)."""
+    messages = []
+    git_files = []
+    success, summary, results = propagate_renames([(rename["file"], rename["new_name"]) for rename in items])
+    for rename, (rename_success, message, new_path) in zip(items, results):
+        messages.append(message)
+        if success and rename_success:
+            git_files.append(new_path)
+            git_files.append(rename["file"])
+    messages.append(summary)
+    return messages, git_files, None
+
+def _run_locked(path: str, function, *args):
+    if path is None:
+        return function(*args)
+    with note_lock(path):
+        return function(*args)
+
+def _run_step(step: str, item) -> (list, list, str):
+    if step == "renames":
+        return _execute_renames(item)
+    if _is_manual_review(item):
+        return [], [], None
+    return _run_locked(_item_path(item), _execute_item, item)
+
+def _run_steps(steps: list, workers: int) -> list:
+    """
+    Runs the plan's steps and returns their results in plan order. Each item waits for the earlier
+    items writing any of the same files (its note, its history archive), so every file sees its edits
+    in plan order while items on disjoint files run in parallel on a thread pool. A rename batch
+    rewrites links anywhere in the vault: it waits for every earlier step and runs before any later one.
+    """
+    if workers == 1:
+        return [_run_step(step, item) for step, item in steps]
+
+    results = [None] * len(steps)
+    def run_after(dependencies, i):
+        for dependency in dependencies:
+            dependency.result()
+        results[i] = _run_step(*steps[i])
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Dependencies were submitted earlier, so they are already running or done when a task waits
+        last_writer = {} # {file path: future of the last step writing it}
+        futures = []
+        def wait_all():
+            for future in futures:
+                future.result()
+            futures.clear()
+            last_writer.clear()
+
+        for i, (step, item) in enumerate(steps):
+            if step == "renames":
+                wait_all()
+                results[i] = _run_step(step, item)
+                continue
+            paths = _item_paths(item)
+            dependencies = {last_writer[path] for path in paths if path in last_writer}
+            future = executor.submit(run_after, dependencies, i)
+            for path in paths:
+                last_writer[path] = future
+            futures.append(future)
+        wait_all()
+    return results
+
+def _add_source_references(paths: list, source_link: str, workers: int) -> list:
+    """Adds source_link to the References of each note (in parallel); returns the failure messages in order."""
+    def add(file_path):
+        return _run_locked(_normalize(file_path), edit_existing_note, file_path, source_link, "append_ref")
+
+    if workers == 1:
+        outcomes = [add(file_path) for file_path in paths]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(add, paths))
+    return [f"  - Failed to add reference to {os.path.basename(file_path)}: {ref_msg}"
+            for file_path, (ref_success, ref_msg, _) in zip(paths, outcomes) if not ref_success]
+
+def execute_integration_plan(processed_json_file: str, source_note_path: str = None, update_moc: bool = True) -> (bool, str):
     """
     Executes a batch integration plan from a JSON file.
-    Handles Git commits and MOC updates.
+    Handles Git commits and MOC updates (update_moc=False leaves the MOC to the caller,
+    e.g. a batch synthesis that rebuilds it once at the end).
+    Items writing different notes run in parallel (GEMINI_PLAN_WORKERS); the report is the same
+    as running them one by one.
     """
     if not os.path.exists(processed_json_file):
         return False, f"Error: Processed JSON file not found at {processed_json_file}"
@@ -81,103 +285,48 @@ def execute_integration_plan(processed_json_file: str, source_note_path: str = N
     integration_messages = []
     manual_review_items = []
     files_modified = set()
+    workers = get_plan_workers()
 
-    for item in structured_insights:
-        file_changed = False
-        current_file_path = ""
-        
-        if item["type"] == "new_note":
-            # Default to 2_Literature_Notes for synthesis, 3_Permanent_Notes otherwise
-            default_dir = "2_Literature_Notes" if "SYNTH-" in item.get("title", "") else "3_Permanent_Notes"
-            target_directory = item.get("directory") or default_dir
-            
-            success, message, file_path = create_atomic_note(
-                item.get("content", ""), 
-                item.get("title"), 
-                item.get("tags"), 
-                target_directory,
-                aliases=item.get("aliases")
-            )
-            integration_messages.append(message)
-            if success and file_path:
-                files_to_add_to_git.append(file_path)
-                file_changed = True
-                current_file_path = file_path
-
-        elif item["type"] == "edit_note":
-            if item.get("mode") == "manual_review":
+    # Every note is read once and written once, when the block ends (see note_overlay.py).
+    # propagate_renames flushes pending edits before touching the files on disk.
+    with buffered_notes():
+        # Renames are grouped so that the vault's links are rewritten once per batch (see propagate_renames)
+        steps = _group_renames(structured_insights)
+        for (step, item), (messages, git_files, modified) in zip(steps, _run_steps(steps, workers)):
+            if step == "item" and _is_manual_review(item):
                 manual_review_items.append(item)
                 continue
+            integration_messages.extend(messages)
+            files_to_add_to_git.extend(git_files)
+            if modified:
+                files_modified.add(modified)
 
-            success, message, file_path = edit_existing_note(item["file"], item.get("content", ""), item["mode"], item.get("title"))
-            integration_messages.append(message)
-            if success and file_path:
-                files_to_add_to_git.append(file_path)
-                file_changed = True
-                current_file_path = file_path
-
-        elif item["type"] == "manual_review":
-            manual_review_items.append(item)
-            continue
-
-        elif item["type"] == "update_metadata":
-            success, message = update_note_metadata(
-                item["file"], 
-                item.get("new_title"), 
-                item.get("add_tags"), 
-                item.get("add_aliases"),
-                remove_tags=item.get("remove_tags"),
-                remove_aliases=item.get("remove_aliases")
-            )
-            integration_messages.append(message)
-            if success:
-                files_to_add_to_git.append(item["file"])
-                file_changed = True
-
-        elif item["type"] == "rename_note":
-            success, message = propagate_rename(item["file"], item["new_name"])
-            integration_messages.append(message)
-            if success:
-                new_path = os.path.join(os.path.dirname(item["file"]), f"{item['new_name']}.md")
-                files_to_add_to_git.append(new_path)
-                files_to_add_to_git.append(item["file"])
-                file_changed = True
-        
-        else:
-            integration_messages.append(f"Warning: Unknown insight type '{item.get('type')}' in JSON.")
-        
-        if file_changed and current_file_path:
-            files_modified.add(current_file_path)
-
-    # Batch append references
-    if source_note_path and files_modified:
-        source_link = f"[[{os.path.basename(source_note_path)}]]"
-        integration_messages.append(f"Linking source {source_link} to {len(files_modified)} modified notes...")
-        for file_path in files_modified:
-            ref_success, ref_msg, _ = edit_existing_note(file_path, source_link, "append_ref")
-            if not ref_success:
-                integration_messages.append(f"  - Failed to add reference to {os.path.basename(file_path)}: {ref_msg}")
+        # Batch append references
+        if source_note_path and files_modified:
+            source_link = f"[[{os.path.basename(source_note_path)}]]"
+            integration_messages.append(f"Linking source {source_link} to {len(files_modified)} modified notes...")
+            integration_messages.extend(_add_source_references(list(files_modified), source_link, workers))
 
     # MOC and Git
-    success_moc, message_moc = execute_script(sys.executable, ["0_Config/main_cli.py", "rag", "update-moc"])
-    if success_moc:
-        integration_messages.append(message_moc)
-        files_to_add_to_git.append("0_Config/Context/GEMINI_INDEX.md")
-    else:
-        integration_messages.append(f"Failed to update MOC: {message_moc}")
+    if update_moc:
+        success_moc, message_moc = execute_script(sys.executable, ["0_Config/main_cli.py", "rag", "update-moc"])
+        if success_moc:
+            integration_messages.append(message_moc)
+            files_to_add_to_git.append("0_Config/Context/GEMINI_INDEX.md")
+        else:
+            integration_messages.append(f"Failed to update MOC: {message_moc}")
 
     if files_to_add_to_git:
         unique_files = list(set(files_to_add_to_git))
-        execute_script("git", ["add"] + unique_files)
-
         commit_message_ref = os.path.basename(source_note_path) if source_note_path else "batch integration"
         commit_message = f"feat: Integrate knowledge from synthesis note '{commit_message_ref}'"
-        
-        commit_success, commit_output = execute_script("git", ["commit", "-m", commit_message])
+
+        # Committed together with other queued integrations (see commit_queue.py)
+        commit_success, commit_output = queue_commit(unique_files, commit_message)
         if commit_success:
-            integration_messages.append("Knowledge integration complete and committed to Git.")
+            integration_messages.append(f"Knowledge integration complete. {commit_output}")
         else:
-            integration_messages.append(f"Failed to commit changes to Git: {commit_output}")
+            integration_messages.append(commit_output)
     
     try:
         os.remove(processed_json_file)
@@ -1,25 +1,23 @@
 import os
 import datetime
-import re
 import yaml
 from ..utils.command_utils import sanitize_filename
+from .note_overlay import note_exists, read_parsed_note, write_parsed_note, write_note
+from ..utils.note_document import Note
 
-def create_atomic_note(content: str, title: str = None, tags: str = None, directory: str = "3_Permanent_Notes", aliases: list = None) -> (bool, str, str):
-    """
-    Core logic for creating an atomic note.
-    Returns (success: bool, message: str, file_path: str).
-    """
+def _resolve_new_note(content: str, title: str = None, warn: bool = True) -> (dict, str, str):
+    """Splits new note content into (existing YAML, remaining content, final title)."""
     # Extract existing YAML if present
     yaml_content = {}
     remaining_content = content
-    yaml_pattern = re.compile(r'^---\s*\n(.*?)\n---\s*\n', re.DOTALL)
-    match = yaml_pattern.match(content)
-    if match:
+    parsed = Note(content)
+    if parsed.has_frontmatter:
         try:
-            yaml_content = yaml.safe_load(match.group(1)) or {}
-            remaining_content = content[match.end():].strip()
+            yaml_content = parsed.metadata
+            remaining_content = parsed.body.strip()
         except Exception as e:
-            print(f"Warning: Failed to parse existing YAML: {e}")
+            if warn:
+                print(f"Warning: Failed to parse existing YAML: {e}")
 
     # Priority: Function Argument > Existing YAML > Generated
     final_title = title or yaml_content.get('title')
@@ -29,6 +27,19 @@ def create_atomic_note(content: str, title: str = None, tags: str = None, direct
             final_title = first_line[2:].strip()
         else:
             final_title = "Untitled Note"
+    return yaml_content, remaining_content, final_title
+
+def atomic_note_path(content: str, title: str = None, directory: str = "3_Permanent_Notes") -> str:
+    """The path create_atomic_note would write for these arguments."""
+    _, _, final_title = _resolve_new_note(content, title, warn=False)
+    return os.path.join(directory, f"{sanitize_filename(final_title)}.md")
+
+def create_atomic_note(content: str, title: str = None, tags: str = None, directory: str = "3_Permanent_Notes", aliases: list = None) -> (bool, str, str):
+    """
+    Core logic for creating an atomic note.
+    Returns (success: bool, message: str, file_path: str).
+    """
+    yaml_content, remaining_content, final_title = _resolve_new_note(content, title)
     
     # Final metadata construction
     final_tags = yaml_content.get('tags', [])
@@ -74,8 +85,7 @@ def create_atomic_note(content: str, title: str = None, tags: str = None, direct
     os.makedirs(directory, exist_ok=True)
 
     try:
-        with open(note_path, 'w', encoding='utf-8') as f:
-            f.write(full_note)
+        write_note(note_path, full_note)
         return True, f"Successfully created note: {note_path}", note_path
     except Exception as e:
         return False, f"Error creating note at {note_path}: {e}", ""
@@ -85,49 +95,35 @@ from .note_history import trim_note_history
 def edit_existing_note(file_path: str, content: str, mode: str, title: str = None) -> (bool, str, str):
     """
     Core orchestrator for modifying existing notes.
+    The note is parsed once; the edit and the 'Edited' stamp are written together.
     """
-    if not os.path.exists(file_path):
+    if not note_exists(file_path):
         return False, f"Error: File not found at {file_path}", ""
 
     current_date = datetime.date.today().strftime("%Y-%m-%d")
     success = False
     message = ""
 
+    try:
+        note = read_parsed_note(file_path)
+    except Exception as e:
+        return False, f"Error reading {file_path}: {e}", ""
+
     if mode == "prepend_to_file":
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                full_content = f.read()
-
             final_title = title
-            # YAML extraction
-            yaml_pattern = re.compile(r'^(---.*?---)', re.DOTALL)
-            match = yaml_pattern.match(full_content)
-            
             if not final_title:
-                if match:
-                    yaml_content = match.group(1)
-                    metadata = yaml.safe_load(yaml_content[3:-3]) or {}
-                    final_title = metadata.get('title')
+                if note.has_frontmatter:
+                    final_title = note.metadata.get('title')
                 
                 if not final_title:
                     final_title = os.path.splitext(os.path.basename(file_path))[0]
 
             new_section = f"# {final_title}\nEdited on [[{current_date}]]\n\n{content}"
 
-            if match:
-                yaml_block = match.group(1)
-                remaining_content = full_content[match.end():].strip()
-                
+            if note.has_frontmatter:
                 # History Trimming Logic
-                version_pattern = re.compile(r'(Edited on \[\[\d{4}-\d{2}-\d{2}\]\])', re.DOTALL)
-                versions = version_pattern.split(remaining_content)
-                
-                actual_versions = []
-                if versions[0].strip():
-                    actual_versions.append(versions[0].strip())
-                
-                for i in range(1, len(versions), 2):
-                    actual_versions.append(versions[i] + versions[i+1])
+                actual_versions = note.version_blocks()
 
                 if len(actual_versions) >= 2:
                     note_name = os.path.splitext(os.path.basename(file_path))[0]
@@ -136,12 +132,11 @@ def edit_existing_note(file_path: str, content: str, mode: str, title: str = Non
                         print(trim_msg)
 
                 remaining_content = "\n\n".join(actual_versions).strip()
-                new_full_content = f"{yaml_block}\n\n{new_section}\n\n{remaining_content}"
+                # One blank line between the frontmatter and the new section
+                separator = "\n" if note.body_start > note.frontmatter_close else "\n\n"
+                note.splice(note.body_start, len(note.text), f"{separator}{new_section}\n\n{remaining_content}")
             else:
-                new_full_content = f"{new_section}\n\n{full_content}"
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(new_full_content)
+                note.splice(0, 0, f"{new_section}\n\n")
             
             success = True
             message = f"Successfully prepended content (rephrased) to {file_path}."
@@ -150,129 +145,103 @@ def edit_existing_note(file_path: str, content: str, mode: str, title: str = Non
             message = f"Error prepending content to {file_path}: {e}"
     
     elif mode in ["prepend_to_main", "append_to_main"]:
-        success, message, _ = edit_note_section(file_path, content, mode)
+        success, message = _edit_first_section(note, file_path, content, mode)
     
     elif mode == "append_ref":
-        success, message, _ = add_reference_to_note(file_path, content)
+        success, message = _add_reference(note, file_path, content)
     
     else:
         return False, "Invalid edit mode specified.", ""
 
     if success:
-         # Note: Caller might want to update metadata separately, 
-         # but we'll import it here to keep the 'edited' stamp logic automatic.
-         from .note_metadata import update_note_metadata
-         update_note_metadata(file_path, update_edited_timestamp=True)
+         # Keep the 'edited' stamp automatic, in the same write as the edit.
+         # Imported here because note_metadata imports this module.
+         from .note_metadata import apply_note_metadata
+         if note.has_frontmatter:
+             try:
+                 apply_note_metadata(note, update_edited_timestamp=True)
+             except Exception as e:
+                 print(f"Warning: Could not update the Edited date of {file_path}: {e}")
+         try:
+             if note.modified:
+                 write_parsed_note(file_path, note)
+         except Exception as e:
+             return False, f"Error writing {file_path}: {e}", ""
          return True, message, file_path
     else:
         return False, message, ""
 
+def _edit_first_section(note: Note, file_path: str, content: str, mode: str) -> (bool, str):
+    """Records a prepend_to_main / append_to_main edit of the first section on a parsed note."""
+    heading = note.first_heading
+    if heading is None:
+        return False, f"Error: No section header found in {file_path}"
+
+    if mode == "prepend_to_main":
+        # Add new content immediately after the first header line
+        note.insert(heading.end, content + "\n")
+    elif mode == "append_to_main":
+        # Add new content before the next header (or end of file)
+        note.insert(heading.content_end, content + "\n")
+    else:
+        return False, "Invalid section-based edit mode specified."
+    return True, f"Successfully {mode} content to the first section in {file_path}."
+
 def edit_note_section(file_path: str, content: str, mode: str) -> (bool, str, str):
     """
     Edits content within the FIRST header section of the Markdown file.
     Mode can be 'prepend_to_main' or 'append_to_main'.
     """
 
-    if not os.path.exists(file_path):
+    if not note_exists(file_path):
         return False, f"Error: File not found at {file_path}", ""
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        # Find YAML frontmatter end (first --- after initial ---)
-        frontmatter_end_line = -1
-        in_frontmatter = False
-        if lines and lines[0].strip() == "---":
-             in_frontmatter = True
-             for i in range(1, len(lines)):
-                 if lines[i].strip() == "---":
-                     frontmatter_end_line = i
-                     break
-        
-        start_search_line = frontmatter_end_line + 1 if frontmatter_end_line != -1 else 0
-
-        # Find the first header
-        first_header_line = -1
-        for i in range(start_search_line, len(lines)):
-            if lines[i].strip().startswith('#'):
-                first_header_line = i
-                break
-
-        if first_header_line == -1:
-            return False, f"Error: No section header found in {file_path}", ""
-
-        # Find end of this section (the start of the NEXT header or end of file)
-        next_header_line = len(lines)
-        for i in range(first_header_line + 1, len(lines)):
-            if lines[i].strip().startswith('#'):
-                next_header_line = i
-                break
-
-        new_content_lines = []
-        if mode == "prepend_to_main":
-            # Add new content immediately after the first header line
-            new_content_lines = lines[:first_header_line + 1] + [content + "\n"] + lines[first_header_line + 1:]
-            
-        elif mode == "append_to_main":
-            # Add new content before the next header (or end of file)
-            new_content_lines = lines[:next_header_line] + [content + "\n"] + lines[next_header_line:]
-        else:
-             return False, "Invalid section-based edit mode specified.", ""
-
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.writelines(new_content_lines)
-        
-        return True, f"Successfully {mode} content to the first section in {file_path}.", file_path
+        note = read_parsed_note(file_path)
+        success, message = _edit_first_section(note, file_path, content, mode)
+        if not success:
+            return False, message, ""
+        write_parsed_note(file_path, note)
+        return True, message, file_path
 
     except Exception as e:
         return False, f"Error editing first section in {file_path}: {e}", ""
 
+def _add_reference(note: Note, file_path: str, reference_content: str) -> (bool, str):
+    """Records adding a reference on a parsed note (see add_reference_to_note)."""
+    # Check if reference already exists to avoid duplicates (a set lookup for [[links]])
+    clean_ref = reference_content.strip()
+    if note.text and "\n" not in clean_ref and note.contains(clean_ref):
+        return True, f"Reference '{clean_ref}' already exists in {file_path}."
+
+    formatted_ref = f"- {clean_ref}\n"
+    heading = note.references
+    if heading is not None:
+        # Header exists, insert immediately after
+        note.insert(heading.end, formatted_ref)
+    else:
+        # Header missing, append to end of file with a separator
+        # Ensure there is a newline before the separator if file is not empty
+        last_line = note.text[note.text.rfind("\n", 0, len(note.text) - 1) + 1:]
+        prefix = "\n" if last_line.strip() != "" else ""
+        note.splice(len(note.text), len(note.text), f"{prefix}\n---\n## References\n{formatted_ref}")
+    return True, f"Successfully added reference to {file_path}."
+
 def add_reference_to_note(file_path: str, reference_content: str) -> (bool, str, str):
     """
     Adds a reference link to the '## References' section.
     Creates the section if it doesn't exist.
     Inserts the new reference at the TOP of the list (immediately after the header).
     """
-    if not os.path.exists(file_path):
+    if not note_exists(file_path):
         return False, f"Error: File not found at {file_path}", ""
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        # Check if reference already exists to avoid duplicates
-        # Normalized check (ignoring whitespace/list markers)
-        clean_ref = reference_content.strip()
-        for line in lines:
-            if clean_ref in line:
-                 return True, f"Reference '{clean_ref}' already exists in {file_path}.", file_path
-
-        # Find "## References" header (or fallback to "# References")
-        ref_header_index = -1
-        for i, line in enumerate(lines):
-            stripped = line.strip().lower()
-            if stripped == "## references" or stripped == "# references":
-                ref_header_index = i
-                break
-        
-        new_lines = []
-        formatted_ref = f"- {clean_ref}\n"
-
-        if ref_header_index != -1:
-            # Header exists, insert immediately after
-            new_lines = lines[:ref_header_index+1] + [formatted_ref] + lines[ref_header_index+1:]
-        else:
-            # Header missing, append to end of file with a separator
-            # Ensure there is a newline before the separator if file is not empty
-            prefix = "\n" if lines and lines[-1].strip() != "" else ""
-            footer = f"{prefix}\n---\n## References\n{formatted_ref}"
-            new_lines = lines + [footer]
-
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
-
-        return True, f"Successfully added reference to {file_path}.", file_path
+        note = read_parsed_note(file_path)
+        success, message = _add_reference(note, file_path, reference_content)
+        if note.modified:
+            write_parsed_note(file_path, note)
+        return success, message, file_path
 
     except Exception as e:
         return False, f"Error adding reference to {file_path}: {e}", ""
@@ -1,5 +1,137 @@
 import os
-import re
+import datetime
+from .note_overlay import note_exists, read_note, write_note, note_lock
+from ..utils.note_document import Note
+
+# Version history of notes edited with prepend_to_file.
+# Trimmed versions are appended to a per-note segment log (=3_Archived/.history/<note>.log) and
+# recorded in a small text index next to it (<note>.idx), so archiving a version costs the size of
+# that version, not of the whole archive. The index has one line per entry ("E <offset> <length>
+# <date>") plus one line per compaction ("C <entries in the view>"); both files are only appended to.
+# The readable view, =3_Archived/<note>_History.md (newest version first), is brought up to date by
+# compaction, which inserts the entries added since the last one below its header: every
+# COMPACT_EVERY archived versions, before renames, or on demand with compact_note_history(). The view
+# stays an ordinary note (renames rewrite its links); rebuild=True regenerates it from the segments.
+
+ARCHIVE_DIR = "=3_Archived"
+HISTORY_DIR = os.path.join(ARCHIVE_DIR, ".history") # Hidden from Obsidian
+COMPACT_EVERY = 10
+ENTRY_HEADER = "--- ARCHIVED FROM MAIN NOTE ---"
+
+def history_archive_path(note_name: str) -> str:
+    """The archive file holding the trimmed versions of a note (shared by notes with the same name)."""
+    return os.path.join(ARCHIVE_DIR, f"{note_name}_History.md")
+
+def _segment_paths(note_name: str) -> (str, str):
+    """(segment log, index) of a note's history."""
+    base = os.path.join(HISTORY_DIR, note_name)
+    return f"{base}.log", f"{base}.idx"
+
+def get_compact_every() -> int:
+    try:
+        return max(int(os.environ.get("GEMINI_HISTORY_COMPACT_EVERY", COMPACT_EVERY)), 1)
+    except ValueError:
+        return COMPACT_EVERY
+
+def _read_index(index_path: str) -> (list, int):
+    """([(offset, length, date)] oldest first, number of entries in the view at the last compaction)."""
+    entries, rendered = [], 0
+    if not os.path.exists(index_path):
+        return entries, rendered
+    with open(index_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 4 and fields[0] == "E":
+                entries.append((int(fields[1]), int(fields[2]), fields[3]))
+            elif len(fields) == 2 and fields[0] == "C":
+                rendered = int(fields[1])
+    return entries, rendered
+
+def append_history_entry(note_name: str, version: str) -> int:
+    """Appends one archived version to the note's segment log. Returns the number of entries not yet in the view."""
+    log_path, index_path = _segment_paths(note_name)
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    data = f"{ENTRY_HEADER}\n{version.strip()}\n".encode('utf-8')
+    with open(log_path, 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(data)
+    with open(index_path, 'a', encoding='utf-8') as f:
+        f.write(f"E {offset} {len(data)} {datetime.date.today().strftime('%Y-%m-%d')}\n")
+    entries, rendered = _read_index(index_path)
+    return len(entries) - rendered
+
+def _read_entries(log_path: str, entries: list) -> list:
+    """The text of the given index entries, newest first."""
+    blocks = []
+    with open(log_path, 'rb') as f:
+        for offset, length, _ in reversed(entries):
+            f.seek(offset)
+            blocks.append(f.read(length).decode('utf-8'))
+    return blocks
+
+def compact_note_history(note_name: str, rebuild: bool = False) -> (bool, str):
+    """
+    Adds the versions archived since the last compaction to =3_Archived/<note>_History.md, newest
+    first below its header. rebuild=True writes the view again from every segment instead.
+    """
+    log_path, index_path = _segment_paths(note_name)
+    if not os.path.exists(index_path):
+        return False, f"No history segments for {note_name}."
+    archive_file = history_archive_path(note_name)
+    try:
+        with note_lock(archive_file):
+            entries, rendered = _read_index(index_path)
+            if rebuild or not note_exists(archive_file):
+                new_entries = entries
+            else:
+                new_entries = entries[rendered:]
+            if not new_entries:
+                return True, f"The history of {note_name} is up to date."
+            blocks = _read_entries(log_path, new_entries)
+
+            if rebuild or not note_exists(archive_file):
+                write_note(archive_file, f"""---
+title: {note_name} History
+tags: #type/archive
+---
+
+# {note_name} Intellectual History
+
+""" + "\n".join(blocks))
+            else:
+                # Insert after the header section (# Note Intellectual History) and its blank line
+                archive = Note(read_note(archive_file))
+                header = next((h for h in archive.headings if h.title.endswith(" Intellectual History")), None)
+                added = "".join(f"{block}\n" for block in blocks)
+                if header and archive.text.startswith("\n", header.end):
+                    archive.splice(header.end + 1, header.end + 1, added)
+                else:
+                    # Fallback if header not found
+                    archive.splice(0, 0, added)
+                write_note(archive_file, archive.render())
+
+            with open(index_path, 'a', encoding='utf-8') as f:
+                f.write(f"C {len(entries)}\n")
+        return True, f"Compacted the history of {note_name} ({len(new_entries)} versions added)."
+    except Exception as e:
+        return False, f"Error compacting history for {note_name}: {e}"
+
+def compact_all_history(rebuild: bool = False) -> (bool, str):
+    """Compacts every note whose view is missing versions (rebuilds every view if rebuild)."""
+    if not os.path.isdir(HISTORY_DIR):
+        return True, "No history segments to compact."
+    messages = []
+    all_success = True
+    for filename in sorted(os.listdir(HISTORY_DIR)):
+        if not filename.endswith(".idx"):
+            continue
+        note_name = filename[:-len(".idx")]
+        entries, rendered = _read_index(os.path.join(HISTORY_DIR, filename))
+        if rebuild or len(entries) > rendered:
+            success, message = compact_note_history(note_name, rebuild)
+            all_success = all_success and success
+            messages.append(message)
+    return all_success, "\n".join(messages) if messages else "Every history view is up to date."
 
 def trim_note_history(file_path: str, actual_versions: list, note_name: str) -> (bool, str):
     """
@@ -11,42 +143,15 @@ def trim_note_history(file_path: str, actual_versions: list, note_name: str) ->
         # The caller should have already counted them.
         # Move oldest to Archive
         oldest_version = actual_versions.pop(-1)
-        archive_dir = "=3_Archived"
-        os.makedirs(archive_dir, exist_ok=True)
-        
-        archive_file = os.path.join(archive_dir, f"{note_name}_History.md")
-        
-        # Prepend oldest to the top of the history file (after header)
-        if not os.path.exists(archive_file):
-            with open(archive_file, 'w', encoding='utf-8') as af:
-                af.write(f"""---
-title: {note_name} History
-tags: #type/archive
----
+        archive_file = history_archive_path(note_name)
 
-# {note_name} Intellectual History
+        # Notes with the same name share an archive
+        with note_lock(archive_file):
+            pending = append_history_entry(note_name, oldest_version)
+            # The readable view is rebuilt every few versions (or on demand), not on every edit
+            if pending >= get_compact_every() or not note_exists(archive_file):
+                compact_note_history(note_name)
 
---- ARCHIVED FROM MAIN NOTE ---
-{oldest_version.strip()}
-""")
-        else:
-            with open(archive_file, 'r', encoding='utf-8') as af:
-                archive_content = af.read()
-            
-            # Find the end of the header section (# Note Intellectual History)
-            header_pattern = re.compile(r'(# .*? Intellectual History\n\n)', re.DOTALL)
-            header_match = header_pattern.search(archive_content)
-            
-            if header_match:
-                header_end = header_match.end()
-                new_archive_content = archive_content[:header_end] + f"--- ARCHIVED FROM MAIN NOTE ---\n{oldest_version.strip()}\n\n" + archive_content[header_end:]
-            else:
-                # Fallback if header not found
-                new_archive_content = f"--- ARCHIVED FROM MAIN NOTE ---\n{oldest_version.strip()}\n\n" + archive_content
-                
-            with open(archive_file, 'w', encoding='utf-8') as af:
-                af.write(new_archive_content)
-        
         return True, f"Archived oldest version of {note_name} to {archive_file}"
     except Exception as e:
         return False, f"Error archiving history for {note_name}: {e}"
@@ -3,127 +3,119 @@ import datetime
 import yaml
 import re
 from .note_core import sanitize_filename
+from .backlink_index import get_backlink_index, write_atomic
+from .note_overlay import note_exists, flush_notes, read_parsed_note, write_parsed_note
+from .note_history import compact_all_history
+from ..utils.note_document import Note
+
+def apply_note_metadata(note: Note, add_tags: list = None, add_aliases: list = None, new_title: str = None, update_edited_timestamp: bool = False, remove_tags: list = None, remove_aliases: list = None) -> bool:
+    """
+    Records the frontmatter changes of update_note_metadata on a parsed note (see note_document.py).
+    Returns whether anything changed.
+    """
+    metadata = note.metadata
+
+    # Normalize keys to Capitalized for writing, but read flexibly
+    # Helper to get value from either Capitalized or lowercase key
+    def get_meta(key, default=None):
+        return metadata.get(key.capitalize(), metadata.get(key.lower(), default))
+        
+    updated = False
+
+    # --- TAGS ---
+    if add_tags or remove_tags:
+        current_tags = get_meta('tags', [])
+        if isinstance(current_tags, str):
+            current_tags = [t.strip() for t in current_tags.split(',')]
+        if not isinstance(current_tags, list):
+            current_tags = []
+
+        if add_tags:
+            for tag in add_tags:
+                if tag not in current_tags:
+                    current_tags.append(tag)
+                    updated = True
+        
+        if remove_tags:
+            new_tags = [t for t in current_tags if t not in remove_tags]
+            if len(new_tags) != len(current_tags):
+                current_tags = new_tags
+                updated = True
+        
+        # Clean up old lowercase key if present, enforce Capitalized
+        if 'tags' in metadata: del metadata['tags']
+        metadata['Tags'] = current_tags
+
+    # --- ALIASES ---
+    if add_aliases or remove_aliases:
+        current_aliases = get_meta('aliases', [])
+        if not isinstance(current_aliases, list):
+            current_aliases = []
+
+        if add_aliases:
+            for alias in add_aliases:
+                if alias not in current_aliases:
+                    current_aliases.append(alias)
+                    updated = True
+        
+        if remove_aliases:
+            new_aliases = [a for a in current_aliases if a not in remove_aliases]
+            if len(new_aliases) != len(current_aliases):
+                current_aliases = new_aliases
+                updated = True
+
+        # Clean up old lowercase key if present, enforce Capitalized
+        if 'aliases' in metadata: del metadata['aliases']
+        metadata['Aliases'] = current_aliases
+    
+    # --- TITLE (Aliases Only) ---
+    # We no longer store 'title' in YAML, but we handle renaming by adding old title to aliases
+    if new_title:
+         # Logic: If we are renaming, we assume the file rename happens elsewhere (propagate_rename)
+         # Here we just ensure the OLD title is preserved as an alias if needed.
+         # We rely on the caller to provide the *old* title context if they want it aliased,
+         # but propagate_rename passes 'new_title' as the target name.
+         
+         # Actually, propagate_rename calls this. Let's look at how it uses it.
+         # It says: update_note_metadata(old_path, add_aliases=[old_name], new_title=safe_new_name...)
+         # So we just need to ensure we don't WRITE 'title' to YAML.
+         
+         # If 'title' key exists in legacy note, remove it.
+         if 'title' in metadata: 
+             del metadata['title']
+             updated = True
+         if 'Title' in metadata:
+             del metadata['Title']
+             updated = True
+
+    # --- EDITED ---
+    if update_edited_timestamp:
+        # Clean up old lowercase key
+        if 'edited' in metadata: del metadata['edited']
+        metadata['Edited'] = datetime.date.today().strftime("%Y-%m-%d")
+        updated = True
+
+    if updated:
+        # Ensure 'Created' is Capitalized if it exists as 'created'
+        if 'created' in metadata:
+            metadata['Created'] = metadata.pop('created')
+        note.set_frontmatter(yaml.dump(metadata, sort_keys=False, default_flow_style=False), metadata)
+    return updated
 
 def update_note_metadata(file_path: str, add_tags: list = None, add_aliases: list = None, new_title: str = None, update_edited_timestamp: bool = False, remove_tags: list = None, remove_aliases: list = None) -> (bool, str):
     """
     Updates the YAML frontmatter of a note.
     """
-    if not os.path.exists(file_path):
+    if not note_exists(file_path):
         return False, f"Error: File not found at {file_path}"
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        frontmatter_start = -1
-        frontmatter_end = -1
-        
-        for i in range(len(lines)):
-            if lines[i].strip() == "---":
-                if frontmatter_start == -1:
-                    frontmatter_start = i
-                else:
-                    frontmatter_end = i
-                    break
-        
-        if frontmatter_start == -1 or frontmatter_end == -1:
+        note = read_parsed_note(file_path)
+        if not note.has_frontmatter:
             return False, "Error: Invalid or missing YAML frontmatter."
 
-        # Extract YAML content
-        yaml_content = "".join(lines[frontmatter_start+1:frontmatter_end])
-        metadata = yaml.safe_load(yaml_content) or {}
-
-        # Normalize keys to Capitalized for writing, but read flexibly
-        # Helper to get value from either Capitalized or lowercase key
-        def get_meta(key, default=None):
-            return metadata.get(key.capitalize(), metadata.get(key.lower(), default))
-            
-        updated = False
-
-        # --- TAGS ---
-        if add_tags or remove_tags:
-            current_tags = get_meta('tags', [])
-            if isinstance(current_tags, str):
-                current_tags = [t.strip() for t in current_tags.split(',')]
-            if not isinstance(current_tags, list):
-                current_tags = []
-
-            if add_tags:
-                for tag in add_tags:
-                    if tag not in current_tags:
-                        current_tags.append(tag)
-                        updated = True
-            
-            if remove_tags:
-                new_tags = [t for t in current_tags if t not in remove_tags]
-                if len(new_tags) != len(current_tags):
-                    current_tags = new_tags
-                    updated = True
-            
-            # Clean up old lowercase key if present, enforce Capitalized
-            if 'tags' in metadata: del metadata['tags']
-            metadata['Tags'] = current_tags
-
-        # --- ALIASES ---
-        if add_aliases or remove_aliases:
-            current_aliases = get_meta('aliases', [])
-            if not isinstance(current_aliases, list):
-                current_aliases = []
-
-            if add_aliases:
-                for alias in add_aliases:
-                    if alias not in current_aliases:
-                        current_aliases.append(alias)
-                        updated = True
-            
-            if remove_aliases:
-                new_aliases = [a for a in current_aliases if a not in remove_aliases]
-                if len(new_aliases) != len(current_aliases):
-                    current_aliases = new_aliases
-                    updated = True
-
-            # Clean up old lowercase key if present, enforce Capitalized
-            if 'aliases' in metadata: del metadata['aliases']
-            metadata['Aliases'] = current_aliases
-        
-        # --- TITLE (Aliases Only) ---
-        # We no longer store 'title' in YAML, but we handle renaming by adding old title to aliases
-        if new_title:
-             # Logic: If we are renaming, we assume the file rename happens elsewhere (propagate_rename)
-             # Here we just ensure the OLD title is preserved as an alias if needed.
-             # We rely on the caller to provide the *old* title context if they want it aliased,
-             # but propagate_rename passes 'new_title' as the target name.
-             
-             # Actually, propagate_rename calls this. Let's look at how it uses it.
-             # It says: update_note_metadata(old_path, add_aliases=[old_name], new_title=safe_new_name...)
-             # So we just need to ensure we don't WRITE 'title' to YAML.
-             
-             # If 'title' key exists in legacy note, remove it.
-             if 'title' in metadata: 
-                 del metadata['title']
-                 updated = True
-             if 'Title' in metadata:
-                 del metadata['Title']
-                 updated = True
-
-        # --- EDITED ---
-        if update_edited_timestamp:
-            # Clean up old lowercase key
-            if 'edited' in metadata: del metadata['edited']
-            metadata['Edited'] = datetime.date.today().strftime("%Y-%m-%d")
-            updated = True
-
-        if updated:
-            # Ensure 'Created' is Capitalized if it exists as 'created'
-            if 'created' in metadata:
-                metadata['Created'] = metadata.pop('created')
-            
-            new_yaml = yaml.dump(metadata, sort_keys=False, default_flow_style=False)
-            new_frontmatter = ["---\n", new_yaml, "---\n"]
-            new_file_lines = new_frontmatter + lines[frontmatter_end+1:]
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.writelines(new_file_lines)
+        if apply_note_metadata(note, add_tags, add_aliases, new_title, update_edited_timestamp, remove_tags, remove_aliases):
+            write_parsed_note(file_path, note)
             return True, f"Updated metadata for {file_path}"
         else:
             return True, f"No metadata changes needed for {file_path}"
@@ -131,54 +123,86 @@ def update_note_metadata(file_path: str, add_tags: list = None, add_aliases: lis
     except Exception as e:
         return False, f"Error updating metadata: {e}"
 
-def propagate_rename(old_path: str, new_name: str) -> (bool, str):
-    """Renames a note and updates all wikilinks in the vault."""
+def propagate_renames(renames: list) -> (bool, str, list):
+    """
+    Renames several notes and updates their wikilinks in one pass: a single pattern matches links to
+    any of the old names, and each linking note is rewritten at most once.
+    renames is a list of (old_path, new_name). Returns (success, summary, results) where results holds
+    (success, message, new_path) for each rename, in order. The renames apply simultaneously, so a
+    link is renamed once even if its new name is another rename's old name.
+    """
+    results = []
+    planned = [] # (old_path, old_name, new_path, safe_new_name)
     try:
-        if not os.path.exists(old_path):
-            return False, f"Source file not found: {old_path}"
-
-        old_name = os.path.splitext(os.path.basename(old_path))[0]
-        directory = os.path.dirname(old_path)
-        
-        # Ensure we sanitize the new name
-        safe_new_name = sanitize_filename(new_name)
-        new_path = os.path.join(directory, f"{safe_new_name}.md")
-
-        if os.path.exists(new_path):
-            return False, f"Target filename already exists: {new_path}"
-
-        # 1. Update all links in the vault
-        # Handle optional paths (using / or \) before the note name
-        link_pattern = re.compile(rf'\[\[(.*?[\/\\])?{re.escape(old_name)}(\|.*?)?\]\]')
-        
-        vault_files = []
-        for root, _, files in os.walk("."):
-            for file in files:
-                if file.endswith(".md"):
-                    vault_files.append(os.path.join(root, file))
-
-        updated_files_count = 0
-        for file in vault_files:
+        # Renames work on the files on disk: write any buffered edits first (see note_overlay.py),
+        # and add pending archived versions to their history views so their links are renamed too
+        compact_all_history()
+        flush_notes()
+        sources, targets = set(), set()
+        for old_path, new_name in renames:
+            old_name = os.path.splitext(os.path.basename(old_path))[0]
+            safe_new_name = sanitize_filename(new_name)
+            new_path = os.path.join(os.path.dirname(old_path), f"{safe_new_name}.md")
+            if not os.path.exists(old_path):
+                results.append((False, f"Source file not found: {old_path}", None))
+            elif os.path.normpath(old_path) in sources:
+                results.append((False, f"Note is already renamed in this batch: {old_path}", None))
+            elif os.path.exists(new_path) or os.path.normpath(new_path) in targets:
+                results.append((False, f"Target filename already exists: {new_path}", None))
+            else:
+                sources.add(os.path.normpath(old_path))
+                targets.add(os.path.normpath(new_path))
+                planned.append((old_path, old_name, new_path, safe_new_name))
+                results.append((True, f"Renamed '{old_name}' to '{safe_new_name}'.", new_path))
+
+        if not planned:
+            return True, "Updated links in 0 files.", results
+
+        # 1. Update links in the notes that link to any old name (see backlink_index.py)
+        # Handle optional paths (using / or \) before the note name. Notes sharing a name keep the first rename.
+        new_names = {}
+        for _, old_name, _, safe_new_name in planned:
+            new_names.setdefault(old_name, safe_new_name)
+        alternatives = "|".join(re.escape(name) for name in sorted(new_names, key=len, reverse=True))
+        link_pattern = re.compile(rf'\[\[(.*?[\/\\])?({alternatives})(\|.*?)?\]\]')
+        index = get_backlink_index()
+        candidates = sorted(set().union(*(index.files_linking_to(name) for name in new_names)))
+
+        updated_files = []
+        for rel_path in candidates:
+            file = os.path.join(index.vault_root, rel_path)
             try:
                 with open(file, 'r', encoding='utf-8') as f:
                     content = f.read()
                 
                 if link_pattern.search(content):
                     # We use a lambda to preserve the optional path captured in group 1
-                    new_content = link_pattern.sub(lambda m: f'[[{m.group(1) or ""}{safe_new_name}{m.group(2) or ""}]]', content)
-                    with open(file, 'w', encoding='utf-8') as f:
-                        f.write(new_content)
-                    updated_files_count += 1
+                    new_content = link_pattern.sub(lambda m: f'[[{m.group(1) or ""}{new_names[m.group(2)]}{m.group(3) or ""}]]', content)
+                    write_atomic(file, new_content)
+                    updated_files.append(file)
             except UnicodeDecodeError:
                 continue # Skip files that are not valid UTF-8
 
-        # 2. Add old title to aliases of the note itself BEFORE renaming
-        update_note_metadata(old_path, add_aliases=[old_name], new_title=safe_new_name, update_edited_timestamp=True)
+        # 2. Add old titles to aliases of the notes themselves BEFORE renaming, then rename the files
+        for old_path, old_name, new_path, safe_new_name in planned:
+            update_note_metadata(old_path, add_aliases=[old_name], new_title=safe_new_name, update_edited_timestamp=True)
+            flush_notes([old_path])
+            os.rename(old_path, new_path)
 
-        # 3. Rename the file
-        os.rename(old_path, new_path)
+        # 3. Record the renames and the rewritten links in one index transaction
+        index.record(updated=updated_files, moved=[(old_path, new_path) for old_path, _, new_path, _ in planned])
 
-        return True, f"Renamed '{old_name}' to '{safe_new_name}'. Updated links in {updated_files_count} files."
+        return True, f"Updated links in {len(updated_files)} files.", results
 
     except Exception as e:
-        return False, f"Error during rename propagation: {e}"
+        return False, f"Error during rename propagation: {e}", results
+
+def propagate_rename(old_path: str, new_name: str) -> (bool, str):
+    """Renames a note and updates all wikilinks in the vault."""
+    success, summary, results = propagate_renames([(old_path, new_name)])
+    if not success or not results:
+        return False, summary
+    rename_success, message, _ = results[0]
+    if not rename_success:
+        return False, message
+    return True, f"{message} {summary}"
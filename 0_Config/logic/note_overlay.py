@@ -0,0 +1,130 @@
+import os
+import threading
+from contextlib import contextmanager
+from .backlink_index import write_atomic
+from ..utils.note_document import Note
+
+# Write-back overlay for batch edits.
+# Inside `buffered_notes()` the note functions (create, edit, metadata, references, history) read and
+# write notes through this module: each note is read from disk once, every later operation sees the
+# in-memory content, and each changed note is written once (atomically) when the block ends or when
+# flush_notes() is called. Outside the block reads and writes go straight to disk, so single edits
+# behave as before. Operations that work on the files themselves (renames, subprocesses reading the
+# vault) must flush first. The parsed form of each buffered note is kept too (read_parsed_note), so a
+# batch parses a note once rather than once per operation.
+
+overlay_lock = threading.RLock()
+_overlay = None # {absolute path: content} while a batch is active
+_dirty = set()
+_parsed = {} # {absolute path: Note of the buffered content} while a batch is active
+overlay_stats = {"reads": 0, "edits": 0, "writes": 0}
+_note_locks = {} # {absolute path: lock} held across a read-modify-write of one note
+
+def _key(path: str) -> str:
+    return os.path.normpath(os.path.abspath(path))
+
+def note_lock(path: str) -> threading.RLock:
+    """The lock serializing read-modify-write operations on one note (used by parallel plan execution)."""
+    with overlay_lock:
+        return _note_locks.setdefault(_key(path), threading.RLock())
+
+def note_exists(path: str) -> bool:
+    with overlay_lock:
+        if _overlay is not None and _key(path) in _overlay:
+            return True
+    return os.path.exists(path)
+
+def read_note(path: str) -> str:
+    """The note's current content (buffered if a batch is active). Raises like open() if it does not exist."""
+    key = _key(path)
+    with overlay_lock:
+        buffered = _overlay is not None
+        if buffered and key in _overlay:
+            return _overlay[key]
+    # Read outside the lock so that parallel plan items do not wait for each other's disk reads
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if not buffered:
+        return content
+    with overlay_lock:
+        if _overlay is None:
+            return content
+        if key not in _overlay:
+            _overlay[key] = content
+            overlay_stats["reads"] += 1
+        return _overlay[key]
+
+def write_note(path: str, content: str) -> None:
+    """Writes a note atomically, or buffers the write if a batch is active."""
+    with overlay_lock:
+        if _overlay is not None:
+            key = _key(path)
+            _overlay[key] = content
+            _dirty.add(key)
+            overlay_stats["edits"] += 1
+            return
+    write_atomic(path, content)
+
+def read_parsed_note(path: str) -> Note:
+    """The note parsed (see note_document.py); reused while a batch is active and the note is unchanged."""
+    key = _key(path)
+    content = read_note(path)
+    with overlay_lock:
+        cached = _parsed.get(key) if _overlay is not None else None
+        if cached is not None and cached.text is content and not cached.modified:
+            return cached
+    note = Note(content)
+    with overlay_lock:
+        if _overlay is not None and _overlay.get(key) is content:
+            _parsed[key] = note
+    return note
+
+def write_parsed_note(path: str, note: Note) -> Note:
+    """Writes a parsed note's recorded edits (see write_note). Returns the Note of the new content."""
+    following = note.successor()
+    write_note(path, following.text)
+    with overlay_lock:
+        if _overlay is not None:
+            _parsed[_key(path)] = following
+    return following
+
+def flush_notes(paths: list = None) -> int:
+    """
+    Writes the buffered changes of the given notes (all if None) to disk and drops them from the
+    overlay, so later reads see the files again. Returns the number of notes written.
+    """
+    with overlay_lock:
+        if _overlay is None:
+            return 0
+        keys = list(_overlay) if paths is None else [_key(path) for path in paths if _key(path) in _overlay]
+        written = 0
+        for key in keys:
+            content = _overlay.pop(key)
+            _parsed.pop(key, None)
+            if key in _dirty:
+                _dirty.discard(key)
+                os.makedirs(os.path.dirname(key), exist_ok=True)
+                write_atomic(key, content)
+                written += 1
+        overlay_stats["writes"] += written
+        return written
+
+@contextmanager
+def buffered_notes():
+    """Buffers note reads and writes until the block ends (nested blocks share the outer buffer)."""
+    global _overlay
+    with overlay_lock:
+        outer = _overlay is not None
+        if not outer:
+            _overlay = {}
+    try:
+        yield
+    finally:
+        if not outer:
+            with overlay_lock:
+                try:
+                    flush_notes()
+                finally:
+                    _overlay = None
+                    _dirty.clear()
+                    _parsed.clear()
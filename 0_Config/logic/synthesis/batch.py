@@ -0,0 +1,237 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import datetime
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ..note_batch import execute_integration_plan
+from ..commit_queue import queue_commit
+from ...utils.command_utils import sanitize_filename
+from ...utils.moc_management import update_gemini_index_moc
+from ...utils.rate_limiter import RATE_LIMIT_STATE_ENV
+from .journal import RunJournal, JOURNAL_FILENAME
+from .init import INDEX_PATH, SKIP_INDEX_REFRESH_ENV
+from .workspace import remove_run_dir
+
+# Folder-level batch synthesis (`synthesis init --batch <dir|glob>`).
+# Every source runs the init chain up to its integration plan in its own CLI process and run
+# directory, concurrently, drawing on the shared cross-process rate limiter. Only the
+# vault-mutating apply step (note edits + git commit) is serialized. Per-source status lives in a table that
+# `--resume` picks up, and GEMINI_INDEX is rebuilt once per batch instead of once per source.
+
+DEFAULT_BATCH_WORKERS = 3
+BATCH_DIRNAME = "synthesis_batch"
+STATUS_FILENAME = "batch_status.json"
+
+# pending -> running -> planned -> applied, or failed at any point
+BATCH_STATUSES = ["pending", "running", "planned", "applied", "failed"]
+
+def get_batch_dir() -> str:
+    return os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), BATCH_DIRNAME)
+
+def expand_batch_sources(pattern: str) -> list:
+    """A directory yields its Markdown files (non-recursive); anything else is a glob pattern."""
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern) if name.endswith(".md")]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(os.path.normpath(path) for path in paths if os.path.isfile(path))
+
+def _source_slug(source: str) -> str:
+    stem = sanitize_filename(os.path.splitext(os.path.basename(source))[0])[:40]
+    return f"{stem}-{hashlib.sha256(source.encode('utf-8')).hexdigest()[:6]}"
+
+class BatchStatus:
+    """
+    {"pattern": ..., "started": ..., "sources": {source: {"slug", "status", "run_dir", "log",
+    "seconds", "final_note", "error", "updated"}}}, saved after every change.
+    """
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(get_batch_dir(), STATUS_FILENAME)
+        self.state = None
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            return isinstance(self.state, dict) and "sources" in self.state
+        except (OSError, ValueError):
+            self.state = None
+            return False
+
+    def start(self, pattern: str) -> None:
+        self.state = {"pattern": pattern, "started": datetime.datetime.now().isoformat(timespec="seconds"), "sources": {}}
+        self._save()
+
+    def add(self, source: str) -> None:
+        with self._lock:
+            if source not in self.state["sources"]:
+                slug = _source_slug(source)
+                self.state["sources"][source] = {
+                    "slug": slug,
+                    "status": "pending",
+                    "run_dir": os.path.join(get_batch_dir(), "runs", slug),
+                    "log": os.path.join(get_batch_dir(), "logs", f"{slug}.log"),
+                    "seconds": 0.0,
+                    "final_note": None,
+                    "error": None,
+                }
+            self._save()
+
+    def update(self, source: str, **fields) -> None:
+        with self._lock:
+            self.state["sources"][source].update(fields, updated=datetime.datetime.now().isoformat(timespec="seconds"))
+            self._save()
+
+    def entry(self, source: str) -> dict:
+        with self._lock:
+            return dict(self.state["sources"][source])
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def format_table(self) -> str:
+        with self._lock:
+            lines = [f"{'Status':<8}  {'Time':>7}  Source"]
+            for source, entry in self.state["sources"].items():
+                detail = entry["final_note"] or entry["error"] or ""
+                lines.append(f"{entry['status']:<8}  {entry['seconds']:>6.0f}s  {source}" + (f"  ({detail})" if detail else ""))
+            return "\n".join(lines)
+
+def is_batch_active(max_age_seconds: float) -> bool:
+    """
+    True if a batch still has pending or running sources and its status table or any source log
+    changed within max_age_seconds (a crashed batch stops being active once it goes quiet).
+    """
+    status = BatchStatus()
+    if not status.load():
+        return False
+    if not any(entry["status"] in ["pending", "running"] for entry in status.state["sources"].values()):
+        return False
+    latest = os.path.getmtime(status.path)
+    logs_dir = os.path.join(get_batch_dir(), "logs")
+    if os.path.isdir(logs_dir):
+        latest = max([latest] + [os.path.getmtime(path) for path in glob.glob(os.path.join(logs_dir, "*.log"))])
+    return time.time() - latest <= max_age_seconds
+
+def _run_until_plan(source: str, entry: dict, input_mode: str) -> (bool, str):
+    """Runs `synthesis init` up to the integration plan in a child process with its own run directory."""
+    run_dir = entry["run_dir"]
+    os.makedirs(run_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(entry["log"]), exist_ok=True)
+
+    command = [sys.executable, "0_Config/main_cli.py", "synthesis", "init", "--source", source,
+               "--input-mode", input_mode, "--stop-after", "plan", "--run-dir", run_dir]
+    if os.path.exists(os.path.join(run_dir, JOURNAL_FILENAME)):
+        command.append("--resume")
+
+    env = dict(os.environ)
+    env[SKIP_INDEX_REFRESH_ENV] = "1"
+
+    with open(entry["log"], 'a', encoding='utf-8') as log:
+        log.write(f"\n=== {datetime.datetime.now().isoformat(timespec='seconds')} {' '.join(command[1:])}\n")
+        log.flush()
+        result = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+
+    journal = RunJournal(os.path.join(run_dir, JOURNAL_FILENAME))
+    if journal.load() and "plan" in journal.state["steps"]:
+        return True, journal.artifact("plan", "plan")
+    return False, f"No integration plan (exit code {result.returncode}); see {entry['log']}"
+
+def _apply_run(entry: dict) -> (bool, str):
+    """Applies a finished run's plan to the vault. Callers must hold the apply lock."""
+    journal = RunJournal(os.path.join(entry["run_dir"], JOURNAL_FILENAME))
+    if not journal.load():
+        return False, "Run journal missing."
+    final_path = journal.artifact("final", "final_note")
+    if "apply" not in journal.state["steps"]:
+        success, report = execute_integration_plan(journal.artifact("plan", "plan"), final_path, update_moc=False)
+        if not success:
+            return False, report.splitlines()[0] if report else "Integration failed."
+        journal.record("apply", data={"log": report})
+    return True, final_path
+
+def run_batch_workflow(pattern, input_mode="direct", resume=False, max_workers=None):
+    """
+    Runs the synthesis chain for every source matched by pattern (directory or glob).
+    Sources run concurrently up to their integration plans; plans are applied and committed
+    one at a time. With resume, sources already applied are skipped and the rest continue
+    from their own run journals.
+    """
+    max_workers = max_workers or DEFAULT_BATCH_WORKERS
+    status = BatchStatus()
+    if resume and status.load():
+        print(f"\n>>> RESUMING BATCH ({status.state['pattern']})")
+    else:
+        if resume:
+            print("[Warning] Resume requested but no batch status table found. Starting a new batch.")
+        status.start(pattern)
+
+    for source in expand_batch_sources(pattern):
+        status.add(source)
+    todo = [source for source, entry in status.state["sources"].items() if entry["status"] != "applied"]
+    if not todo:
+        return True, "Nothing to do: every source of the batch is already applied.\n" + status.format_table()
+
+    if os.environ.get(RATE_LIMIT_STATE_ENV, "").lower() == "off":
+        print(f"[Warning] {RATE_LIMIT_STATE_ENV}=off: the batch's processes will not share one rate limit budget.")
+
+    # Load the index once for the whole batch; the child runs skip their own rebuild
+    print(f"[Status] Rebuilding {INDEX_PATH} once for {len(todo)} sources...")
+    update_gemini_index_moc(vault_root=os.getcwd(), output_moc_path=INDEX_PATH)
+
+    apply_lock = threading.Lock()
+    applied = []
+
+    def process(source):
+        entry = status.entry(source)
+        start = time.perf_counter()
+        if entry["status"] != "planned":
+            status.update(source, status="running", error=None)
+            print(f"[Batch] Started: {source}")
+            success, result = _run_until_plan(source, entry, input_mode)
+            if not success:
+                status.update(source, status="failed", error=result, seconds=entry["seconds"] + time.perf_counter() - start)
+                print(f"[Batch] Failed: {source} ({result})")
+                return
+            status.update(source, status="planned")
+
+        with apply_lock:
+            print(f"[Batch] Applying: {source}")
+            success, result = _apply_run(entry)
+        seconds = entry["seconds"] + time.perf_counter() - start
+        if not success:
+            status.update(source, status="failed", error=result, seconds=seconds)
+            print(f"[Batch] Apply failed: {source} ({result})")
+            return
+        status.update(source, status="applied", final_note=os.path.basename(result), seconds=seconds)
+        applied.append(source)
+        remove_run_dir(entry["run_dir"])
+        print(f"[Batch] Done: {source} ({seconds:.0f}s)")
+
+    batch_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(process, todo))
+    elapsed = time.perf_counter() - batch_start
+
+    if applied:
+        update_gemini_index_moc(vault_root=os.getcwd(), output_moc_path=INDEX_PATH)
+        queue_commit([INDEX_PATH], f"chore: Update GEMINI_INDEX after batch synthesis of {len(applied)} sources")
+
+    failed = [source for source in todo if status.entry(source)["status"] == "failed"]
+    throughput = len(applied) / (elapsed / 3600) if elapsed > 0 else 0.0
+    summary = (f"Batch: {len(applied)} applied, {len(failed)} failed of {len(todo)} sources in {elapsed:.0f}s "
+               f"({throughput:.1f} sources/hour, {max_workers} workers).\n"
+               f"Status table: {status.path}\n\n{status.format_table()}")
+    if failed:
+        summary += "\n\nRe-run with --resume to retry the failed sources."
+    return not failed, summary
@@ -0,0 +1,137 @@
+import os
+import re
+import sys
+
+try:
+    from ...utils.token_estimator import estimate_tokens
+except ImportError:
+    # Standalone execution (e.g. scripts/bench_chunking.py)
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "utils")))
+    from token_estimator import estimate_tokens
+
+# Token-budgeted, structure-aware chunking for Preliminary Synthesis.
+# Chunks are sized by estimated tokens (not lines) and cut preferentially at
+# Markdown headers, then inferred speaker turns, then paragraph breaks.
+
+DEFAULT_CHUNK_TOKENS = 8000
+DEFAULT_OVERLAP_TOKENS = 200
+MIN_FILL_RATIO = 0.5 # Never cut at a boundary that leaves the chunk less than half full
+
+# Boundary priorities (higher is a better cut point)
+CUT_HEADER = 3
+CUT_TURN = 2
+CUT_PARAGRAPH = 1
+CUT_LINE = 0
+
+HEADER_PATTERN = re.compile(r'^#{1,6}\s')
+TURN_PATTERN = re.compile(
+    r'^\s*(?:\*\*|__)?\s*(?:User|Me|You|You said|Human|Assistant|AI|Gemini|ChatGPT|Claude|Model|Bot|用户|我|助手)\s*(?:\*\*|__)?\s*[:：]',
+    re.IGNORECASE
+)
+
+def get_chunk_settings() -> (int, int):
+    """Reads the chunk token budget and overlap from GEMINI_CHUNK_TOKENS / GEMINI_CHUNK_OVERLAP."""
+    try:
+        budget = int(os.environ.get("GEMINI_CHUNK_TOKENS", DEFAULT_CHUNK_TOKENS))
+    except ValueError:
+        budget = DEFAULT_CHUNK_TOKENS
+    try:
+        overlap = int(os.environ.get("GEMINI_CHUNK_OVERLAP", DEFAULT_OVERLAP_TOKENS))
+    except ValueError:
+        overlap = DEFAULT_OVERLAP_TOKENS
+    return max(budget, 1), max(min(overlap, budget // 4), 0)
+
+def _classify_line(line: str, previous_line: str) -> int:
+    """Returns the cut priority of a boundary placed immediately BEFORE line."""
+    if HEADER_PATTERN.match(line):
+        return CUT_HEADER
+    if TURN_PATTERN.match(line):
+        return CUT_TURN
+    if previous_line is not None and not previous_line.strip() and line.strip():
+        return CUT_PARAGRAPH
+    return CUT_LINE
+
+def _split_oversized_line(line: str, budget: int) -> list:
+    """Splits a single line that alone exceeds the budget, preferring sentence ends."""
+    pieces = []
+    sentences = re.split(r'(?<=[.!?。！？])\s*', line)
+    current = ""
+    for sentence in sentences:
+        if not sentence:
+            continue
+        if current and estimate_tokens(current + sentence) > budget:
+            pieces.append(current)
+            current = ""
+        while estimate_tokens(sentence) > budget:
+            # Hard split: approximate characters per token from this sentence
+            ratio = max(len(sentence) // max(estimate_tokens(sentence), 1), 1)
+            pieces.append(sentence[:budget * ratio])
+            sentence = sentence[budget * ratio:]
+        current += sentence
+    if current:
+        pieces.append(current)
+    if pieces and line.endswith("\n") and not pieces[-1].endswith("\n"):
+        pieces[-1] += "\n"
+    return pieces
+
+def split_into_chunks(text: str, token_budget: int = None, overlap_tokens: int = None) -> list:
+    """
+    Splits text into chunks of at most ~token_budget estimated tokens.
+    When a chunk is full, it is cut at the best boundary seen since it reached MIN_FILL_RATIO
+    (header > speaker turn > paragraph > line). The last ~overlap_tokens of each chunk,
+    taken on line boundaries, are repeated at the start of the next one.
+    Returns a list of chunk strings; a text within budget yields a single chunk.
+    """
+    default_budget, default_overlap = get_chunk_settings()
+    budget = token_budget or default_budget
+    overlap = default_overlap if overlap_tokens is None else overlap_tokens
+
+    # (line, tokens, cut priority before this line)
+    lines = []
+    previous = None
+    for raw_line in text.splitlines(keepends=True):
+        priority = _classify_line(raw_line, previous)
+        previous = raw_line
+        if estimate_tokens(raw_line) > budget:
+            for j, piece in enumerate(_split_oversized_line(raw_line, budget)):
+                lines.append((piece, estimate_tokens(piece), priority if j == 0 else CUT_LINE))
+        else:
+            lines.append((raw_line, estimate_tokens(raw_line), priority))
+
+    if sum(tokens for _, tokens, _ in lines) <= budget:
+        return [text] if text else []
+
+    chunks = []
+    start = 0
+    carry = [] # overlap lines prepended to the next chunk
+    while start < len(lines):
+        used = sum(tokens for _, tokens, _ in carry)
+        end = start
+        best_cut, best_priority = None, -1
+        while end < len(lines) and used + lines[end][1] <= budget:
+            used += lines[end][1]
+            end += 1
+            if end < len(lines) and used >= budget * MIN_FILL_RATIO and lines[end][2] >= best_priority:
+                best_cut, best_priority = end, lines[end][2]
+
+        if end >= len(lines):
+            cut = len(lines)
+        elif best_cut is not None and best_priority > CUT_LINE:
+            cut = best_cut
+        else:
+            cut = max(end, start + 1)
+
+        body = lines[start:cut]
+        chunks.append("".join(line for line, _, _ in carry + body))
+
+        carry = []
+        if overlap and cut < len(lines):
+            overlap_used = 0
+            for line in reversed(body):
+                if overlap_used + line[1] > overlap:
+                    break
+                carry.insert(0, line)
+                overlap_used += line[1]
+        start = cut
+
+    return chunks
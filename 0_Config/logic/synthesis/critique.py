@@ -2,8 +2,10 @@ import os
 import shutil
 from ...prompts import critique_prompts
 from ...scripts.call_agent_task import call_sub_agent
+from ...utils.llm_scheduler import LIGHT_TIER
+from .workspace import resolve_run_dir, write_run_file
 
-def _run_critique(source_input, draft_input):
+def _run_critique(source_input, draft_input, run_dir):
     """
     Helper function to run a critique task via the Sub-Agent.
     """
@@ -17,10 +19,7 @@ def _run_critique(source_input, draft_input):
     if os.path.exists(source_input):
         input_files[context_source_file] = source_input
     else:
-        temp_src = os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), "temp_critique_src.md")
-        with open(temp_src, 'w', encoding='utf-8') as f:
-            f.write(source_input)
-        input_files[context_source_file] = temp_src
+        input_files[context_source_file] = write_run_file(run_dir, "critique_src", source_input)
 
     if os.path.exists(draft_input):
         input_files[draft_file] = draft_input
@@ -30,22 +29,17 @@ def _run_critique(source_input, draft_input):
 
     # Dispatch
     print(f"Dispatching Critique to Sub-Agent...")
-    result = call_sub_agent(agent_instruction, input_files=input_files)
+    result = call_sub_agent(agent_instruction, input_files=input_files, tier=LIGHT_TIER)
 
     # Retrieve
     if result:
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        os.makedirs(temp_dir, exist_ok=True)
-        final_report_path = os.path.join(temp_dir, f"critique_report_{os.urandom(4).hex()}.md")
-        with open(final_report_path, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return final_report_path
+        return write_run_file(run_dir, "critique_report", result)
     else:
         print("Sub-Agent failed to generate critique report.")
         return None
 
-def run_critique_workflow(source_input, draft_input):
-    critique_path = _run_critique(source_input, draft_input)
+def run_critique_workflow(source_input, draft_input, run_dir=None):
+    critique_path = _run_critique(source_input, draft_input, resolve_run_dir(run_dir, near=draft_input))
     if critique_path:
         return True, f"Critique Complete.\nReport saved to: {critique_path}"
     else:
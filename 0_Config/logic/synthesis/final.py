@@ -2,8 +2,13 @@ import os
 import shutil
 from ...prompts import final_prompts
 from ...scripts.call_agent_task import call_sub_agent
+from ...utils.llm_scheduler import LIGHT_TIER
+from ...utils.keyword_extractor import extract_keywords_local, get_keywords_engine, get_min_confidence
+from .workflow import Workflow, critique_and_refine
+from .patching import refine_with_patch
+from .workspace import resolve_run_dir, run_file, write_run_file
 
-def _run_single_final_synthesis(prelim_path, rag_path):
+def _run_single_final_synthesis(prelim_path, rag_path, run_dir):
     """
     Runs the Sub-Agent to generate the Final Note.
     """
@@ -24,14 +29,10 @@ def _run_single_final_synthesis(prelim_path, rag_path):
 
     # Retrieve
     if result:
-        workspace_dir = os.path.join("gemini_subagent", "workspace")
-        draft_file = os.path.join(workspace_dir, "final_draft.md")
-        with open(draft_file, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return draft_file
+        return write_run_file(run_dir, "final_draft", result)
     return None
 
-def _run_final_critique(draft_path, source_path):
+def _run_final_critique(draft_path, source_path, run_dir):
     # Prepare Prompt
     draft_file = "final_draft.md" 
     source_file = "source_ground_truth.md"
@@ -44,22 +45,17 @@ def _run_final_critique(draft_path, source_path):
     }
         
     print("Dispatching Final Note Critique...")
-    result = call_sub_agent(prompt, input_files=input_files)
+    result = call_sub_agent(prompt, input_files=input_files, tier=LIGHT_TIER)
     
     if result:
-        workspace_dir = os.path.join("gemini_subagent", "workspace")
-        report_file = os.path.join(workspace_dir, "critique_report.md")
-        with open(report_file, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return report_file
+        return write_run_file(run_dir, "critique_report", result)
     return None
 
-def _run_final_refinement(draft_path, report_path, source_path):
+def _run_final_refinement(draft_path, report_path, source_path, run_dir):
     # Prepare Prompt
     draft_file = "final_draft.md"
     source_file = "source_ground_truth.md"
     report_file = "critique_report.md"
-    prompt = final_prompts.get_final_refinement_prompt(draft_file, report_file, source_file)
 
     # Prepare Input Files
     input_files = {
@@ -68,16 +64,12 @@ def _run_final_refinement(draft_path, report_path, source_path):
         source_file: source_path if source_path and os.path.exists(source_path) else "/dev/null"
     }
     
-    print("Dispatching Final Note Refinement...")
-    result = call_sub_agent(prompt, input_files=input_files)
-    
-    if result:
-        workspace_dir = os.path.join("gemini_subagent", "workspace")
-        draft_out = os.path.join(workspace_dir, "final_draft.md")
-        with open(draft_out, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return draft_out
-    return None
+    def request(patch):
+        print(f"Dispatching Final Note Refinement{' (patch)' if patch else ''}...")
+        prompt = final_prompts.get_final_refinement_prompt(draft_file, report_file, source_file, patch=patch)
+        return call_sub_agent(prompt, input_files=input_files)
+
+    return refine_with_patch(draft_path, "markdown", lambda: request(True), lambda: request(False), run_dir, "final_draft")
 
 def extract_keywords_agent(file_path):
     """
@@ -91,61 +83,71 @@ def extract_keywords_agent(file_path):
     }
         
     print("Dispatching Keyword Extraction...")
-    result_content = call_sub_agent(prompt, input_files=input_files)
+    result_content = call_sub_agent(prompt, input_files=input_files, tier=LIGHT_TIER)
     
     if result_content:
         return result_content.strip()
         
     return None
 
-def run_final_workflow(prelim_path, rag_path, source_path=None):
+def extract_keywords(file_path):
+    """
+    Comma-separated RAG keywords for a file, from the engine chosen with --keywords-engine
+    (GEMINI_KEYWORDS_ENGINE): "agent" (Sub-Agent), "local" (utils/keyword_extractor.py) or
+    "hybrid" (local, falling back to the agent when the local confidence is low).
+    """
+    engine = get_keywords_engine()
+    if engine == "agent":
+        return extract_keywords_agent(file_path)
+
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except OSError as e:
+        print(f"[Warning] Could not read {file_path} for keyword extraction: {e}")
+        return extract_keywords_agent(file_path) if engine == "hybrid" else None
+
+    keywords, confidence = extract_keywords_local(content)
+    print(f"[Status] Local keywords ({confidence:.0%} confidence): {', '.join(keywords) or 'none'}")
+    if engine == "hybrid" and confidence < get_min_confidence():
+        print(f"[Status] Local confidence below {get_min_confidence():.0%}. Asking the Sub-Agent.")
+        agent_keywords = extract_keywords_agent(file_path)
+        if agent_keywords:
+            return agent_keywords
+    return ", ".join(keywords) or None
+
+def _verify_final(draft, source_path, run_dir):
+    return critique_and_refine(
+        draft,
+        lambda current: _run_final_critique(current, source_path, run_dir),
+        lambda current, report: _run_final_refinement(current, report, source_path, run_dir),
+        max_rounds=1,
+        label="Final Note"
+    )
+
+def _publish_final(verified, run_dir):
+    """Copies the verified draft to its published name in the run directory."""
+    final_path = run_file(run_dir, "final_synthesis")
+    shutil.copy(verified, final_path)
+    return final_path
+
+def run_final_workflow(prelim_path, rag_path, source_path=None, run_dir=None):
     """
-    Orchestrates the Final Note generation loop.
+    Orchestrates the Final Note generation loop (Draft -> Loop[Audit -> Refine] -> Publish)
+    on the workflow engine (see workflow.py).
     """
     print("\n--- Starting Final Synthesis Loop ---")
-    
-    # 1. Generation
-    print("[Status] Generating Final Note Draft...")
-    current_draft = _run_single_final_synthesis(prelim_path, rag_path)
-    if not current_draft:
-        print("[Error] Final Note Generation Failed.")
+    run_dir = resolve_run_dir(run_dir, near=prelim_path, label="final")
+
+    workflow = Workflow("final")
+    workflow.stage("draft", _run_single_final_synthesis, inputs=["prelim_path", "rag_path", "run_dir"], memoize=True)
+    workflow.stage("verified", _verify_final, inputs=["draft", "source_path", "run_dir"])
+    workflow.stage("final_path", _publish_final, inputs=["verified", "run_dir"])
+
+    success, result = workflow.run(prelim_path=prelim_path, rag_path=rag_path, source_path=source_path, run_dir=run_dir)
+    if not success:
+        print(f"[Error] Final Note Generation Failed: {result}")
         return False, "Final Note Generation Failed."
-    print(f"[Status] Draft Generated: {current_draft}")
-    
-    # 2. Loop
-    MAX_RETRIES = 1
-    for i in range(MAX_RETRIES):
-        print(f"\n[Status] Audit Attempt {i+1}/{MAX_RETRIES}...")
-        report = _run_final_critique(current_draft, source_path)
-        
-        if not report:
-            print("[Error] Critique failed. Proceeding with current draft.")
-            break
-            
-        print(f"[Status] Critique Report: {report}")
-            
-        with open(report, 'r', encoding='utf-8') as f:
-            content = f.read()
-            if "VERDICT: PASS" in content:
-                print("[Success] ✅ Final Note Verified.")
-                # Move to Temp
-                temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-                final_path = os.path.join(temp_dir, f"final_synthesis_{os.urandom(4).hex()}.md")
-                shutil.copy(current_draft, final_path)
-                return True, final_path
-        
-        print("[Status] ❌ Verification Failed. Refining...")
-        new_draft = _run_final_refinement(current_draft, report, source_path)
-        if new_draft:
-            print(f"[Success] Refinement Successful: {new_draft}")
-            current_draft = new_draft
-        else:
-            print("[Error] Refinement failed.")
-            break
-            
-    # Fallback return
-    temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-    final_path = os.path.join(temp_dir, f"final_synthesis_{os.urandom(4).hex()}.md")
-    shutil.copy(current_draft, final_path)
-    print(f"[Status] Workflow Ended. Final Output: {final_path}")
-    return True, final_path
+
+    print(f"[Status] Workflow Ended. Final Output: {result['final_path']}")
+    return True, result["final_path"]
@@ -2,107 +2,275 @@ import os
 import datetime
 import argparse
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from ...scripts.call_agent_task import call_sub_agent
 from ...prompts import final_prompts
+from ...utils.moc_management import update_gemini_index_moc
+from ...utils.rag_cli_utils import parse_rag_index_entries, select_relevant_rag_files, consolidate_rag_files
 from .preliminary import run_preliminary_workflow
-from .final import run_final_workflow, extract_keywords_agent
+from .final import run_final_workflow, extract_keywords
 from .integrate import run_integrate_workflow
+from .journal import RunJournal, INIT_STEPS, get_journal_path
+from .workspace import create_run_dir, find_resumable_run, remove_run_dir
 
 # We need to import the RAG handler. 
 # We do this inside the function to avoid potential top-level circular imports if any exist.
 
-def run_init_workflow(source_path, input_mode="direct", resume=False):
+INDEX_PATH = "0_Config/Context/GEMINI_INDEX.md"
+SKIP_INDEX_REFRESH_ENV = "GEMINI_SKIP_INDEX_REFRESH" # Set by `synthesis init --batch`, which rebuilds the index once
+
+def _load_note_map(vault_root):
+    """Rebuilds GEMINI_INDEX (unless a batch already did) and parses it into the RAG note map."""
+    if os.environ.get(SKIP_INDEX_REFRESH_ENV) != "1":
+        update_gemini_index_moc(vault_root=vault_root, output_moc_path=INDEX_PATH)
+    try:
+        with open(os.path.join(vault_root, INDEX_PATH), 'r', encoding='utf-8') as f:
+            return parse_rag_index_entries(f.read(), vault_root)
+    except Exception as e:
+        print(f"Warning: Could not read {INDEX_PATH}: {e}. RAG context will be empty.")
+        return {}
+
+def _prepare_rag_context(keywords, output_path):
+    """Selects and consolidates the RAG context for comma-separated keywords into output_path."""
+    vault_root = os.getcwd()
+    note_map = _load_note_map(vault_root)
+    keyword_list = [k.strip() for k in keywords.split(',') if k.strip()]
+    relevant_files = select_relevant_rag_files(keyword_list, note_map, vault_root)
+    header = f"# Active RAG Keywords\n> {keywords}\n\n"
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(header + consolidate_rag_files(relevant_files, vault_root))
+    print(f"RAG context prepared from {len(relevant_files)} notes and saved to {output_path}.")
+
+class _StreamingRagContext:
+    """
+    Runs keyword extraction and RAG candidate retrieval on each verified preliminary
+    chunk while the remaining chunks are still being synthesized.
+    Candidates are merged as each chunk finishes; finalize() packs the context file.
+    """
+    def __init__(self, max_workers=2):
+        self.vault_root = os.getcwd()
+        self.note_map = _load_note_map(self.vault_root)
+
+        self.chunk_keywords = {}
+        self.paths = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = []
+
+    def submit(self, index, draft_path):
+        self._futures.append(self._executor.submit(self._process_chunk, index, draft_path))
+
+    def _process_chunk(self, index, draft_path):
+        keywords = extract_keywords(draft_path) or ""
+        keyword_list = [k.strip() for k in keywords.split(',') if k.strip()]
+        candidates = select_relevant_rag_files(keyword_list, self.note_map, self.vault_root)
+
+        with self._lock:
+            self.chunk_keywords[index] = keyword_list
+            self.paths.update(candidates)
+            merged_count = len(self.paths)
+        print(f"[Status] Chunk {index+1} RAG: {len(keyword_list)} keywords, {len(candidates)} candidates ({merged_count} merged).")
+
+    def cancel(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def finalize(self, output_path):
+        """
+        Waits for outstanding chunk retrievals and writes the consolidated RAG context.
+        Returns the merged keyword string.
+        """
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[Warning] Chunk RAG retrieval failed: {e}")
+        self._executor.shutdown()
+
+        keywords = []
+        for index in sorted(self.chunk_keywords):
+            for keyword in self.chunk_keywords[index]:
+                if keyword.lower() not in [k.lower() for k in keywords]:
+                    keywords.append(keyword)
+
+        if not keywords:
+            keywords = ["PKM", "Synthesis"]
+            self.paths.update(select_relevant_rag_files(keywords, self.note_map, self.vault_root))
+
+        keywords_str = ", ".join(keywords)
+        header = f"# Active RAG Keywords\n> {keywords_str}\n\n"
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(header + consolidate_rag_files(sorted(self.paths), self.vault_root))
+        return keywords_str
+
+def _archive_source(source_path):
+    """Moves a vault-root source file into =3_Archived. Returns the (possibly new) source path."""
+    if os.path.exists(source_path) and os.path.dirname(source_path) == "":
+        archive_dir = "=3_Archived"
+        os.makedirs(archive_dir, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        base_name = os.path.basename(source_path)
+        new_filename = f"RAW-{timestamp}-{base_name}"
+        new_path = os.path.join(archive_dir, new_filename)
+        try:
+            os.rename(source_path, new_path)
+            print(f"Auto-Migrated source to: {new_path}")
+            return new_path
+        except Exception as e:
+            print(f"Warning: Failed to move source file: {e}")
+    return source_path
+
+def run_init_workflow(source_path, input_mode="direct", resume=False, overlap=False, stop_after=None, run_dir=None):
     """
     Executes the FULL synthesis chain:
-    Archive -> Preliminary -> Keywords -> RAG -> Final -> Integrate -> Apply
-    If resume is True, attempts to pick up from existing state.
+    Archive -> Preliminary -> Keywords -> RAG -> Final -> Integrate -> Apply -> Cleanup
+    Every completed step is written to the run journal (see journal.py) with its artifacts.
+    If resume is True, continues from the first incomplete step of the journaled run.
+    If overlap is True, keyword extraction and RAG retrieval run per verified chunk
+    during the preliminary stage, so the context is packed when the draft is ready.
+    If stop_after names a step, the chain returns once that step is journaled
+    (batch runs stop after "plan" and apply the plans one at a time).
+    Every artifact and the journal live in the run's own directory (run_dir, or a new one under
+    $GEMINI_TEMP_DIR/runs/; resume picks the latest incomplete run), removed by the cleanup step.
     """
-    
+    if resume and not run_dir:
+        run_dir = find_resumable_run(source_path)
+    run_dir = run_dir or create_run_dir("init")
+    journal = RunJournal(get_journal_path(run_dir))
+    start_index = 0
+    if resume and journal.load():
+        first_incomplete = journal.first_incomplete_step()
+        if first_incomplete is None:
+            return True, f"Nothing to resume: every step of the journaled run for {journal.state['source']} is complete."
+        start_index = INIT_STEPS.index(first_incomplete)
+        print(f"\n>>> RESUMING SYNTHESIS CHAIN from step '{first_incomplete}' (source: {journal.state['source']})")
+    else:
+        if resume:
+            print("[Warning] Resume requested but no incomplete run journal found. Starting a new run.")
+            resume = False
+        journal.start(source_path)
+    print(f"[Status] Run directory: {run_dir}")
+
+    def pending(step):
+        return INIT_STEPS.index(step) >= start_index
+
     # --- STEP 0: ARCHIVE & SETUP ---
-    final_source_path = source_path
-    prelim_path = ""
-    final_path = ""
-    rag_output_path = os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), "consolidated_rag_context.md")
-
-    if not resume:
-        # (Standard Archiving Logic - Only if not resuming)
-        if os.path.exists(source_path):
-            if os.path.dirname(source_path) == "":
-                archive_dir = "=3_Archived"
-                os.makedirs(archive_dir, exist_ok=True)
-                timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                base_name = os.path.basename(source_path)
-                new_filename = f"RAW-{timestamp}-{base_name}"
-                new_path = os.path.join(archive_dir, new_filename)
-                try:
-                    os.rename(source_path, new_path)
-                    print(f"Auto-Migrated source to: {new_path}")
-                    final_source_path = new_path
-                except Exception as e:
-                    print(f"Warning: Failed to move source file: {e}")
+    rag_output_path = os.path.join(run_dir, "consolidated_rag_context.md")
+
+    if pending("archive"):
+        final_source_path = _archive_source(source_path)
+        journal.record("archive", data={"source": final_source_path})
+    else:
+        final_source_path = journal.data("archive", "source")
 
     # --- STEP 1: PRELIMINARY ---
-    print("\n>>> STEP 1: PRELIMINARY SYNTHESIS")
-    success_prelim, result_prelim = run_preliminary_workflow(final_source_path, resume=resume)
-    if not success_prelim:
-        return False, f"Preliminary Synthesis Failed: {result_prelim}"
-    
-    if "Final Draft: " in result_prelim:
-        # More robust parsing
-        prelim_path = result_prelim.split("Final Draft: ")[1].strip().split('\n')[0].strip()
-    
-    if not prelim_path or not os.path.exists(prelim_path):
-        if os.path.exists(result_prelim): 
-             prelim_path = result_prelim
-        else:
-             return False, f"Could not locate preliminary file from result: {result_prelim}"
+    # Overlapped RAG needs the preliminary chunks, so it only applies when that step runs
+    rag_stream = _StreamingRagContext() if overlap and pending("preliminary") else None
+    if pending("preliminary"):
+        print("\n>>> STEP 1: PRELIMINARY SYNTHESIS")
+        success_prelim, result_prelim = run_preliminary_workflow(
+            final_source_path,
+            resume=resume,
+            on_chunk_verified=rag_stream.submit if rag_stream else None,
+            run_dir=run_dir
+        )
+        if not success_prelim:
+            if rag_stream:
+                rag_stream.cancel()
+            return False, f"Preliminary Synthesis Failed: {result_prelim}"
+
+        prelim_path = ""
+        if "Final Draft: " in result_prelim:
+            # More robust parsing
+            prelim_path = result_prelim.split("Final Draft: ")[1].strip().split('\n')[0].strip()
+
+        if not prelim_path or not os.path.exists(prelim_path):
+            if os.path.exists(result_prelim):
+                 prelim_path = result_prelim
+            else:
+                 return False, f"Could not locate preliminary file from result: {result_prelim}"
+        journal.record("preliminary", artifacts={"preliminary": prelim_path})
+    else:
+        prelim_path = journal.artifact("preliminary", "preliminary")
     print(f"Preliminary File: {prelim_path}")
 
-    # --- STEP 2 & 3: RAG & FINAL ---
-    if not final_path:
-        print("\n>>> STEP 2: RAG CONTEXT PREPARATION")
-        keywords = extract_keywords_agent(prelim_path)
-        if not keywords:
-            keywords = "PKM, Synthesis"
+    # --- STEP 2: KEYWORDS & RAG ---
+    if rag_stream:
+        print("\n>>> STEP 2: RAG CONTEXT PREPARATION (Overlapped)")
+        keywords = rag_stream.finalize(rag_output_path)
         print(f"Keywords: {keywords}")
-        
-        from ...commands.rag_commands import handle_rag_commands
-        rag_args = argparse.Namespace(rag_command="prepare-context", keywords=keywords, source=None, output=rag_output_path, limit=10)
-        success_rag, rag_msg = handle_rag_commands(rag_args)
-        if not success_rag:
-            return False, f"RAG Preparation Failed: {rag_msg}"
+        journal.record("keywords", data={"keywords": keywords})
+        journal.record("rag", artifacts={"rag_context": rag_output_path})
+    else:
+        if pending("keywords"):
+            print("\n>>> STEP 2: RAG CONTEXT PREPARATION")
+            keywords = extract_keywords(prelim_path)
+            if not keywords:
+                keywords = "PKM, Synthesis"
+            journal.record("keywords", data={"keywords": keywords})
+        else:
+            keywords = journal.data("keywords", "keywords")
+        print(f"Keywords: {keywords}")
+
+        if pending("rag"):
+            try:
+                _prepare_rag_context(keywords, rag_output_path)
+            except Exception as e:
+                return False, f"RAG Preparation Failed: {e}"
+            journal.record("rag", artifacts={"rag_context": rag_output_path})
+        else:
+            rag_output_path = journal.artifact("rag", "rag_context")
 
+    # --- STEP 3: FINAL ---
+    if pending("final"):
         print("\n>>> STEP 3: FINAL SYNTHESIS NOTE")
-        success_final, final_path = run_final_workflow(prelim_path, rag_output_path, final_source_path)
+        success_final, final_path = run_final_workflow(prelim_path, rag_output_path, final_source_path, run_dir=run_dir)
         if not success_final:
             return False, f"Final Synthesis Failed: {final_path}"
-        print(f"Final Note: {final_path}")
+        journal.record("final", artifacts={"final_note": final_path})
+    else:
+        final_path = journal.artifact("final", "final_note")
+    print(f"Final Note: {final_path}")
 
     # --- STEP 4: INTEGRATION PLAN ---
-    print("\n>>> STEP 4: INTEGRATION PLAN")
-    # We use final_path (the Synthesis Note) as the reference for the integration plan
-    success_int, json_path = run_integrate_workflow(rag_output_path, final_path, final_path, tags="")
-    if not success_int:
-        return False, f"Integration Plan Failed: {json_path}"
+    if pending("plan"):
+        print("\n>>> STEP 4: INTEGRATION PLAN")
+        # We use final_path (the Synthesis Note) as the reference for the integration plan
+        success_int, json_path = run_integrate_workflow(rag_output_path, final_path, final_path, tags="", run_dir=run_dir)
+        if not success_int:
+            return False, f"Integration Plan Failed: {json_path}"
+        journal.record("plan", artifacts={"plan": json_path})
+    else:
+        json_path = journal.artifact("plan", "plan")
     print(f"Integration Plan: {json_path}")
 
+    if stop_after == "plan":
+        return True, f"Stopped after the integration plan. Plan: {json_path} (journal: {journal.path})"
+
     # --- STEP 5: APPLY INTEGRATION ---
-    print("\n>>> STEP 5: APPLYING KNOWLEDGE INTEGRATION")
-    from ...commands.note_commands import handle_note_commands
-    # The 'source' here is what the new notes will link to. 
-    # It MUST be the Permanent Synthesis Note (final_path), not the raw log.
-    apply_args = argparse.Namespace(note_command="integrate", plan=json_path, source=final_path, verbose=True)
-    success_apply, apply_msg = handle_note_commands(apply_args)
-    
-    if not success_apply:
-        return False, f"Note Integration Failed: {apply_msg}"
-    
+    if pending("apply"):
+        print("\n>>> STEP 5: APPLYING KNOWLEDGE INTEGRATION")
+        from ...commands.note_commands import handle_note_commands
+        # The 'source' here is what the new notes will link to.
+        # It MUST be the Permanent Synthesis Note (final_path), not the raw log.
+        apply_args = argparse.Namespace(note_command="integrate", plan=json_path, source=final_path, verbose=True)
+        success_apply, apply_msg = handle_note_commands(apply_args)
+
+        if not success_apply:
+            return False, f"Note Integration Failed: {apply_msg}"
+        journal.record("apply", data={"log": apply_msg})
+        # Applying the plan edits vault notes (e.g. references in the final note); those edits are expected
+        journal.refresh_hashes()
+    else:
+        apply_msg = journal.data("apply", "log", "")
+
     # --- STEP 6: AUTOMATIC CLEANUP ---
     print("\n>>> STEP 6: CLEANING UP TEMPORARY ARTIFACTS")
-    from ...commands.synthesis_commands import handle_synthesis_commands
-    cleanup_args = argparse.Namespace(synthesis_command="cleanup")
-    handle_synthesis_commands(cleanup_args)
-    
+    journal.record("cleanup")
+    # Only this run's directory: concurrent runs keep their artifacts
+    cleanup_success, cleanup_msg = remove_run_dir(run_dir)
+    print(cleanup_msg)
+
     return True, f"""
 ==================================================
 SYNTHESIS CHAIN COMPLETE, APPLIED & CLEANED
@@ -112,7 +280,7 @@ SYNTHESIS CHAIN COMPLETE, APPLIED & CLEANED
 2. Final Note: {final_path}
 3. Integration Plan: {json_path}
 4. Application Status: SUCCESS
-5. Cleanup Status: SUCCESS
+5. Cleanup Status: {"SUCCESS" if cleanup_success else "FAILED"}
 
 Log: {apply_msg}
 """
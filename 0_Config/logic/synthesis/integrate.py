@@ -2,8 +2,13 @@ import os
 import shutil
 from ...prompts import integrate_prompts
 from ...scripts.call_agent_task import call_sub_agent
+from ...utils.llm_scheduler import LIGHT_TIER
+from .workflow import Workflow, critique_and_refine
+from .plan_validator import validate_integration_plan, write_validation_report
+from .patching import PatchError, refine_with_patch
+from .workspace import resolve_run_dir, run_file, write_run_file
 
-def _run_integrate_gen(rag_path, source_path, content_path, tags):
+def _run_integrate_gen(rag_path, source_path, content_path, tags, run_dir):
     # Prepare Prompt
     rag_file = "rag_context.md"
     source_file = "source_note.md"
@@ -20,29 +25,23 @@ def _run_integrate_gen(rag_path, source_path, content_path, tags):
     if os.path.exists(content_path):
         input_files[input_file] = content_path
     else:
-        temp_input = os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), "temp_integrate_input.md")
-        with open(temp_input, 'w', encoding='utf-8') as f:
-            f.write(content_path)
-        input_files[input_file] = temp_input
+        input_files[input_file] = write_run_file(run_dir, "integrate_input", content_path)
 
     # Dispatch
     print("Dispatching Integration Plan Generation...")
     result = call_sub_agent(prompt, input_files=input_files)
     
     if result:
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        json_file = os.path.join(temp_dir, f"integration_plan_{os.urandom(4).hex()}.json")
-        with open(json_file, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return json_file
+        return write_run_file(run_dir, "integration_plan", result, ".json")
     return None
 
-def _run_integrate_critique(json_path, source_path, rag_path):
+def _run_integrate_critique(json_path, source_path, rag_path, run_dir, validation_path=None):
     # Prepare Prompt
     json_file = "integration_plan.json"
     source_file = "source_ground_truth.md"
     rag_file = "rag_context.md"
-    prompt = integrate_prompts.get_integrate_critique_prompt(json_file, source_file, rag_file)
+    validation_file = "plan_validation.md" if validation_path else None
+    prompt = integrate_prompts.get_integrate_critique_prompt(json_file, source_file, rag_file, validation_file)
 
     # Prepare Input Files
     input_files = {
@@ -50,25 +49,22 @@ def _run_integrate_critique(json_path, source_path, rag_path):
         source_file: source_path if source_path else "/dev/null",
         rag_file: rag_path if rag_path else "/dev/null"
     }
+    if validation_path:
+        input_files[validation_file] = validation_path
 
     # Dispatch
     print("Dispatching Integration Audit...")
-    result = call_sub_agent(prompt, input_files=input_files)
+    result = call_sub_agent(prompt, input_files=input_files, tier=LIGHT_TIER)
     
     if result:
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        report_file = os.path.join(temp_dir, f"critique_report_{os.urandom(4).hex()}.md")
-        with open(report_file, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return report_file
+        return write_run_file(run_dir, "critique_report", result)
     return None
 
-def _run_integrate_refine(json_path, report_path, source_path):
+def _run_integrate_refine(json_path, report_path, source_path, run_dir):
     # Prepare Prompt
     json_file = "integration_plan.json"
     source_file = "source_ground_truth.md"
     report_file = "critique_report.md"
-    prompt = integrate_prompts.get_integrate_refinement_prompt(json_file, report_file, source_file)
 
     # Prepare Input Files
     input_files = {
@@ -77,45 +73,70 @@ def _run_integrate_refine(json_path, report_path, source_path):
         source_file: source_path if source_path else "/dev/null"
     }
 
-    # Dispatch
-    print("Dispatching Integration Refinement...")
-    result = call_sub_agent(prompt, input_files=input_files)
-    
-    if result:
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        json_out = os.path.join(temp_dir, f"integration_plan_refined_{os.urandom(4).hex()}.json")
-        with open(json_out, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return json_out
-    return None
+    # Dispatch: a JSON Patch first, the full rewrite if the patch is unusable
+    def request(patch):
+        print(f"Dispatching Integration Refinement{' (patch)' if patch else ''}...")
+        prompt = integrate_prompts.get_integrate_refinement_prompt(json_file, report_file, source_file, patch=patch)
+        return call_sub_agent(prompt, input_files=input_files)
+
+    def verify(patched):
+        # A patched plan must pass the same local validation as a generated one
+        errors, _ = validate_integration_plan(write_run_file(run_dir, "integration_plan_patched", patched, ".json"))
+        if errors:
+            raise PatchError(f"patched plan fails validation: {errors[0]}")
+
+    return refine_with_patch(json_path, "json", lambda: request(True), lambda: request(False), run_dir, "integration_plan_refined", ".json", verify)
 
-def run_integrate_workflow(rag_path, source_path, content_path, tags=""):
+def _audit_plan(json_path, source_path, rag_path, run_dir):
+    """
+    Local schema validation first: a structurally broken plan goes straight to refinement with the
+    machine report; a valid one gets the Sub-Agent audit with the validator's findings attached.
+    """
+    errors, warnings = validate_integration_plan(json_path)
+    report_path = write_validation_report(errors, warnings, run_dir)
+    if errors:
+        print(f"[Status] Plan validation failed ({len(errors)} errors). Skipping the audit.")
+        for error in errors:
+            print(f"  - {error}")
+        return report_path
+    print(f"[Status] Plan validation passed ({len(warnings)} warnings).")
+    return _run_integrate_critique(json_path, source_path, rag_path, run_dir, report_path)
+
+def _verify_plan(plan, source_path, rag_path, run_dir):
+    verified = critique_and_refine(
+        plan,
+        lambda current: _audit_plan(current, source_path, rag_path, run_dir),
+        lambda current, report: _run_integrate_refine(current, report, source_path, run_dir),
+        max_rounds=1,
+        label="Integration Plan"
+    )
+    if verified != plan:
+        errors, _ = validate_integration_plan(verified)
+        if errors:
+            print(f"[Warning] Refined plan fails validation ({len(errors)} errors).")
+            if not validate_integration_plan(plan)[0]:
+                print("[Status] Keeping the valid unrefined plan.")
+                return plan
+    return verified
+
+def _publish_plan(verified, run_dir):
+    final_path = run_file(run_dir, "integration_output", ".json")
+    shutil.copy(verified, final_path)
+    return final_path
+
+def run_integrate_workflow(rag_path, source_path, content_path, tags="", run_dir=None):
+    """
+    Integration Plan loop (Generate -> Loop[Audit -> Refine] -> Publish) on the workflow engine.
+    """
     print("\n--- Starting Integration Plan Loop ---")
-    
-    current_json = _run_integrate_gen(rag_path, source_path, content_path, tags)
-    if not current_json:
+    run_dir = resolve_run_dir(run_dir, near=rag_path, label="integrate")
+
+    workflow = Workflow("integrate")
+    workflow.stage("plan", _run_integrate_gen, inputs=["rag_path", "source_path", "content_path", "tags", "run_dir"], memoize=True)
+    workflow.stage("verified", _verify_plan, inputs=["plan", "source_path", "rag_path", "run_dir"])
+    workflow.stage("final_path", _publish_plan, inputs=["verified", "run_dir"])
+
+    success, result = workflow.run(rag_path=rag_path, source_path=source_path, content_path=content_path, tags=tags, run_dir=run_dir)
+    if not success:
         return False, "Integration Plan Generation Failed."
-        
-    MAX_RETRIES = 1
-    for i in range(MAX_RETRIES):
-        print(f"\nAudit Attempt {i+1}/{MAX_RETRIES}...")
-        report = _run_integrate_critique(current_json, source_path, rag_path)
-        if not report: break
-        
-        with open(report, 'r', encoding='utf-8') as f:
-            if "VERDICT: PASS" in f.read():
-                print("✅ Integration Plan Verified.")
-                temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-                final_path = os.path.join(temp_dir, f"integration_output_{os.urandom(4).hex()}.json")
-                shutil.copy(current_json, final_path)
-                return True, final_path
-        
-        print("❌ Verification Failed. Refining...")
-        new_json = _run_integrate_refine(current_json, report, source_path)
-        if new_json: current_json = new_json
-        else: break
-    
-    temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-    final_path = os.path.join(temp_dir, f"integration_output_{os.urandom(4).hex()}.json")
-    shutil.copy(current_json, final_path)
-    return True, final_path
+    return True, result["final_path"]
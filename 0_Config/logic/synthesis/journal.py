@@ -0,0 +1,117 @@
+import os
+import json
+import hashlib
+import datetime
+
+# Step-level run journal for `synthesis init`.
+# Each completed step is recorded with its artifact paths and their SHA-256, so --resume can
+# continue from the first incomplete step without repeating LLM calls.
+
+JOURNAL_FILENAME = "synthesis_journal.json"
+
+INIT_STEPS = ["archive", "preliminary", "keywords", "rag", "final", "plan", "apply", "cleanup"]
+
+# Earlier steps whose recorded output each step consumes
+INIT_STEP_INPUTS = {
+    "preliminary": ["archive"],
+    "keywords": ["preliminary"],
+    "rag": ["keywords"],
+    "final": ["preliminary", "rag", "archive"],
+    "plan": ["rag", "final"],
+    "apply": ["plan", "final"],
+}
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_journal_path(run_dir: str = None) -> str:
+    return os.path.join(run_dir or os.environ.get("GEMINI_TEMP_DIR", "."), JOURNAL_FILENAME)
+
+class RunJournal:
+    """
+    {"source": ..., "started": ..., "steps": {step: {"completed": ..., "artifacts": {name: {"path", "sha256"}}, "data": {...}}}}
+    """
+    def __init__(self, path: str = None):
+        self.path = path or get_journal_path()
+        self.state = None
+
+    def load(self) -> bool:
+        """Loads an existing journal. Returns False if there is none (or it is unreadable)."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            return isinstance(self.state, dict) and "steps" in self.state
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.path):
+                print(f"[Warning] Could not read run journal {self.path}: {e}")
+            self.state = None
+            return False
+
+    def start(self, source: str) -> None:
+        """Begins a fresh run, discarding any previous journal."""
+        self.state = {"source": source, "started": datetime.datetime.now().isoformat(timespec="seconds"), "steps": {}}
+        self._save()
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def record(self, step: str, artifacts: dict = None, data: dict = None) -> None:
+        """Marks step complete with {name: path} artifacts (hashed now) and arbitrary JSON data."""
+        self.state["steps"][step] = {
+            "completed": datetime.datetime.now().isoformat(timespec="seconds"),
+            "artifacts": {name: {"path": path, "sha256": hash_file(path)} for name, path in (artifacts or {}).items()},
+            "data": data or {},
+        }
+        self._save()
+
+    def refresh_hashes(self) -> None:
+        """Re-hashes recorded artifacts after a step that legitimately edits them (e.g. apply)."""
+        for entry in self.state["steps"].values():
+            for artifact in entry["artifacts"].values():
+                if os.path.exists(artifact["path"]):
+                    artifact["sha256"] = hash_file(artifact["path"])
+        self._save()
+
+    def _is_intact(self, step: str) -> bool:
+        entry = self.state["steps"].get(step)
+        if not entry:
+            return False
+        for name, artifact in entry["artifacts"].items():
+            if not os.path.exists(artifact["path"]):
+                print(f"[Journal] Step '{step}': artifact {name} is missing ({artifact['path']}).")
+                return False
+            if hash_file(artifact["path"]) != artifact["sha256"]:
+                print(f"[Journal] Step '{step}': artifact {name} changed since it was recorded ({artifact['path']}).")
+                return False
+        return True
+
+    def first_incomplete_step(self, steps: list = INIT_STEPS, step_inputs: dict = INIT_STEP_INPUTS) -> str:
+        """
+        Returns the first step that still has to run (None if the run is complete).
+        That is the first unrecorded step, moved earlier whenever a recorded step whose
+        artifacts a remaining step consumes has missing or changed artifacts.
+        Every step after the returned one is considered incomplete too.
+        """
+        first = next((step for step in steps if step not in self.state["steps"]), None)
+        while first is not None:
+            remaining = steps[steps.index(first):]
+            needed = {dependency for step in remaining for dependency in step_inputs.get(step, [])}
+            broken = next((step for step in steps[:steps.index(first)] if step in needed and not self._is_intact(step)), None)
+            if broken is None:
+                return first
+            first = broken
+        return None
+
+    def artifact(self, step: str, name: str) -> str:
+        return self.state["steps"][step]["artifacts"][name]["path"]
+
+    def data(self, step: str, key: str, default=None):
+        return self.state["steps"].get(step, {}).get("data", {}).get(key, default)
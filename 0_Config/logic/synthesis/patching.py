@@ -0,0 +1,299 @@
+import os
+import re
+import copy
+import json
+import threading
+from ...utils.token_estimator import estimate_tokens
+from .workspace import write_run_file
+
+# Patch-based refinement.
+# Instead of regenerating a whole draft or plan to fix a few critique findings, the Sub-Agent returns
+# a small patch: section operations for Markdown drafts, RFC 6902 JSON Patch for integration plans.
+# The patch is applied and verified locally; if the agent's answer is not a usable patch, the
+# refinement falls back to full regeneration. Output tokens saved are counted per refinement.
+
+REFINE_MODE_ENV = "GEMINI_REFINE_MODE" # patch | full
+
+MARKDOWN_OPS = ["replace_section", "append_to_section", "insert_section_after", "replace_text"]
+JSON_PATCH_OPS = ["add", "remove", "replace", "move", "copy", "test"]
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE_PATTERN = re.compile(r"^```[a-zA-Z]*\s*\n(.*?)\n```\s*$", re.DOTALL)
+
+stats_lock = threading.Lock()
+patch_stats = {"patched": 0, "fallbacks": 0, "patch_tokens": 0, "full_tokens": 0}
+
+class PatchError(Exception):
+    pass
+
+def get_refine_mode() -> str:
+    mode = os.environ.get(REFINE_MODE_ENV, "patch").lower()
+    return mode if mode in ("patch", "full") else "patch"
+
+def parse_patch(response: str) -> list:
+    """The list of operations in a Sub-Agent answer (bare or fenced JSON, or {"operations": [...]})."""
+    text = response.strip()
+    fenced = FENCE_PATTERN.match(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        ops = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise PatchError(f"answer is not a JSON patch ({e})")
+    if isinstance(ops, dict):
+        ops = ops.get("operations")
+    if not isinstance(ops, list) or not all(isinstance(op, dict) for op in ops):
+        raise PatchError("a patch must be a JSON array of operation objects")
+    if not ops:
+        raise PatchError("the patch is empty")
+    return ops
+
+def _normalize_heading(heading: str) -> str:
+    match = HEADING_PATTERN.match(heading.strip())
+    return (match.group(2) if match else heading.strip().lstrip("#").strip()).lower()
+
+def _headings(lines: list) -> list:
+    """[(line index, level, normalized text)] for every Markdown heading outside code fences."""
+    headings, in_fence = [], False
+    for index, line in enumerate(lines):
+        if line.startswith("```"):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else HEADING_PATTERN.match(line)
+        if match:
+            headings.append((index, len(match.group(1)), match.group(2).lower()))
+    return headings
+
+def _find_section(lines: list, heading: str) -> (int, int):
+    """(heading line, end line exclusive) of the section titled heading: up to the next heading of the same or a higher level."""
+    wanted = _normalize_heading(heading)
+    headings = _headings(lines)
+    matches = [i for i, (_, _, text) in enumerate(headings) if text == wanted]
+    if not matches:
+        raise PatchError(f"heading '{heading}' not found")
+    if len(matches) > 1:
+        raise PatchError(f"heading '{heading}' is ambiguous ({len(matches)} matches)")
+    start, level, _ = headings[matches[0]]
+    end = next((index for index, other_level, _ in headings[matches[0] + 1:] if other_level <= level), len(lines))
+    return start, end
+
+def _require_strings(op: dict, names: list) -> None:
+    """Operand type check, so a malformed operation is a PatchError rather than a crash further down."""
+    for name in names:
+        if name in op and not isinstance(op[name], str):
+            raise PatchError(f"'{name}' must be a string")
+
+def _body_lines(content: str) -> list:
+    return content.strip("\n").split("\n") + [""]
+
+def apply_markdown_patch(text: str, ops: list) -> str:
+    """Applies section operations in order. Raises PatchError if any of them does not apply cleanly."""
+    lines = text.split("\n")
+    for number, op in enumerate(ops, 1):
+        kind = op.get("op")
+        try:
+            _require_strings(op, ["find", "replace", "heading", "content"])
+            if kind == "replace_text":
+                find, replace = op["find"], op["replace"]
+                current = "\n".join(lines)
+                if not find or current.count(find) != 1:
+                    raise PatchError(f"text to replace occurs {current.count(find) if find else 0} times, expected once")
+                lines = current.replace(find, replace).split("\n")
+            elif kind in ("replace_section", "append_to_section", "insert_section_after"):
+                start, end = _find_section(lines, op["heading"])
+                content = op["content"]
+                if kind == "replace_section":
+                    lines[start + 1:end] = _body_lines(content)
+                elif kind == "append_to_section":
+                    # Insert after the section's last non-blank line
+                    last = end
+                    while last > start + 1 and not lines[last - 1].strip():
+                        last -= 1
+                    lines[last:last] = content.strip("\n").split("\n")
+                else:
+                    section = content.strip("\n")
+                    if not HEADING_PATTERN.match(section.split("\n")[0]):
+                        raise PatchError("insert_section_after content must start with a heading line")
+                    if end > 0 and lines[end - 1].strip():
+                        section = "\n" + section
+                    lines[end:end] = _body_lines(section)
+            else:
+                raise PatchError(f"unknown op '{kind}'. Allowed: {', '.join(MARKDOWN_OPS)}")
+        except KeyError as e:
+            raise PatchError(f"operation {number} ({kind}) is missing {e}")
+        except PatchError as e:
+            raise PatchError(f"operation {number} ({kind}): {e}")
+        except (IndexError, TypeError, AttributeError, ValueError) as e:
+            raise PatchError(f"operation {number} ({kind}) is malformed ({e})")
+    return "\n".join(lines)
+
+def _pointer_parts(pointer: str) -> list:
+    if not isinstance(pointer, str):
+        raise PatchError(f"JSON pointer must be a string, not {type(pointer).__name__}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"invalid JSON pointer '{pointer}'")
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+
+def _resolve(doc, parts: list):
+    """The container holding the pointer's last part, and that part (a list index or dict key)."""
+    if not parts:
+        raise PatchError("the operation cannot target the document root")
+    target = doc
+    for part in parts[:-1]:
+        target = _child(target, part)
+    return target, parts[-1]
+
+def _child(target, part):
+    try:
+        if isinstance(target, list):
+            return target[int(part)]
+        return target[part]
+    except (ValueError, IndexError, KeyError, TypeError):
+        raise PatchError(f"path element '{part}' does not exist")
+
+def _list_index(container: list, part: str, for_insert: bool) -> int:
+    if for_insert and part == "-":
+        return len(container)
+    try:
+        index = int(part)
+    except ValueError:
+        raise PatchError(f"'{part}' is not an array index")
+    if not 0 <= index < len(container) + (1 if for_insert else 0):
+        raise PatchError(f"array index {index} out of range")
+    return index
+
+def _remove(doc, parts: list):
+    container, part = _resolve(doc, parts)
+    if isinstance(container, list):
+        return container.pop(_list_index(container, part, False))
+    if not isinstance(container, dict) or part not in container:
+        raise PatchError(f"path element '{part}' does not exist")
+    return container.pop(part)
+
+def _add(doc, parts: list, value):
+    if not parts:
+        return value
+    container, part = _resolve(doc, parts)
+    if isinstance(container, list):
+        container.insert(_list_index(container, part, True), value)
+    elif isinstance(container, dict):
+        container[part] = value
+    else:
+        raise PatchError(f"cannot add below a {type(container).__name__}")
+    return doc
+
+def apply_json_patch(doc, ops: list):
+    """Applies an RFC 6902 JSON Patch to a copy of doc and returns it. Raises PatchError."""
+    doc = copy.deepcopy(doc)
+    for number, op in enumerate(ops, 1):
+        kind = op.get("op")
+        try:
+            parts = _pointer_parts(op["path"])
+            if kind == "add":
+                doc = _add(doc, parts, op["value"])
+            elif kind == "remove":
+                _remove(doc, parts)
+            elif kind == "replace":
+                if not parts:
+                    doc = op["value"]
+                else:
+                    container, part = _resolve(doc, parts)
+                    _child(container, part)
+                    container[_list_index(container, part, False) if isinstance(container, list) else part] = op["value"]
+            elif kind in ("move", "copy"):
+                source = _pointer_parts(op["from"])
+                if kind == "move" and not source:
+                    raise PatchError("cannot move the document root")
+                value = _remove(doc, source) if kind == "move" else copy.deepcopy(_child(*_resolve(doc, source)) if source else doc)
+                doc = _add(doc, parts, value)
+            elif kind == "test":
+                actual = _child(*_resolve(doc, parts)) if parts else doc
+                if actual != op["value"]:
+                    raise PatchError(f"test failed at '{op['path']}'")
+            else:
+                raise PatchError(f"unknown op '{kind}'. Allowed: {', '.join(JSON_PATCH_OPS)}")
+        except KeyError as e:
+            raise PatchError(f"operation {number} ({kind}) is missing {e}")
+        except PatchError as e:
+            raise PatchError(f"operation {number} ({kind}): {e}")
+        except (IndexError, TypeError, AttributeError, ValueError) as e:
+            raise PatchError(f"operation {number} ({kind}) is malformed ({e})")
+    return doc
+
+def _verify_markdown(original: str, patched: str) -> None:
+    """A patch may rewrite sections but must keep the draft's frontmatter and top-level structure."""
+    if patched.strip() == original.strip():
+        raise PatchError("the patch changes nothing")
+    if original.startswith("---") and not patched.startswith("---"):
+        raise PatchError("the patch removed the YAML frontmatter")
+    kept = {text for _, level, text in _headings(patched.split("\n"))}
+    lost = [text for _, level, text in _headings(original.split("\n")) if level <= 2 and text not in kept]
+    if lost:
+        raise PatchError(f"the patch removed heading(s): {', '.join(lost)}")
+
+def _record(patched: bool, patch_tokens: int = 0, full_tokens: int = 0) -> None:
+    with stats_lock:
+        if patched:
+            patch_stats["patched"] += 1
+            patch_stats["patch_tokens"] += patch_tokens
+            patch_stats["full_tokens"] += full_tokens
+        else:
+            patch_stats["fallbacks"] += 1
+
+def get_patch_stats() -> dict:
+    with stats_lock:
+        return dict(patch_stats)
+
+def format_patch_stats() -> str:
+    """Summary of this process's refinements, or an empty string if none ran."""
+    stats = get_patch_stats()
+    if not stats["patched"] and not stats["fallbacks"]:
+        return ""
+    saved = stats["full_tokens"] - stats["patch_tokens"]
+    return (f"Patch Refinement: {stats['patched']} patched, {stats['fallbacks']} regenerated in full; "
+            f"~{stats['patch_tokens']} output tokens instead of ~{stats['full_tokens']} (saved ~{saved}).")
+
+def refine_with_patch(draft_path, kind, request_patch, request_full, run_dir, output_prefix, extension=".md", verify=None):
+    """
+    Runs one refinement. kind is "markdown" or "json". request_patch() / request_full() dispatch
+    the Sub-Agent and return its answer (or None). verify(patched_text) may raise PatchError to
+    reject a patched result. Returns the refined file path, or None if both modes failed.
+    """
+    if get_refine_mode() == "patch":
+        try:
+            with open(draft_path, 'r', encoding='utf-8') as f:
+                original = f.read()
+            if kind == "json":
+                # A draft that is not valid JSON cannot be patched; regenerate it instead
+                json.loads(original)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[Status] Draft cannot be patched ({e}). Regenerating in full.")
+            _record(False)
+        else:
+            response = request_patch()
+            try:
+                if not response:
+                    raise PatchError("the Sub-Agent returned nothing")
+                ops = parse_patch(response)
+                if kind == "json":
+                    patched = json.dumps(apply_json_patch(json.loads(original), ops), indent=2, ensure_ascii=False)
+                else:
+                    patched = apply_markdown_patch(original, ops)
+                    _verify_markdown(original, patched)
+                if verify:
+                    verify(patched)
+            except PatchError as e:
+                print(f"[Status] Patch rejected ({e}). Falling back to full regeneration.")
+                _record(False)
+            else:
+                patch_tokens, full_tokens = estimate_tokens(response), estimate_tokens(patched)
+                _record(True, patch_tokens, full_tokens)
+                print(f"[Status] Patch applied ({len(ops)} operations): ~{patch_tokens} output tokens instead of ~{full_tokens} (saved ~{full_tokens - patch_tokens}).")
+                return write_run_file(run_dir, output_prefix, patched, extension)
+
+    result = request_full()
+    if result:
+        return write_run_file(run_dir, output_prefix, result, extension)
+    return None
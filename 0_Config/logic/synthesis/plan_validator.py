@@ -0,0 +1,206 @@
+import os
+import json
+from ..note_batch import _fix_invalid_json
+from ...utils.command_utils import sanitize_filename
+
+# Local structural check of integration plans, run before the Sub-Agent audit.
+# The schema mirrors what note_batch.execute_integration_plan actually reads; file references are
+# checked against a catalog of the vault's notes. Errors are plans that would fail (or damage notes)
+# when applied; warnings are passed on to the audit.
+
+EDIT_MODES = ["prepend_to_file", "prepend_to_main", "append_to_main", "manual_review"]
+
+# type -> {field: (allowed types, required)}
+PLAN_ITEM_SCHEMA = {
+    "new_note": {
+        "content": (str, True),
+        "title": (str, False),
+        "tags": (str, False),
+        "directory": (str, False),
+        "aliases": (list, False),
+    },
+    "edit_note": {
+        "file": (str, True),
+        "mode": (str, True),
+        "content": (str, False),
+        "title": (str, False),
+    },
+    "manual_review": {
+        "content": (str, True),
+        "affected_files": ((list, str), False),
+        "file": ((list, str), False),
+        "rationale": (str, False),
+    },
+    "update_metadata": {
+        "file": (str, True),
+        "new_title": (str, False),
+        "add_tags": (list, False),
+        "add_aliases": (list, False),
+        "remove_tags": (list, False),
+        "remove_aliases": (list, False),
+    },
+    "rename_note": {
+        "file": (str, True),
+        "new_name": (str, True),
+    },
+}
+
+def build_vault_catalog(vault_root: str = ".") -> dict:
+    """{note name (no extension, lowercase): [paths]} for every Markdown file in the vault."""
+    catalog = {}
+    for root, dirs, files in os.walk(vault_root):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for file in files:
+            if file.endswith(".md"):
+                name = os.path.splitext(file)[0].lower()
+                catalog.setdefault(name, []).append(os.path.normpath(os.path.join(root, file)))
+    return catalog
+
+def _load_plan(plan_path: str, errors: list, warnings: list):
+    try:
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            raw_content = f.read()
+    except OSError as e:
+        errors.append(f"Plan file could not be read: {e}")
+        return None
+
+    try:
+        return json.loads(raw_content)
+    except json.JSONDecodeError as e:
+        try:
+            plan = json.loads(_fix_invalid_json(raw_content))
+            warnings.append(f"Plan is not strictly valid JSON ({e}); it only parses after escaping raw newlines/quotes.")
+            return plan
+        except json.JSONDecodeError:
+            errors.append(f"Plan is not valid JSON: {e}. Output a bare JSON array (no Markdown fences or commentary).")
+            return None
+
+def _check_file(label: str, file_path: str, catalog: dict, renamed: dict, errors: list) -> None:
+    normalized = os.path.normpath(file_path)
+    if normalized in renamed:
+        errors.append(f"{label}: '{file_path}' was renamed by item {renamed[normalized]}; refer to the new path instead.")
+    elif not os.path.isfile(file_path):
+        name = os.path.splitext(os.path.basename(file_path))[0].lower()
+        matches = catalog.get(name)
+        hint = f" Did you mean '{matches[0]}'?" if matches else ""
+        errors.append(f"{label}: file '{file_path}' does not exist.{hint}")
+
+def validate_integration_plan(plan_path: str, catalog: dict = None) -> (list, list):
+    """
+    Validates a plan file without any LLM call.
+    Returns (errors, warnings); the plan is safe to audit/apply only when errors is empty.
+    """
+    errors, warnings = [], []
+    plan = _load_plan(plan_path, errors, warnings)
+    if plan is None:
+        return errors, warnings
+    if not isinstance(plan, list):
+        errors.append(f"Plan must be a JSON array of operations, got {type(plan).__name__}.")
+        return errors, warnings
+    if not plan:
+        warnings.append("Plan is empty; nothing would be integrated.")
+
+    if catalog is None:
+        catalog = build_vault_catalog()
+
+    renamed = {} # old path -> item number
+    created = {} # target path -> item number
+
+    for number, item in enumerate(plan, 1):
+        if not isinstance(item, dict):
+            errors.append(f"Item {number}: must be a JSON object, got {type(item).__name__}.")
+            continue
+        item_type = item.get("type")
+        label = f"Item {number} ({item_type})"
+        if item_type not in PLAN_ITEM_SCHEMA:
+            errors.append(f"Item {number}: unknown type '{item_type}'. Allowed: {', '.join(PLAN_ITEM_SCHEMA)}.")
+            continue
+
+        schema = PLAN_ITEM_SCHEMA[item_type]
+        valid = True
+        for field, (allowed, required) in schema.items():
+            value = item.get(field)
+            if value is None:
+                if required:
+                    errors.append(f"{label}: missing required field '{field}'.")
+                    valid = False
+            elif not isinstance(value, allowed):
+                expected = " or ".join(t.__name__ for t in allowed) if isinstance(allowed, tuple) else allowed.__name__
+                errors.append(f"{label}: field '{field}' must be {expected}, got {type(value).__name__}.")
+                valid = False
+        unknown = [field for field in item if field != "type" and field not in schema]
+        if unknown:
+            warnings.append(f"{label}: ignored fields {', '.join(unknown)}.")
+        if not valid:
+            continue
+
+        if item_type == "new_note":
+            if not item["content"].strip():
+                errors.append(f"{label}: 'content' is empty.")
+            if item.get("title"):
+                default_dir = "2_Literature_Notes" if "SYNTH-" in item["title"] else "3_Permanent_Notes"
+                target = os.path.normpath(os.path.join(item.get("directory") or default_dir, f"{sanitize_filename(item['title'])}.md"))
+                if os.path.exists(target):
+                    errors.append(f"{label}: '{target}' already exists and would be overwritten; use edit_note instead.")
+                elif target in created:
+                    errors.append(f"{label}: '{target}' is also created by item {created[target]}.")
+                else:
+                    existing = catalog.get(os.path.splitext(os.path.basename(target))[0].lower())
+                    if existing:
+                        warnings.append(f"{label}: a note with the same name already exists at '{existing[0]}'.")
+                created[target] = number
+            else:
+                warnings.append(f"{label}: no 'title'; the title will be derived from the first line of content.")
+
+        elif item_type == "edit_note":
+            if item["mode"] not in EDIT_MODES:
+                errors.append(f"{label}: unknown mode '{item['mode']}'. Allowed: {', '.join(EDIT_MODES)}.")
+            elif item["mode"] != "manual_review":
+                if not (item.get("content") or "").strip():
+                    errors.append(f"{label}: 'content' is missing or empty.")
+                _check_file(label, item["file"], catalog, renamed, errors)
+
+        elif item_type == "update_metadata":
+            _check_file(label, item["file"], catalog, renamed, errors)
+            if not any(item.get(field) for field in schema if field != "file"):
+                warnings.append(f"{label}: no metadata change requested.")
+
+        elif item_type == "rename_note":
+            _check_file(label, item["file"], catalog, renamed, errors)
+            new_name = sanitize_filename(item["new_name"])
+            target = os.path.normpath(os.path.join(os.path.dirname(item["file"]), f"{new_name}.md"))
+            if not new_name:
+                errors.append(f"{label}: 'new_name' is empty after sanitizing.")
+            elif os.path.exists(target) or target in created:
+                errors.append(f"{label}: rename target '{target}' already exists.")
+            elif new_name.lower() in catalog:
+                errors.append(f"{label}: a note named '{new_name}' already exists at '{catalog[new_name.lower()][0]}'; wikilinks would become ambiguous.")
+            renamed[os.path.normpath(item["file"])] = number
+            created[target] = number
+
+    return errors, warnings
+
+def write_validation_report(errors: list, warnings: list, run_dir: str) -> str:
+    """
+    Writes the findings in the critique report layout (VERDICT / Evidence / Feedback), so the
+    report can go straight to the refinement prompt. Returns the report path.
+    """
+    lines = ["# Integration Critique (Local Plan Validation)", ""]
+    lines.append(f"## VERDICT: {'FAIL' if errors else 'PASS'}")
+    lines.append("")
+    lines.append("## Evidence")
+    lines.extend(f"*   **Error:** {error}" for error in errors)
+    lines.extend(f"*   **Warning:** {warning}" for warning in warnings)
+    if not errors and not warnings:
+        lines.append("*   No structural problems found.")
+    lines.append("")
+    lines.append("## Feedback")
+    if errors:
+        lines.append("Fix every error above and output the corrected plan as a single valid JSON array. Keep all other operations unchanged.")
+    else:
+        lines.append("The plan is structurally valid. Warnings are for the content audit to weigh.")
+
+    report_path = os.path.join(run_dir, f"plan_validation_{os.urandom(4).hex()}.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    return report_path
@@ -5,10 +5,14 @@ from ...prompts import preliminary_prompts # Import the new modular prompt file
 from ...scripts.call_agent_task import call_sub_agent
 from .critique import _run_critique
 from .refinement import _run_refinement
+from .chunking import split_into_chunks, estimate_tokens, get_chunk_settings
+from .workflow import Workflow, critique_and_refine
+from .workspace import resolve_run_dir, write_run_file
 
-def _load_synthesis_state():
-    temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-    state_file = os.path.join(temp_dir, "synthesis_state.json")
+STATE_FILENAME = "synthesis_state.json"
+
+def _load_synthesis_state(run_dir):
+    state_file = os.path.join(run_dir, STATE_FILENAME)
     if os.path.exists(state_file):
         try:
             with open(state_file, 'r', encoding='utf-8') as f:
@@ -17,16 +21,15 @@ def _load_synthesis_state():
             print(f"Error loading state: {e}")
     return None
 
-def _save_synthesis_state(state):
-    temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-    state_file = os.path.join(temp_dir, "synthesis_state.json")
+def _save_synthesis_state(state, run_dir):
+    state_file = os.path.join(run_dir, STATE_FILENAME)
     try:
         with open(state_file, 'w', encoding='utf-8') as f:
             json.dump(state, f, indent=2)
     except Exception as e:
         print(f"Error saving state: {e}")
 
-def _run_single_preliminary_synthesis(source_input):
+def _run_single_preliminary_synthesis(source_input, run_dir):
     """
     Helper function to run a single preliminary synthesis task via the Sub-Agent.
     """
@@ -39,12 +42,8 @@ def _run_single_preliminary_synthesis(source_input):
     if os.path.exists(source_input):
         input_files[context_source_file] = source_input
     else:
-        # If source_input is direct content, write to temp file first
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        temp_src = os.path.join(temp_dir, "temp_prelim_src.md")
-        with open(temp_src, 'w', encoding='utf-8') as f:
-            f.write(source_input)
-        input_files[context_source_file] = temp_src
+        # If source_input is direct content, write to a run file first
+        input_files[context_source_file] = write_run_file(run_dir, "prelim_src", source_input)
 
     # Dispatch
     print(f"[Status] Dispatching Sub-Agent Task (Generation)... Source: {os.path.basename(source_input) if os.path.exists(source_input) else 'Direct Input'}")
@@ -52,17 +51,12 @@ def _run_single_preliminary_synthesis(source_input):
 
     # Retrieve
     if result:
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        os.makedirs(temp_dir, exist_ok=True)
-        final_output_path = os.path.join(temp_dir, f"preliminary_synthesis_{os.urandom(4).hex()}.md")
-        with open(final_output_path, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return final_output_path
+        return write_run_file(run_dir, "preliminary_synthesis", result)
     else:
         print("Sub-Agent failed to generate output.")
         return None
 
-def _combine_synthesis_files(file_list):
+def _combine_synthesis_files(file_list, run_dir):
     """
     Helper function to combine multiple synthesis files.
     """
@@ -75,23 +69,38 @@ def _combine_synthesis_files(file_list):
         else:
             print(f"Warning: File {fpath} not found during combination.")
 
-    temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-    output_path = os.path.join(temp_dir, f"preliminary_combined_{os.urandom(4).hex()}.md")
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(combined_content)
-    return output_path
+    return write_run_file(run_dir, "preliminary_combined", combined_content)
 
-def run_preliminary_workflow(source_input, resume=False):
+def _verify_chunk(item, total, run_dir):
+    """Generates one chunk's draft and runs the critique/refine loop on it. item is (index, chunk_path)."""
+    i, chunk_path = item
+    print(f"Processing Chunk {i+1}/{total}...")
+    draft_path = _run_single_preliminary_synthesis(chunk_path, run_dir)
+    if not draft_path:
+        return None
+    return critique_and_refine(
+        draft_path,
+        lambda draft: _run_critique(chunk_path, draft, run_dir),
+        lambda draft, report: _run_refinement(chunk_path, draft, report, run_dir),
+        max_rounds=1,
+        label=f"Chunk {i+1}"
+    )
+
+def run_preliminary_workflow(source_input, resume=False, on_chunk_verified=None, run_dir=None):
     """
     Executes the full Preliminary Synthesis workflow (Chunking -> Generation -> Loop[Audit -> Refine]).
+    Chunks are processed in parallel as a fan-out stage of the workflow engine (see workflow.py).
+    If on_chunk_verified is given, it is called as on_chunk_verified(index, draft_path) for every
+    finished chunk (including chunks restored on resume) so downstream stages can start early.
+    All artifacts go to run_dir (a new run directory if omitted; see workspace.py).
     """
+    run_dir = resolve_run_dir(run_dir, label="preliminary")
     state = None
     if resume:
         # Check for existing state
-        state = _load_synthesis_state()
+        state = _load_synthesis_state(run_dir)
         if state and state.get("source") == source_input:
-            print(f"\n>>> RESUMING PRELIMINARY SYNTHESIS: {len(state['outputs'])}/{len(state['chunks'])} chunks complete.")
+            print(f"\n>>> RESUMING PRELIMINARY SYNTHESIS: {len([p for p in state['outputs'] if p])}/{len(state['chunks'])} chunks complete.")
             chunk_paths = state["chunks"]
             output_paths = state["outputs"]
         else:
@@ -100,36 +109,29 @@ def run_preliminary_workflow(source_input, resume=False):
 
     if not state:
         # Fresh Start: Clear any stale state
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        state_file = os.path.join(temp_dir, "synthesis_state.json")
+        state_file = os.path.join(run_dir, STATE_FILENAME)
         if os.path.exists(state_file):
             os.remove(state_file)
 
         # Check size for chunking
-        raw_lines = []
         if os.path.exists(source_input):
                 with open(source_input, 'r', encoding='utf-8') as f:
-                    raw_lines = f.readlines()
+                    raw_text = f.read()
         else:
-                raw_lines = source_input.splitlines(keepends=True)
+                raw_text = source_input
 
-        CHUNK_SIZE = 500
-        line_count = len(raw_lines)
+        chunk_budget, chunk_overlap = get_chunk_settings()
+        chunks = split_into_chunks(raw_text, chunk_budget, chunk_overlap)
 
-        if line_count > CHUNK_SIZE:
-            print(f"Input is large ({line_count} lines). Splitting into chunks...")
-            temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-            os.makedirs(temp_dir, exist_ok=True)
-            
+        if len(chunks) > 1:
+            print(f"Input is large (~{estimate_tokens(raw_text)} tokens). Splitting into {len(chunks)} chunks of <= {chunk_budget} tokens...")
             chunk_paths = []
             output_paths = []
             
             # 1. Create Chunks
-            for i in range(0, line_count, CHUNK_SIZE):
-                chunk_lines = raw_lines[i:i + CHUNK_SIZE]
-                chunk_content = "".join(chunk_lines)
-                chunk_filename = f"chunk_{i // CHUNK_SIZE}_{os.path.basename(source_input) if os.path.exists(source_input) else 'raw'}.md"
-                chunk_path = os.path.join(temp_dir, chunk_filename)
+            for i, chunk_content in enumerate(chunks):
+                chunk_filename = f"chunk_{i}_{os.path.basename(source_input) if os.path.exists(source_input) else 'raw'}.md"
+                chunk_path = os.path.join(run_dir, chunk_filename)
                 with open(chunk_path, 'w', encoding='utf-8') as f:
                     f.write(chunk_content)
                 chunk_paths.append(chunk_path)
@@ -140,58 +142,45 @@ def run_preliminary_workflow(source_input, resume=False):
                 "chunks": chunk_paths,
                 "outputs": []
             }
-            _save_synthesis_state(state)
+            _save_synthesis_state(state, run_dir)
         else:
             chunk_paths = [source_input]
             output_paths = []
 
-    # --- PHASE 1: GENERATION & VERIFICATION ---
-    for i in range(len(output_paths), len(chunk_paths)):
-        chunk_path = chunk_paths[i]
-        print(f"Processing Chunk {i+1}/{len(chunk_paths)}...")
-        
-        result_path = _run_single_preliminary_synthesis(chunk_path)
-        if not result_path:
-            return False, f"Failed to process chunk {i+1}."
-
-        # --- PER-CHUNK AUDIT & REFINE ---
-        MAX_RETRIES = 1
-        current_chunk_draft = result_path
-        
-        for attempt in range(1, MAX_RETRIES + 1):
-            print(f"[Status] Chunk {i+1} - Attempt {attempt}/{MAX_RETRIES}: Running Critique...")
-            critique_path = _run_critique(chunk_path, current_chunk_draft)
-            
-            if not critique_path:
-                print(f"[Error] Chunk {i+1} critique failed. Proceeding.")
-                break
-            
-            with open(critique_path, 'r', encoding='utf-8') as f:
-                if "VERDICT: PASS" in f.read():
-                    print(f"[Success] ✅ Chunk {i+1} Verified.")
-                    break
-                else:
-                    print(f"[Status] ❌ Chunk {i+1} FAIL. Refining...")
-                    refined_path = _run_refinement(chunk_path, current_chunk_draft, critique_path)
-                    if refined_path:
-                        current_chunk_draft = refined_path
-                    else:
-                        break
-        
-        output_paths.append(current_chunk_draft)
-        
+    # Outputs are indexed by chunk; chunks may finish out of order
+    output_paths = list(output_paths) + [None] * (len(chunk_paths) - len(output_paths))
+    if on_chunk_verified:
+        for i, done_path in enumerate(output_paths):
+            if done_path:
+                on_chunk_verified(i, done_path)
+
+    # --- PHASE 1: GENERATION & VERIFICATION (chunks in parallel) ---
+    remaining = [(i, chunk_paths[i]) for i in range(len(chunk_paths)) if not output_paths[i]]
+
+    def chunk_done(position, draft_path):
+        i = remaining[position][0]
+        output_paths[i] = draft_path
+        if on_chunk_verified:
+            on_chunk_verified(i, draft_path)
         # Update state after each chunk
         if state:
             state["outputs"] = output_paths
-            _save_synthesis_state(state)
+            _save_synthesis_state(state, run_dir)
+
+    # Not memoized: chunk results live in this run's directory, and resuming the run already skips
+    # the chunks recorded in its state (identical LLM calls are served by the response cache)
+    workflow = Workflow("preliminary")
+    workflow.fan_out("verified_chunks", _verify_chunk, over="chunks", inputs=["total", "run_dir"], on_item_done=chunk_done)
+    success, result = workflow.run(chunks=remaining, total=len(chunk_paths), run_dir=run_dir)
+    if not success:
+        return False, f"Failed to process chunks: {result}"
 
     # Finalization
     if len(chunk_paths) > 1:
         print("Combining verified chunks...")
-        final_draft_path = _combine_synthesis_files(output_paths)
+        final_draft_path = _combine_synthesis_files(output_paths, run_dir)
         # Clear state upon completion
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        state_file = os.path.join(temp_dir, "synthesis_state.json")
+        state_file = os.path.join(run_dir, STATE_FILENAME)
         if os.path.exists(state_file):
             os.remove(state_file)
         
@@ -202,6 +191,6 @@ def run_preliminary_workflow(source_input, resume=False):
         print(f"Preliminary Synthesis Complete. Output: {final_draft_path}")
         return True, f"Workflow Complete.\nFinal Draft: {final_draft_path}"
 
-def run_combine_workflow(files):
-    output_path = _combine_synthesis_files(files)
+def run_combine_workflow(files, run_dir=None):
+    output_path = _combine_synthesis_files(files, resolve_run_dir(run_dir, near=files[0] if files else None, label="combine"))
     return True, f"Combined {len(files)} files into: {output_path}\n\nNEXT STEP: Execute:\nsynthesis final \"{output_path}\""
@@ -2,8 +2,10 @@ import os
 import shutil
 from ...prompts import critique_prompts
 from ...scripts.call_agent_task import call_sub_agent
+from .patching import refine_with_patch
+from .workspace import resolve_run_dir, write_run_file
 
-def _run_refinement(source_input, draft_input, report_input):
+def _run_refinement(source_input, draft_input, report_input, run_dir):
     """
     Helper function to run a Refinement task via the Sub-Agent.
     """
@@ -11,17 +13,13 @@ def _run_refinement(source_input, draft_input, report_input):
     context_source_file = "context_source.md"
     draft_file = "preliminary_draft.md"
     report_file = "critique_report.md"
-    agent_instruction = critique_prompts.get_refinement_prompt(context_source_file, draft_file, report_file)
 
     # Prepare Input Files
     input_files = {}
     if os.path.exists(source_input):
         input_files[context_source_file] = source_input
     else:
-        temp_src = os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), "temp_refine_src.md")
-        with open(temp_src, 'w', encoding='utf-8') as f:
-            f.write(source_input)
-        input_files[context_source_file] = temp_src
+        input_files[context_source_file] = write_run_file(run_dir, "refine_src", source_input)
 
     if os.path.exists(draft_input):
         input_files[draft_file] = draft_input
@@ -35,24 +33,19 @@ def _run_refinement(source_input, draft_input, report_input):
         print(f"Report file not found: {report_input}")
         return None
 
-    # Dispatch
-    print(f"Dispatching Refinement to Sub-Agent...")
-    result = call_sub_agent(agent_instruction, input_files=input_files)
-
-    # Retrieve
-    if result:
-        temp_dir = os.environ.get("GEMINI_TEMP_DIR", ".")
-        os.makedirs(temp_dir, exist_ok=True)
-        final_refined_path = os.path.join(temp_dir, f"preliminary_synthesis_refined_{os.urandom(4).hex()}.md")
-        with open(final_refined_path, 'w', encoding='utf-8') as f:
-            f.write(result)
-        return final_refined_path
-    else:
+    # Dispatch: a section patch first, the full rewrite if the patch is unusable
+    def request(patch):
+        print(f"Dispatching Refinement{' (patch)' if patch else ''} to Sub-Agent...")
+        agent_instruction = critique_prompts.get_refinement_prompt(context_source_file, draft_file, report_file, patch=patch)
+        return call_sub_agent(agent_instruction, input_files=input_files)
+
+    refined_path = refine_with_patch(draft_input, "markdown", lambda: request(True), lambda: request(False), run_dir, "preliminary_synthesis_refined")
+    if not refined_path:
         print("Sub-Agent failed to generate refined draft.")
-        return None
+    return refined_path
 
-def run_refinement_workflow(source_input, draft_input, report_input):
-    refined_path = _run_refinement(source_input, draft_input, report_input)
+def run_refinement_workflow(source_input, draft_input, report_input, run_dir=None):
+    refined_path = _run_refinement(source_input, draft_input, report_input, resolve_run_dir(run_dir, near=draft_input))
     if refined_path:
         return True, f"Refinement Complete.\nNew Draft saved to: {refined_path}"
     else:
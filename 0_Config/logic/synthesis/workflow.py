@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ...utils.response_cache import get_cache_mode
+
+# Small declarative workflow engine for the synthesis stages.
+# Stages name their inputs (workflow parameters or other stages' outputs); the engine runs every
+# stage whose inputs are ready in parallel, fans out over lists, retries failures, memoizes
+# results across runs and reports per-stage timing.
+# The memo is a SQLite table in $GEMINI_TEMP_DIR, so a put writes one row and concurrent
+# processes (e.g. synthesis batch workers) do not overwrite each other's entries.
+
+DEFAULT_MAX_WORKERS = 4
+MEMO_FILENAME = "workflow_memo.sqlite"
+
+def get_max_workers() -> int:
+    try:
+        return max(int(os.environ.get("GEMINI_STAGE_WORKERS", DEFAULT_MAX_WORKERS)), 1)
+    except ValueError:
+        return DEFAULT_MAX_WORKERS
+
+def _get_memo_path() -> str:
+    return os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), MEMO_FILENAME)
+
+def _fingerprint(value, digest) -> None:
+    """Feeds value into digest; existing file paths contribute their contents, not just their name."""
+    if isinstance(value, str) and len(value) < 4096 and os.path.isfile(value):
+        digest.update(b"file\0" + value.encode('utf-8') + b"\0" + _hash_file(value).encode('utf-8'))
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"list\0")
+        for item in value:
+            _fingerprint(item, digest)
+    else:
+        digest.update(repr(value).encode('utf-8') + b"\0")
+
+def _memo_key(workflow_name: str, stage_name: str, inputs: dict) -> str:
+    digest = hashlib.sha256(f"{workflow_name}\0{stage_name}\0".encode('utf-8'))
+    for name in sorted(inputs):
+        digest.update(name.encode('utf-8') + b"=")
+        _fingerprint(inputs[name], digest)
+    return digest.hexdigest()
+
+def _connect_memo():
+    path = _get_memo_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("CREATE TABLE IF NOT EXISTS memo (key TEXT PRIMARY KEY, result TEXT, files TEXT, created REAL)")
+    return conn
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _result_paths(result) -> list:
+    values = result if isinstance(result, list) else [result]
+    return [v for v in values if isinstance(v, str) and len(v) < 4096 and os.path.isfile(v)]
+
+def _files_valid(files: dict) -> bool:
+    """A memoized artifact is only valid while the file still exists with the same contents."""
+    return all(os.path.isfile(path) and _hash_file(path) == sha256 for path, sha256 in files.items())
+
+def _memo_get(key: str):
+    try:
+        conn = _connect_memo()
+        try:
+            row = conn.execute("SELECT result, files FROM memo WHERE key = ?", (key,)).fetchone()
+            if row and not _files_valid(json.loads(row[1])):
+                conn.execute("DELETE FROM memo WHERE key = ?", (key,))
+                row = None
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Warning: Failed to read workflow memo: {e}")
+        return None
+    return json.loads(row[0]) if row else None
+
+def _memo_put(key: str, result) -> None:
+    try:
+        result_json = json.dumps(result)
+    except (TypeError, ValueError):
+        return
+    files = {path: _hash_file(path) for path in _result_paths(result)}
+    try:
+        conn = _connect_memo()
+        try:
+            conn.execute("INSERT OR REPLACE INTO memo (key, result, files, created) VALUES (?, ?, ?, ?)",
+                         (key, result_json, json.dumps(files), time.time()))
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: Failed to save workflow memo: {e}")
+
+def prune_memo() -> int:
+    """Removes memo entries whose artifacts no longer exist. Returns the number removed."""
+    if not os.path.exists(_get_memo_path()):
+        return 0
+    try:
+        conn = _connect_memo()
+        try:
+            stale = [key for key, files in conn.execute("SELECT key, files FROM memo")
+                     if not all(os.path.isfile(path) for path in json.loads(files))]
+            conn.executemany("DELETE FROM memo WHERE key = ?", [(key,) for key in stale])
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Warning: Failed to prune workflow memo: {e}")
+        return 0
+    return len(stale)
+
+class Stage:
+    """
+    fn(**inputs) returns the stage output; None or False means failure.
+    For fan-out stages, `over` names a list input and fn is called once per item (as `item`).
+    """
+    def __init__(self, name, fn, inputs=(), retries=0, memoize=False, over=None, on_item_done=None):
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+        self.retries = retries
+        self.memoize = memoize
+        self.over = over
+        self.on_item_done = on_item_done
+
+class Workflow:
+    def __init__(self, name, max_workers=None):
+        self.name = name
+        self.max_workers = max_workers or get_max_workers()
+        self.stages = {}
+        self.timings = {}
+
+    def stage(self, name, fn, inputs=(), retries=0, memoize=False):
+        """Declares a stage that runs fn once all of its inputs are available."""
+        self.stages[name] = Stage(name, fn, inputs, retries, memoize)
+        return self
+
+    def fan_out(self, name, fn, over, inputs=(), retries=0, memoize=False, on_item_done=None):
+        """
+        Declares a stage that runs fn(item=..., **inputs) for every element of the list input
+        `over`, in parallel. Its output is the list of results in input order.
+        on_item_done(index, result) is called as each item finishes.
+        """
+        self.stages[name] = Stage(name, fn, [over] + list(inputs), retries, memoize, over, on_item_done)
+        return self
+
+    def _call(self, stage, label, kwargs):
+        """Runs one stage (or fan-out item) with memoization and retries. Returns (result, seconds)."""
+        start = time.perf_counter()
+        # The memo follows the response cache mode: --refresh-cache recomputes and stores, --no-cache neither reads nor stores
+        cache_mode = get_cache_mode()
+        key = _memo_key(self.name, label, kwargs) if stage.memoize and cache_mode != "bypass" else None
+        if key and cache_mode == "use":
+            cached = _memo_get(key)
+            if cached is not None:
+                print(f"[Workflow] {label}: reusing memoized result.")
+                return cached, time.perf_counter() - start
+
+        result = None
+        for attempt in range(stage.retries + 1):
+            try:
+                result = stage.fn(**kwargs)
+            except Exception as e:
+                print(f"[Workflow] {label} raised: {e}")
+                result = None
+            if result:
+                break
+            if attempt < stage.retries:
+                print(f"[Workflow] {label} failed. Retrying ({attempt + 1}/{stage.retries})...")
+
+        if key and result:
+            _memo_put(key, result)
+        return result, time.perf_counter() - start
+
+    def run(self, **params):
+        """
+        Runs every stage. Returns (True, outputs) where outputs maps parameter and stage names
+        to values, or (False, message) on the first stage that fails after its retries.
+        """
+        if any(stage.memoize for stage in self.stages.values()):
+            prune_memo()
+        outputs = dict(params)
+        pending = dict(self.stages)
+        running = {} # future -> (stage, item index or None)
+        fan_results = {} # stage name -> list of item results
+        fan_remaining = {}
+        fan_started = {}
+        failure = None
+        self.timings = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while (pending or running) and not failure:
+                progressed = True
+                while progressed and not failure:
+                    progressed = False
+                    for name, stage in list(pending.items()):
+                        missing = [i for i in stage.inputs if i not in outputs and i not in self.stages]
+                        if missing:
+                            failure = f"Stage '{name}' has undefined inputs: {', '.join(missing)}"
+                            break
+                        if not all(i in outputs for i in stage.inputs):
+                            continue
+                        del pending[name]
+                        progressed = True
+                        kwargs = {i: outputs[i] for i in stage.inputs if i != stage.over}
+                        if stage.over:
+                            items = list(outputs[stage.over] or [])
+                            fan_results[name] = [None] * len(items)
+                            fan_remaining[name] = len(items)
+                            fan_started[name] = time.perf_counter()
+                            self.timings[name] = 0.0
+                            if not items:
+                                outputs[name] = []
+                            for index, item in enumerate(items):
+                                future = executor.submit(self._call, stage, f"{name}[{index}]", dict(kwargs, item=item))
+                                running[future] = (stage, index)
+                        else:
+                            running[executor.submit(self._call, stage, name, kwargs)] = (stage, None)
+
+                if failure:
+                    continue
+                if not running:
+                    if pending:
+                        failure = f"Unresolvable stage inputs: {', '.join(pending)}"
+                    continue
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, index = running.pop(future)
+                    result, seconds = future.result()
+                    if index is None:
+                        self.timings[stage.name] = seconds
+                        if not result:
+                            failure = f"Stage '{stage.name}' failed."
+                            continue
+                        outputs[stage.name] = result
+                    else:
+                        # Fan-out timing is wall-clock from launch, since items overlap
+                        self.timings[stage.name] = time.perf_counter() - fan_started[stage.name]
+                        if not result:
+                            failure = f"Stage '{stage.name}' failed on item {index + 1}."
+                            continue
+                        fan_results[stage.name][index] = result
+                        if stage.on_item_done:
+                            stage.on_item_done(index, result)
+                        fan_remaining[stage.name] -= 1
+                        if fan_remaining[stage.name] == 0:
+                            outputs[stage.name] = fan_results[stage.name]
+
+            if failure:
+                for future in running:
+                    future.cancel()
+
+        print(f"[Timing] {self.name}: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.timings.items()))
+        if failure:
+            return False, failure
+        return True, outputs
+
+def critique_and_refine(draft, critique_fn, refine_fn, max_rounds=1, label="Draft"):
+    """
+    The shared audit loop: critique_fn(draft) -> report path; stops on "VERDICT: PASS",
+    otherwise refine_fn(draft, report) -> new draft. Returns the last good draft.
+    """
+    current = draft
+    for attempt in range(1, max_rounds + 1):
+        print(f"[Status] {label} - Attempt {attempt}/{max_rounds}: Running Critique...")
+        report = critique_fn(current)
+        if not report:
+            print(f"[Error] {label} critique failed. Proceeding with current draft.")
+            break
+        with open(report, 'r', encoding='utf-8') as f:
+            if "VERDICT: PASS" in f.read():
+                print(f"[Success] ✅ {label} Verified.")
+                break
+        print(f"[Status] ❌ {label} FAIL. Refining...")
+        refined = refine_fn(current, report)
+        if not refined:
+            print(f"[Error] {label} refinement failed.")
+            break
+        current = refined
+    return current
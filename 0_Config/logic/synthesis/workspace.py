@@ -0,0 +1,101 @@
+import os
+import glob
+import time
+import shutil
+import datetime
+from .journal import RunJournal, JOURNAL_FILENAME
+
+# Per-run workspaces.
+# Every synthesis run writes its drafts, reports, plans and journal into its own directory under
+# $GEMINI_TEMP_DIR/runs/, and that directory is passed explicitly through the pipeline, so
+# concurrent runs never share a file name and cleaning up a run is a single rmtree.
+
+RUNS_DIRNAME = "runs"
+DEFAULT_MAX_AGE_HOURS = 24 # `synthesis cleanup` keeps unfinished runs active more recently than this
+
+def get_runs_root() -> str:
+    return os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), RUNS_DIRNAME)
+
+def create_run_dir(label: str = "run") -> str:
+    """Creates and returns a new, unique run directory."""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    run_dir = os.path.join(get_runs_root(), f"{timestamp}-{label}-{os.urandom(3).hex()}")
+    os.makedirs(run_dir)
+    return run_dir
+
+def run_dir_of(path: str) -> str:
+    """The run directory containing path, or None if path is not inside one."""
+    if not path or not os.path.exists(path):
+        return None
+    runs_root = os.path.abspath(get_runs_root())
+    relative = os.path.relpath(os.path.abspath(path), runs_root)
+    if relative.startswith(os.pardir) or relative == os.curdir:
+        return None
+    return os.path.join(get_runs_root(), relative.split(os.sep)[0])
+
+def resolve_run_dir(run_dir: str = None, near: str = None, label: str = "run") -> str:
+    """
+    The run directory to work in: run_dir if given, else the run that produced `near`
+    (so manual step-by-step commands keep their artifacts together), else a new one.
+    """
+    if run_dir:
+        os.makedirs(run_dir, exist_ok=True)
+        return run_dir
+    return run_dir_of(near) or create_run_dir(label)
+
+def run_file(run_dir: str, prefix: str, extension: str = ".md") -> str:
+    """A fresh, unique artifact path inside run_dir."""
+    return os.path.join(run_dir, f"{prefix}_{os.urandom(4).hex()}{extension}")
+
+def write_run_file(run_dir: str, prefix: str, content: str, extension: str = ".md") -> str:
+    path = run_file(run_dir, prefix, extension)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+def remove_run_dir(run_dir: str) -> (bool, str):
+    try:
+        shutil.rmtree(run_dir)
+        return True, f"Removed run directory {run_dir}"
+    except FileNotFoundError:
+        return True, f"Run directory {run_dir} already removed."
+    except OSError as e:
+        return False, f"Error removing run directory {run_dir}: {e}"
+
+def last_activity(path: str) -> float:
+    """Newest modification time of path and the files directly inside it."""
+    latest = os.path.getmtime(path)
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    latest = max(latest, entry.stat().st_mtime)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return latest
+
+def is_run_removable(run_dir: str, max_age_seconds: float) -> bool:
+    """
+    True if run_dir can be removed without disturbing a run in progress: its journal records the
+    cleanup step, or nothing in it has changed for max_age_seconds.
+    """
+    journal = RunJournal(os.path.join(run_dir, JOURNAL_FILENAME))
+    if os.path.exists(journal.path) and journal.load() and "cleanup" in journal.state["steps"]:
+        return True
+    return time.time() - last_activity(run_dir) > max_age_seconds
+
+def find_resumable_run(source: str = None) -> str:
+    """
+    The most recent run directory whose journal is not complete, preferring runs of `source`.
+    Returns None if there is none.
+    """
+    candidates = []
+    for journal_path in glob.glob(os.path.join(get_runs_root(), "*", JOURNAL_FILENAME)):
+        journal = RunJournal(journal_path)
+        if journal.load() and "cleanup" not in journal.state["steps"]:
+            candidates.append((journal.state.get("source") == source, os.path.getmtime(journal_path), os.path.dirname(journal_path)))
+    if not candidates:
+        return None
+    return max(candidates)[2]
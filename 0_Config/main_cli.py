@@ -30,6 +30,10 @@ from .commands.task_commands import add_task_parser, handle_task_commands
 from .commands.save_commands import add_save_parser, handle_save_commands
 from .commands.log_commands import add_log_parser, handle_log_commands
 from .utils.config_parsers import parse_project_context
+from .utils.response_cache import set_cache_mode, get_cache_stats, format_cache_stats
+from .utils.llm_client import format_client_stats
+from .utils.context_cache import format_prefix_stats
+from .logic.synthesis.patching import format_patch_stats
 
 
 if __name__ == "__main__":
@@ -38,6 +42,8 @@ if __name__ == "__main__":
     project_variables = parse_project_context(project_variable_path)
 
     parser = argparse.ArgumentParser(description="Gemini CLI for Obsidian PKM automation.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache (no reads, no writes).")
+    parser.add_argument("--refresh-cache", action="store_true", help="Ignore cached LLM responses but store fresh ones.")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     add_synthesis_parser(subparsers)
@@ -50,6 +56,11 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    if args.no_cache:
+        set_cache_mode("bypass")
+    elif args.refresh_cache:
+        set_cache_mode("refresh")
+
 
     if args.command == "synthesis":
         success, log_message = handle_synthesis_commands(args)
@@ -91,3 +102,15 @@ if __name__ == "__main__":
         elif not success and log_message:
             print(f"Agent Action Error: {log_message}")
 
+    cache_stats = get_cache_stats()
+    if cache_stats["hits"] or cache_stats["misses"] or cache_stats["bypassed"]:
+        print(format_cache_stats())
+    client_stats = format_client_stats()
+    if client_stats:
+        print(client_stats)
+    prefix_stats = format_prefix_stats()
+    if prefix_stats:
+        print(prefix_stats)
+    patch_stats = format_patch_stats()
+    if patch_stats:
+        print(patch_stats)
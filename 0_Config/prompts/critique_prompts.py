@@ -4,34 +4,29 @@ def get_critique_prompt(source_filename, draft_filename):
     """
     Generates a prompt for the Sub-Agent to critique a preliminary synthesis.
     """
-    return f"""
-Your task is to perform a strict quality audit of a Preliminary Synthesis draft. You must compare it against the original source and the "Architect of Trust" mandates.
-
-### INPUTS
-1. **Original Source:** `{source_filename}`
-2. **Preliminary Draft:** `{draft_filename}`
-
-**Action Required:** You MUST use `read_file` to read BOTH files before starting your analysis.
+    return mandates.build_prompt(f"""
+# TASK: PRELIMINARY SYNTHESIS CRITIQUE
+Your task is to perform a strict quality audit of a Preliminary Synthesis draft. You must compare it against the original source and the "Architect of Trust" mandates above.
 
 ### AUDIT CRITERIA
 
 #### 1. THE HIGH-FIDELITY MANDATE (Completeness)
-*   **Mandate:** "{mandates.HIGH_FIDELITY_MANDATE}"
+*   **Mandate:** The High-Fidelity Mandate above.
 *   **Audit Task:** Did the draft collapse or summarize distinct technical details? 
 *   **EVIDENCE REQUIRED:** Identify any significant details/metaphors from the Source that are missing or overly generalized in the Draft. Quote the Source text vs. the Draft text. If the draft is comprehensive, state "High Fidelity Maintained".
 
 #### 2. THE VOICE & NUANCE MANDATE
-*   **Mandate:** "{mandates.VOICE_MANDATE}"
+*   **Mandate:** The Retrieval & Nuance Mandate (Part 1) above.
 *   **Audit Task:** 
     *   **First Person Check:** Scan Stream A. Does it use "I" consistently? If it uses "The user...", it FAILS.
     *   **Emotional Intensity:** Did the draft sanitize strong feelings? Quote an example of "Sanitized" vs "Raw".
 
 #### 3. THE TAGGING MANDATE
-*   **Mandate:** "{mandates.TAGGING_MANDATE}"
+*   **Mandate:** The 5-Dimension Tagging Mandate above.
 *   **Audit Task:** Does Stream A contain specific hashtags like `#value/` or `#preference/`? If NO tags are present, it FAILS.
 
 #### 4. THE LANGUAGE & IDIOM MANDATE
-*   **Mandate:** "{mandates.LANGUAGE_MANDATE}"
+*   **Mandate:** The Language Mandate (Part 1.5) above.
 *   **Audit Task:** 
     *   **Translation Check:** Did the draft translate specific Chinese idioms, metaphors, or "spirit" phrases into English? FAILS if yes.
     *   **Parenthesis Check:** Did it use "(Translation)" or "(Original)"? FAILS if yes.
@@ -60,23 +55,44 @@ Your task is to perform a strict quality audit of a Preliminary Synthesis draft.
 ## Feedback for Refinement
 (Provide direct instructions on what to fix if the verdict is FAIL.)
 
-**Action Required:** Write your report.
-"""
+### INPUTS
+1. **Original Source:** `{source_filename}`
+2. **Preliminary Draft:** `{draft_filename}`
 
-def get_refinement_prompt(source_filename, draft_filename, feedback_filename):
+**Action Required:** You MUST use `read_file` to read BOTH files before starting your analysis. Then write your report.
+""")
+
+def get_refinement_prompt(source_filename, draft_filename, feedback_filename, patch=False):
     """
     Generates a prompt for the Sub-Agent to refine a draft based on critique.
+    With patch=True the Sub-Agent answers with section edits instead of the whole draft.
     """
-    return f"""
+    if patch:
+        return mandates.build_prompt(f"""
+# TASK: PRELIMINARY SYNTHESIS REFINEMENT (PATCH)
 You are refining a Preliminary Synthesis draft based on a Critique Report.
 
+Edit the Preliminary Synthesis. You MUST address every violation and piece of feedback listed in the Critique Report while maintaining the mandates above.
+
+{mandates.MARKDOWN_PATCH_FORMAT}
+
 ### INPUTS
 1. **Original Source:** `{source_filename}`
 2. **Previous Draft:** `{draft_filename}`
 3. **Critique Report:** `{feedback_filename}`
 
 **Action Required:** You MUST read all three files.
+""")
+    return mandates.build_prompt(f"""
+# TASK: PRELIMINARY SYNTHESIS REFINEMENT
+You are refining a Preliminary Synthesis draft based on a Critique Report.
+
+Rewrite the Preliminary Synthesis. You MUST address every violation and piece of feedback listed in the Critique Report while maintaining the mandates above.
 
-### TASK
-Rewrite the Preliminary Synthesis. You MUST address every violation and piece of feedback listed in the Critique Report while maintaining the original mandates.
-"""
\ No newline at end of file
+### INPUTS
+1. **Original Source:** `{source_filename}`
+2. **Previous Draft:** `{draft_filename}`
+3. **Critique Report:** `{feedback_filename}`
+
+**Action Required:** You MUST read all three files.
+""")
\ No newline at end of file
@@ -4,24 +4,12 @@ def get_final_prompt(preliminary_filename, rag_context_filename):
     """
     Generates the prompt for the Sub-Agent to generate the Final Permanent Synthesis Note.
     """
-    return f"""
+    return mandates.build_prompt(f"""
+# TASK: FINAL SYNTHESIS NOTE
 You are creating a **Permanent Synthesis Note**. This is the final, authoritative record of the user's intellectual event.
 
-### INPUTS
-1. **Preliminary Synthesis:** `{preliminary_filename}`
-2. **RAG Context:** `{rag_context_filename}`
-
-**Action Required:** You MUST use `read_file` to read BOTH files.
-
 ### MANDATES (CRITICAL)
-
-{mandates.HIGH_FIDELITY_MANDATE}
-
-{mandates.VOICE_MANDATE}
-
-{mandates.TAGGING_MANDATE}
-
-{mandates.LANGUAGE_MANDATE}
+Apply the High-Fidelity, Retrieval & Nuance (Part 1), 5-Dimension Tagging and Language (Part 1.5) mandates above.
 
 ### PART 2: STRUCTURAL INTEGRITY
 You MUST strictly adhere to the standards defined in `0_Config/STRUCTURE_DEFINITIONS.md`.
@@ -42,17 +30,18 @@ Compose the final note with the following structure:
 6.  **Contradiction Analysis (if applicable):** dedicated section for clashes with the RAG context.
 7.  **References:**
     *   List the files from the RAG context that were most relevant.
-"""
-
-def get_final_critique_prompt(draft_filename, original_source_filename):
-    return f"""
-Your task is to audit a **Final Permanent Synthesis Note**.
 
 ### INPUTS
-1. **Draft Note:** `{draft_filename}`
-2. **Original Source:** `{original_source_filename}`
+1. **Preliminary Synthesis:** `{preliminary_filename}`
+2. **RAG Context:** `{rag_context_filename}`
 
-**Action Required:** Read BOTH files.
+**Action Required:** You MUST use `read_file` to read BOTH files.
+""")
+
+def get_final_critique_prompt(draft_filename, original_source_filename):
+    return mandates.build_prompt(f"""
+# TASK: FINAL NOTE CRITIQUE
+Your task is to audit a **Final Permanent Synthesis Note** against the mandates above.
 
 ### AUDIT CRITERIA
 
@@ -84,10 +73,31 @@ Your task is to audit a **Final Permanent Synthesis Note**.
 
 ## Feedback
 (Instructions for refinement)
-"""
 
-def get_final_refinement_prompt(draft_filename, feedback_filename, original_source_filename):
-    return f"""
+### INPUTS
+1. **Draft Note:** `{draft_filename}`
+2. **Original Source:** `{original_source_filename}`
+
+**Action Required:** Read BOTH files.
+""")
+
+def get_final_refinement_prompt(draft_filename, feedback_filename, original_source_filename, patch=False):
+    if patch:
+        return mandates.build_prompt(f"""
+# TASK: FINAL NOTE REFINEMENT (PATCH)
+Refine the Final Synthesis Note based on the critique and the original source.
+
+{mandates.MARKDOWN_PATCH_FORMAT}
+
+### INPUTS
+1. **Draft:** `{draft_filename}`
+2. **Critique:** `{feedback_filename}`
+3. **Original Source:** `{original_source_filename}`
+
+**Action Required:** Edit the note to fix the violations and restore any missing high-fidelity details from the source.
+""")
+    return mandates.build_prompt(f"""
+# TASK: FINAL NOTE REFINEMENT
 Refine the Final Synthesis Note based on the critique and the original source.
 
 ### INPUTS
@@ -96,7 +106,7 @@ Refine the Final Synthesis Note based on the critique and the original source.
 3. **Original Source:** `{original_source_filename}`
 
 **Action Required:** Rewrite the note to fix the violations and restore any missing high-fidelity details from the source.
-"""
+""")
 
 def get_keyword_extraction_prompt(content_filename):
     return f"""
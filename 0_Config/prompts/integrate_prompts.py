@@ -4,23 +4,12 @@ def get_integrate_prompt(rag_context_filename, source_note_filename, input_conte
     """
     Generates the prompt for the Sub-Agent to generate the Safe Integration JSON.
     """
-    return f"""
+    return mandates.build_prompt(f"""
+# TASK: SAFE INTEGRATION PLAN
 You are performing a "Safe Integration" of new information into your PKM vault.
 
-### INPUTS
-1. **RAG Context:** `{rag_context_filename}`
-2. **Input Content:** `{input_content_filename}`
-3. **Source Reference:** `{source_note_filename}`
-
-**Action Required:** You MUST use `read_file` to read ALL THREE files.
-
 ### MANDATES (CONTENT)
-
-{mandates.VOICE_MANDATE}
-
-{mandates.TAGGING_MANDATE}
-
-{mandates.LANGUAGE_MANDATE}
+Note content you write must follow the Retrieval & Nuance (Part 1), 5-Dimension Tagging and Language (Part 1.5) mandates above.
 
 ### STRATEGY (CRITICAL)
 1.  **Analyze the "Structured Extraction" Section:** Use this section of the input as the primary source for identifying new updates.
@@ -49,18 +38,24 @@ Types:
 3.  `manual_review`: {{ "type": "manual_review", "affected_files": [...], "content": "..." }}
 4.  `update_metadata`: {{ "type": "update_metadata", "file": "...", "add_tags": [...], ... }}
 
-"""
+### INPUTS
+1. **RAG Context:** `{rag_context_filename}`
+2. **Input Content:** `{input_content_filename}`
+3. **Source Reference:** `{source_note_filename}`
 
-def get_integrate_critique_prompt(json_filename, source_note_filename, rag_context_filename):
-    return f"""
-Audit the Integration JSON Plan against the original source and existing context.
+**Action Required:** You MUST use `read_file` to read ALL THREE files.
+""")
 
-### INPUTS
-1. **JSON Plan:** `{json_filename}`
-2. **Original Source:** `{source_note_filename}`
-3. **RAG Context:** `{rag_context_filename}`
+def get_integrate_critique_prompt(json_filename, source_note_filename, rag_context_filename, validation_filename=None):
+    validation_input = ""
+    if validation_filename:
+        validation_input = f"""4. **Local Validation Report:** `{validation_filename}`
 
-**Action Required:** Read ALL THREE files.
+The plan already passed local schema validation (valid JSON, known types, required fields, existing target files, no rename collisions). Do not re-check those; focus on the content criteria and weigh the validator's warnings.
+"""
+    return mandates.build_prompt(f"""
+# TASK: INTEGRATION PLAN CRITIQUE
+Audit the Integration JSON Plan against the original source and existing context.
 
 ### AUDIT CRITERIA
 1.  **JSON Syntax (CRITICAL):** Is it valid JSON? Check for raw unescaped newlines inside string values (which is invalid). Ensure all newlines are `\n`.
@@ -86,10 +81,32 @@ Audit the Integration JSON Plan against the original source and existing context
 
 ## Feedback
 (Instructions for refinement)
-"""
 
-def get_integrate_refinement_prompt(json_filename, feedback_filename, source_note_filename):
-    return f"""
+### INPUTS
+1. **JSON Plan:** `{json_filename}`
+2. **Original Source:** `{source_note_filename}`
+3. **RAG Context:** `{rag_context_filename}`
+{validation_input}
+**Action Required:** Read ALL input files.
+""")
+
+def get_integrate_refinement_prompt(json_filename, feedback_filename, source_note_filename, patch=False):
+    if patch:
+        return mandates.build_prompt(f"""
+# TASK: INTEGRATION PLAN REFINEMENT (PATCH)
+Refine the Integration JSON based on the critique and the original source.
+
+{mandates.JSON_PATCH_FORMAT}
+
+### INPUTS
+1. **JSON Draft:** `{json_filename}`
+2. **Critique:** `{feedback_filename}`
+3. **Original Source:** `{source_note_filename}`
+
+**Action Required:** Patch the JSON to fix violations while ensuring all insights from the source are captured.
+""")
+    return mandates.build_prompt(f"""
+# TASK: INTEGRATION PLAN REFINEMENT
 Refine the Integration JSON based on the critique and the original source.
 
 ### INPUTS
@@ -98,4 +115,4 @@ Refine the Integration JSON based on the critique and the original source.
 3. **Original Source:** `{source_note_filename}`
 
 **Action Required:** Rewrite the JSON to fix violations while ensuring all insights from the source are captured.
-"""
+""")
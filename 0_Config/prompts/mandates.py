@@ -1,3 +1,5 @@
+from ..utils.context_cache import join_stable_prefix
+
 # SHARED MANDATES FOR SYNTHESIS & INTEGRATION
 # This file serves as the Single Source of Truth for all sub-agent prompts.
 
@@ -46,3 +48,41 @@ Before synthesizing, you must interpret the input using these strict rules:
     *   **Affirmed AI Content in Chat History:** For such inferred chat histories, you will include content from the AI's presumed turns ONLY if the user's subsequent presumed messages explicitly affirm, refer to, or build upon that specific AI content. Use clear textual markers (e.g., "User: Yes, that point about X is correct," or "User: Regarding your idea Y...") to identify such affirmations.
     *   **General Delimitation for Ambiguous/Mixed Inputs:** If speaker turns cannot be reliably inferred, only the clearly identifiable direct user wording will be prioritized as "user language" for initial interpretation.
 2.  **Bias Exclusion (Clean Start):** This synthesis must rely EXCLUSIVELY on the provided input. You MUST flush your working memory of the current conversation's history and previous turn topics."""
+
+# PATCH OUTPUT FORMATS
+# Refinements in patch mode (logic/synthesis/patching.py) answer with an edit instead of a rewrite.
+
+MARKDOWN_PATCH_FORMAT = """### OUTPUT FORMAT: SECTION PATCH (NOT A REWRITE)
+Do NOT output the whole note. Output ONLY a JSON array of edit operations, applied in order to the draft:
+*   `{"op": "replace_section", "heading": "<exact heading text>", "content": "<new section body, without the heading line>"}`
+*   `{"op": "append_to_section", "heading": "<exact heading text>", "content": "<lines to add at the end of the section>"}`
+*   `{"op": "insert_section_after", "heading": "<exact heading text>", "content": "<new section, starting with its own heading line>"}`
+*   `{"op": "replace_text", "find": "<exact text that occurs once in the draft>", "replace": "<new text>"}`
+A section runs from its heading to the next heading of the same or a higher level. Headings must match the draft exactly. Change only what the critique requires; every unchanged part of the draft is kept verbatim."""
+
+JSON_PATCH_FORMAT = """### OUTPUT FORMAT: JSON PATCH (NOT A REWRITE)
+Do NOT output the whole plan. Output ONLY an RFC 6902 JSON Patch (a JSON array of operations) against the plan array, e.g.:
+`[{"op": "replace", "path": "/0/content", "value": "..."}, {"op": "add", "path": "/-", "value": {"type": "new_note", ...}}, {"op": "remove", "path": "/2"}]`
+Allowed ops: add, remove, replace, move, copy, test. Paths are JSON pointers into the plan (`/<item index>/<field>`; `/-` appends). Change only what the critique requires."""
+
+# STABLE SYSTEM PREFIX
+# Every synthesis/integration prompt starts with this exact text, so providers can cache it
+# (see utils/context_cache.py). Keep it free of per-call values; task-specific instructions and
+# file names go after the delimiter.
+
+SYSTEM_PREFIX = f"""# SHARED MANDATES
+You are a Sub-Agent of a Personal Knowledge Management (PKM) system that turns conversations and sources into Obsidian notes. The mandates below apply to every task. The task that follows states which of them it checks or applies.
+
+{HIGH_FIDELITY_MANDATE}
+
+{VOICE_MANDATE}
+
+{LANGUAGE_MANDATE}
+
+{TAGGING_MANDATE}
+
+{INPUT_PROCESSING_MANDATE}"""
+
+def build_prompt(task):
+    """Returns SYSTEM_PREFIX followed by the task-specific (variable) part of a prompt."""
+    return join_stable_prefix(SYSTEM_PREFIX, task.strip("\n") + "\n")
@@ -4,20 +4,11 @@ def get_preliminary_prompt(source_filename):
     """
     Generates the prompt for the Sub-Agent to perform preliminary synthesis.
     """
-    return f"""
+    return mandates.build_prompt(f"""
+# TASK: PRELIMINARY SYNTHESIS
 Your task is to generate a comprehensive, multi-perspective preliminary synthesis that captures the raw intellectual energy of the provided input while maintaining strict structural rigor. You must prioritize the user's literal voice and clearly separate their affirmed insights from unconfirmed LLM context.
 
-### INPUT SOURCE
-The input content is located in the file: `{source_filename}`
-**Action Required:** You MUST use the `read_file` tool to read the contents of this file before proceeding.
-
-{mandates.HIGH_FIDELITY_MANDATE}
-
-{mandates.VOICE_MANDATE}
-
-{mandates.LANGUAGE_MANDATE}
-
-{mandates.INPUT_PROCESSING_MANDATE}
+Apply ALL of the shared mandates above: High-Fidelity, Retrieval & Nuance (Part 1), Language (Part 1.5), 5-Dimension Tagging and Input Processing (Part 2).
 
 ### PART 3: SYNTHESIS EXTRACTION - TWO STREAMS
 Once the input is processed/filtered, extract information into two distinct streams:
@@ -29,8 +20,7 @@ This captures insights, facts, observations, and motivations directly attributab
 *   **Personal Observations & Logic:** Document the user's personal observations, interpretations, or reasoning (e.g., specific metaphors, technical specs, system logic).
 *   **Core Motivation & Vibe:** Identify and articulate the user's implicit or explicit motivations, values, or goals (The "Why").
 *   **Non-Prescriptive Mandate:** Capture ONLY what the user *has done*, *is doing*, or *explicitly plans to do* (e.g., "I will try X"). Do NOT convert observations into imperative advice or "suggested actions" (e.g., "You should do X") unless the user explicitly framed it as a directive to themselves.
-
-{mandates.TAGGING_MANDATE}
+*   **Tagging:** Classify every Stream A insight per the 5-Dimension Tagging Mandate.
 
 #### STREAM B: Unaffirmed LLM Information (The "LITERATURE" Stream)
 This captures information generated by the LLM (me) that was part of the conversation but was NOT explicitly affirmed, validated, or built upon by the user. 
@@ -67,4 +57,8 @@ Output the synthesis using this exact Markdown structure:
 
 ### External Context Provided by LLM
 (Summary of external context provided by LLM not affirmed by user.)
-"""
\ No newline at end of file
+
+### INPUT SOURCE
+The input content is located in the file: `{source_filename}`
+**Action Required:** You MUST use the `read_file` tool to read the contents of this file before proceeding.
+""")
\ No newline at end of file
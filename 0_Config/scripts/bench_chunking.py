@@ -0,0 +1,107 @@
+import os
+import sys
+import random
+import argparse
+
+# Add logic/synthesis to sys.path for standalone execution
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "logic", "synthesis")))
+from chunking import split_into_chunks, estimate_tokens, HEADER_PATTERN, TURN_PATTERN, DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS
+
+LEGACY_CHUNK_LINES = 500
+
+WORDS = ("system memory vault note synthesis idea context value need preference basement motherboard "
+         "surface interface latency workflow obsidian python agent token chunk header turn paragraph").split()
+CJK_PHRASES = ["不说破，但我看好你", "风九", "锦衣还", "我觉得这个很重要", "慢慢来"]
+
+def _sentence(rng, min_words, max_words):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    if rng.random() < 0.1:
+        words.append(rng.choice(CJK_PHRASES))
+    return " ".join(words).capitalize() + "."
+
+def build_corpus(seed=7):
+    """Returns {name: text} for the synthetic benchmark corpus."""
+    rng = random.Random(seed)
+    corpus = {}
+
+    # 1. Chat log of many short lines (the legacy chunker over-splits these)
+    lines = []
+    for turn in range(1400):
+        speaker = "User" if turn % 2 == 0 else "Gemini"
+        lines.append(f"{speaker}: {_sentence(rng, 3, 8)}")
+        for _ in range(rng.randint(0, 3)):
+            lines.append(_sentence(rng, 2, 6))
+        lines.append("")
+    corpus["short_line_chat"] = "\n".join(lines) + "\n"
+
+    # 2. Pasted article of long paragraphs (the legacy chunker produces oversized chunks)
+    paragraphs = []
+    for _ in range(60):
+        paragraphs.append(" ".join(_sentence(rng, 12, 25) for _ in range(rng.randint(8, 20))))
+    corpus["long_paragraph_paste"] = "\n\n".join(paragraphs) + "\n"
+
+    # 3. Structured Markdown session log with headers and turns
+    lines = []
+    for section in range(40):
+        lines.append(f"## Session {section + 1}")
+        lines.append("")
+        for turn in range(rng.randint(6, 14)):
+            speaker = "**User:**" if turn % 2 == 0 else "**Assistant:**"
+            lines.append(f"{speaker} {' '.join(_sentence(rng, 6, 18) for _ in range(rng.randint(1, 6)))}")
+            lines.append("")
+    corpus["markdown_session_log"] = "\n".join(lines) + "\n"
+
+    return corpus
+
+def legacy_chunks(text):
+    raw_lines = text.splitlines(keepends=True)
+    if len(raw_lines) <= LEGACY_CHUNK_LINES:
+        return [text]
+    return ["".join(raw_lines[i:i + LEGACY_CHUNK_LINES]) for i in range(0, len(raw_lines), LEGACY_CHUNK_LINES)]
+
+def _strip_overlap(previous, chunk):
+    """Removes the copy of the previous chunk's tail that the overlap window prepends."""
+    previous_lines = previous.splitlines(keepends=True)
+    for k in range(min(len(previous_lines), 200), 0, -1):
+        tail = "".join(previous_lines[-k:])
+        if chunk.startswith(tail) and len(tail) < len(chunk):
+            return chunk[len(tail):]
+    return chunk
+
+def _structured_starts(chunks):
+    """Counts chunks (after the first) whose new content begins at a header, speaker turn or paragraph."""
+    count = 0
+    for i in range(1, len(chunks)):
+        body = _strip_overlap(chunks[i - 1], chunks[i])
+        first_line = next((l for l in body.splitlines() if l.strip()), "")
+        if HEADER_PATTERN.match(first_line) or TURN_PATTERN.match(first_line) or body.startswith("\n") or chunks[i - 1].endswith("\n\n"):
+            count += 1
+    return count
+
+def report(name, chunks, budget):
+    sizes = [estimate_tokens(c) for c in chunks]
+    over = sum(1 for s in sizes if s > budget)
+    return f"  {name:<8} chunks={len(chunks):>4}  max_tokens={max(sizes):>7}  mean_tokens={sum(sizes) // len(sizes):>6}  over_budget={over}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the legacy 500-line chunker with the token-sized chunker on a synthetic corpus.")
+    parser.add_argument("--budget", type=int, default=DEFAULT_CHUNK_TOKENS, help="Token budget per chunk.")
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP_TOKENS, help="Overlap window in tokens.")
+    parser.add_argument("--seed", type=int, default=7, help="Corpus random seed.")
+    args = parser.parse_args()
+
+    totals = {"legacy": [0, 0], "token": [0, 0]} # [chunks, chunks over budget]
+    for corpus_name, text in build_corpus(args.seed).items():
+        old = legacy_chunks(text)
+        new = split_into_chunks(text, args.budget, args.overlap)
+        for name, chunks in (("legacy", old), ("token", new)):
+            totals[name][0] += len(chunks)
+            totals[name][1] += sum(1 for c in chunks if estimate_tokens(c) > args.budget)
+
+        print(f"{corpus_name}: {len(text.splitlines())} lines, ~{estimate_tokens(text)} tokens")
+        print(report("legacy", old, args.budget))
+        print(report("token", new, args.budget))
+        print(f"  boundaries at header/turn/paragraph: legacy {_structured_starts(old)}/{len(old) - 1}, token {_structured_starts(new)}/{len(new) - 1}")
+
+    print(f"\nTotal chunks (= preliminary LLM generations): legacy {totals['legacy'][0]}, token {totals['token'][0]}")
+    print(f"Chunks over the {args.budget}-token budget: legacy {totals['legacy'][1]}, token {totals['token'][1]}")
@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import tempfile
+import argparse
+import threading
+import urllib.error
+import urllib.request
+import concurrent.futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add utils to sys.path for standalone execution
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "utils")))
+from llm_client import AsyncLLMClient, RateLimitError
+from rate_limiter import RateLimiter
+from llm_scheduler import LLMScheduler
+from token_estimator import estimate_tokens
+
+# Benchmarks the serialized legacy limiter (lock held across sleep + API call) against the
+# token-bucket AsyncLLMClient, using a local fake LLM server with injected latency and 429s.
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+    jitter = 0.2
+    error_rate = 0.0
+    rng = random.Random(7)
+    rng_lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.rng_lock:
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            rate_limited = self.rng.random() < self.error_rate
+        time.sleep(delay)
+
+        if rate_limited:
+            self.send_response(429)
+            self.end_headers()
+            self.wfile.write(b'{"error": "RESOURCE_EXHAUSTED"}')
+            return
+
+        prompt = body.get("prompt", "")
+        payload = json.dumps({
+            "text": f"Response to: {prompt[:40]}",
+            "prompt_tokens": estimate_tokens(prompt),
+            "output_tokens": 64,
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_server(latency, jitter, error_rate):
+    FakeLLMHandler.latency = latency
+    FakeLLMHandler.jitter = jitter
+    FakeLLMHandler.error_rate = error_rate
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeLLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def post_prompt(url, prompt):
+    request = urllib.request.Request(url, data=json.dumps({"prompt": prompt}).encode("utf-8"), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            data = json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        if e.code == 429:
+            raise RateLimitError("429 RESOURCE_EXHAUSTED") from e
+        raise
+    return data["text"], data["prompt_tokens"], data["output_tokens"]
+
+def make_http_transport(url):
+    async def transport(prompt, model_name, api_key=None):
+        return await asyncio.to_thread(post_prompt, url, prompt)
+    return transport
+
+def run_legacy(url, prompts, rpm, tpm, workers):
+    """The pre-token-bucket llm_sim behaviour: one lock held across the wait and the request."""
+    lock = threading.Lock()
+    history = [] # (timestamp, tokens)
+    failures = [0]
+
+    def call(prompt):
+        with lock:
+            now = time.time()
+            history[:] = [(t, n) for t, n in history if t > now - 60]
+            wait = 0
+            if len(history) >= rpm:
+                wait = history[0][0] + 60 - now
+            if sum(n for _, n in history) + estimate_tokens(prompt) > tpm:
+                wait = max(wait, history[0][0] + 60 - now)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                text, prompt_tokens, output_tokens = post_prompt(url, prompt)
+            except Exception:
+                failures[0] += 1
+                prompt_tokens, output_tokens = estimate_tokens(prompt), 0
+            history.append((time.time(), prompt_tokens + output_tokens))
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(call, prompts))
+    return time.perf_counter() - start, failures[0]
+
+async def run_async(url, prompts, rpm, tpm, keys=1):
+    if keys > 1:
+        # One limiter per (fake) key: capacity, and so throughput, scales with the number of keys
+        scheduler = LLMScheduler(api_keys=[f"bench-key-{i:08d}" for i in range(keys)], tier_models={"standard": ["bench"]}, profiles={"bench": {"rpm": rpm, "tpm": tpm}})
+        client = AsyncLLMClient(transport=make_http_transport(url), scheduler=scheduler, backoff_base=0.2, backoff_cap=2.0)
+    else:
+        client = AsyncLLMClient(transport=make_http_transport(url), limiter=RateLimiter(rpm, tpm), backoff_base=0.2, backoff_cap=2.0)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client.generate(p) for p in prompts))
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(1 for r in results if r.startswith("Error")), client.stats
+
+def check_retry_refunds(failures=3, rpm=60, tpm=100000):
+    """
+    Sends one prompt that is answered with `failures` 429s before it succeeds and checks that the
+    buckets were charged for the successful request only (the failed attempts are refunded).
+    """
+    attempts = [0]
+
+    async def transport(prompt, model_name, api_key=None):
+        attempts[0] += 1
+        if attempts[0] <= failures:
+            raise RateLimitError("429 RESOURCE_EXHAUSTED")
+        return "ok", 1000, 50
+
+    # A window of hours makes refill during the check negligible
+    limiter = RateLimiter(rpm, tpm, window_seconds=36000)
+    client = AsyncLLMClient(transport=transport, limiter=limiter, backoff_base=0.001, backoff_cap=0.01)
+    result = asyncio.run(client.generate("Prompt: " + "context " * 500))
+    rpm_used = rpm - limiter.rpm_bucket.tokens
+    tpm_used = tpm - limiter.tpm_bucket.tokens
+    assert result == "ok", result
+    assert attempts[0] == failures + 1, attempts[0]
+    assert abs(rpm_used - 1) < 0.01, f"RPM bucket charged {rpm_used:.2f} requests for {failures} 429s + 1 success"
+    assert abs(tpm_used - 1050) < 1, f"TPM bucket charged {tpm_used:.0f} tokens, expected 1050"
+    return rpm_used, tpm_used
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the serialized legacy rate limiter with the token-bucket async LLM client.")
+    parser.add_argument("--requests", type=int, default=40, help="Number of prompts to send.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake server base latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Extra random latency in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Fraction of requests answered with 429.")
+    parser.add_argument("--rpm", type=int, default=600, help="Requests-per-minute limit for both limiters.")
+    parser.add_argument("--tpm", type=int, default=2000000, help="Tokens-per-minute limit for both limiters.")
+    parser.add_argument("--workers", type=int, default=8, help="Caller threads for the legacy path.")
+    parser.add_argument("--keys", type=int, default=1, help="Fake API keys for the async client (each with its own RPM/TPM limits).")
+    args = parser.parse_args()
+
+    # Calibration is irrelevant here; keep the benchmark from writing token_calibration.json into the cwd
+    os.environ.setdefault("GEMINI_TEMP_DIR", tempfile.mkdtemp(prefix="bench_llm_client_"))
+    os.environ["GEMINI_RATE_LIMIT_STATE"] = "off" # Keep the benchmark's buckets out of the shared limiter state
+
+    rpm_used, tpm_used = check_retry_refunds()
+    print(f"429 retries refunded: 3x 429 + 1 success charged {rpm_used:.2f} request(s) / {tpm_used:.0f} tokens\n")
+
+    server = start_fake_server(args.latency, args.jitter, args.error_rate)
+    url = f"http://127.0.0.1:{server.server_address[1]}/generate"
+    prompts = [f"Prompt {i}: " + "context " * random.Random(i).randint(200, 2000) for i in range(args.requests)]
+
+    print(f"{args.requests} requests, latency {args.latency}s (+{args.jitter}s jitter), 429 rate {args.error_rate:.0%}, limits {args.rpm} RPM / {args.tpm} TPM\n")
+
+    legacy_elapsed, legacy_failures = run_legacy(url, prompts, args.rpm, args.tpm, args.workers)
+    print(f"  legacy (serialized) : {legacy_elapsed:7.2f}s  {args.requests / legacy_elapsed * 60:7.1f} req/min  failed={legacy_failures}")
+
+    async_elapsed, async_failures, stats = asyncio.run(run_async(url, prompts, args.rpm, args.tpm, args.keys))
+    print(f"  async, {args.keys} key(s)    : {async_elapsed:7.2f}s  {args.requests / async_elapsed * 60:7.1f} req/min  failed={async_failures}  retried_429={stats['rate_limited']}")
+
+    print(f"\nSpeedup: {legacy_elapsed / async_elapsed:.1f}x")
+    server.shutdown()
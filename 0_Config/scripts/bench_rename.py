@@ -0,0 +1,120 @@
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+import importlib
+
+# Benchmark of `note rename` (propagate_rename) against vault size.
+# For each size a synthetic vault is generated (committed to git unless --no-git) in which a fixed
+# number of notes link to the renamed one. "legacy scan" is the old approach (walk the whole vault and
+# read every note); "cold index" is the first rename, which builds the backlink index; "indexed" is a
+# later rename, which checks the index for outside edits and opens only the linking notes; "refresh"
+# is that freshness check alone. Without git the freshness check is a stat walk over every note.
+# "N sequential" / "N batched" rename N other notes one at a time and with one propagate_renames call.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+config_dir = os.path.dirname(script_dir)
+sys.path.insert(0, os.path.dirname(config_dir))
+note_metadata = importlib.import_module(f"{os.path.basename(config_dir)}.logic.note_metadata")
+backlink_index = importlib.import_module(f"{os.path.basename(config_dir)}.logic.backlink_index")
+
+WORDS = "vault note idea value need latency workflow obsidian python agent memory context signal habit garden".split()
+
+def build_vault(vault_dir, notes, backlinks, seed, batch=0):
+    """Writes notes Markdown notes; `backlinks` of them link to Target_0 and to each of 2 * batch Batch_i notes. Returns the target paths."""
+    rng = random.Random(seed)
+    folders = ["2_Literature_Notes", "3_Permanent_Notes", "1_Fleeting_Notes"]
+    for folder in folders:
+        os.makedirs(os.path.join(vault_dir, folder), exist_ok=True)
+    linking = {"Target_0": set(rng.sample(range(notes), backlinks))}
+    for batch_number in range(2 * batch):
+        linking[f"Batch_{batch_number}"] = set(rng.sample(range(notes), backlinks))
+    for i in range(notes):
+        links = [f"[[Note_{rng.randrange(notes)}]]" for _ in range(3)]
+        links += [f"[[{name}]]" for name, sources in linking.items() if i in sources]
+        body = " ".join(rng.choice(WORDS) for _ in range(150))
+        with open(os.path.join(vault_dir, folders[i % 3], f"Note_{i}.md"), 'w', encoding='utf-8') as f:
+            f.write(f"---\ntags: [bench]\naliases: []\n---\n# Note {i}\n{body}\n\n{' '.join(links)}\n")
+    targets = []
+    for round_number in range(4):
+        path = os.path.join(vault_dir, "3_Permanent_Notes", f"Target_{round_number}.md")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"---\ntags: [bench]\naliases: []\n---\n# Target {round_number}\n")
+        targets.append(path)
+    for batch_number in range(2 * batch):
+        with open(os.path.join(vault_dir, "3_Permanent_Notes", f"Batch_{batch_number}.md"), 'w', encoding='utf-8') as f:
+            f.write(f"---\ntags: [bench]\naliases: []\n---\n# Batch {batch_number}\n")
+    return targets
+
+def legacy_scan(old_name):
+    """The pre-index lookup: read every note under the vault and search it for the old name."""
+    link_pattern = re.compile(rf'\[\[(.*?[\/\\])?{re.escape(old_name)}(\|.*?)?\]\]')
+    matches = 0
+    for root, _, files in os.walk("."):
+        for file in files:
+            if file.endswith(".md"):
+                with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
+                    if link_pattern.search(f.read()):
+                        matches += 1
+    return matches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark propagate_rename against vault size.")
+    parser.add_argument("--sizes", default="500,2000,8000", help="Comma-separated vault sizes (number of notes).")
+    parser.add_argument("--backlinks", type=int, default=10, help="Notes linking to the renamed note.")
+    parser.add_argument("--batch", type=int, default=5, help="Renames in the sequential vs. batched comparison.")
+    parser.add_argument("--no-git", action="store_true", help="Do not make the vault a git repository (stat-walk freshness check).")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    original_cwd = os.getcwd()
+    print(f"{'notes':>7} {'legacy scan':>12} {'cold index':>11} {'indexed':>9} {'refresh':>9} {'files updated':>14} {f'{args.batch} sequential':>13} {f'{args.batch} batched':>10}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        vault_dir = tempfile.mkdtemp(prefix="bench_rename_")
+        try:
+            build_vault(vault_dir, size, args.backlinks, args.seed, args.batch)
+            os.chdir(vault_dir)
+            os.environ["GEMINI_TEMP_DIR"] = os.path.join(vault_dir, ".bench_tmp")
+            if not args.no_git:
+                with open(".gitignore", 'w', encoding='utf-8') as f:
+                    f.write(".bench_tmp/\n")
+                for command in (["git", "init", "-q"], ["git", "add", "-A"], ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-q", "-m", "Bench vault"]):
+                    subprocess.run(command, check=True)
+
+            start = time.perf_counter()
+            legacy_scan("Target_0")
+            legacy = time.perf_counter() - start
+
+            start = time.perf_counter()
+            note_metadata.propagate_rename("3_Permanent_Notes/Target_1.md", "Renamed_1")
+            cold = time.perf_counter() - start
+
+            note_metadata.propagate_rename("3_Permanent_Notes/Target_2.md", "Renamed_2")
+            start = time.perf_counter()
+            success, message = note_metadata.propagate_rename("3_Permanent_Notes/Target_0.md", "Renamed_0")
+            indexed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            backlink_index.BacklinkIndex().refresh()
+            refresh = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for batch_number in range(args.batch):
+                note_metadata.propagate_rename(f"3_Permanent_Notes/Batch_{batch_number}.md", f"Renamed_Batch_{batch_number}")
+            sequential = time.perf_counter() - start
+
+            start = time.perf_counter()
+            note_metadata.propagate_renames([(f"3_Permanent_Notes/Batch_{batch_number}.md", f"Renamed_Batch_{batch_number}")
+                                             for batch_number in range(args.batch, 2 * args.batch)])
+            batched = time.perf_counter() - start
+
+            updated = re.search(r"Updated links in (\d+) files", message)
+            print(f"{size:>7} {legacy * 1000:>10.1f}ms {cold * 1000:>9.1f}ms {indexed * 1000:>7.1f}ms {refresh * 1000:>7.1f}ms {updated.group(1) if updated else message:>14} {sequential * 1000:>11.1f}ms {batched * 1000:>8.1f}ms")
+        finally:
+            os.chdir(original_cwd)
+            shutil.rmtree(vault_dir, ignore_errors=True)
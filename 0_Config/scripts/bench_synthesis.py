@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# Add utils to sys.path for standalone execution
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(script_dir), "utils"))
+sys.path.insert(0, script_dir)
+from llm_stub import StubResponder, start_stub_server
+from llm_stub_server import add_stub_arguments, stub_settings_from_args
+
+# Offline end-to-end benchmark of `synthesis init`.
+# Builds a scratch vault (a copy of 0_Config, sample notes and generated sources, in its own git repo),
+# serves the deterministic stub LLM and runs `synthesis init --batch` against it. Reports wall time,
+# throughput and per-source latency. The same seed and settings reproduce the same run.
+
+TOPICS = ["Soft Brutalism", "Pneumatic Metabolism", "Knowledge Graph", "Somatic Memory", "CLI Workflow", "Tea Ceremony",
+          "Latency Budget", "Urban Gardening", "Slow Reading", "Signal Processing", "Habit Loops", "Quiet Leadership"]
+
+VAULT_DIRS = ["1_Fleeting_Notes", "2_Literature_Notes", "3_Permanent_Notes", "4_Map_of_Content", "5_Tasks", "6_Logs"]
+
+def build_scratch_vault(vault_dir, sources, source_words, seed):
+    """Creates the vault and its sources. Returns the source directory."""
+    config_dir = os.path.dirname(script_dir)
+    shutil.copytree(config_dir, os.path.join(vault_dir, "0_Config"), ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+    for name in VAULT_DIRS:
+        os.makedirs(os.path.join(vault_dir, name), exist_ok=True)
+
+    rng = random.Random(seed)
+    for topic in TOPICS:
+        related = rng.sample(TOPICS, 2)
+        with open(os.path.join(vault_dir, "3_Permanent_Notes", f"{topic}.md"), 'w', encoding='utf-8') as f:
+            f.write(f"---\ntags: [{topic.lower().replace(' ', '-')}]\naliases: []\n---\n# {topic}\n"
+                    f"I think {topic} relates to [[{related[0]}]] and [[{related[1]}]].\n")
+
+    source_dir = os.path.join(vault_dir, "bench_sources")
+    os.makedirs(source_dir)
+    for i in range(sources):
+        topics = rng.sample(TOPICS, 3)
+        words = " ".join(rng.choice(topics).split()[-1] if rng.random() < 0.2 else rng.choice(["I", "feel", "the", "way", "of", "it", "so", "and", "my", "we"]) for _ in range(source_words))
+        with open(os.path.join(source_dir, f"source_{i:03d}.md"), 'w', encoding='utf-8') as f:
+            f.write(f"User: Let's talk about {', '.join(topics)}.\n\n{words}\n")
+
+    for command in (["git", "init", "-q"], ["git", "add", "-A"], ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-q", "-m", "Bench vault"]):
+        subprocess.run(command, cwd=vault_dir, check=True)
+    return source_dir
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)] if ordered else 0.0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark `synthesis init` end to end against the local stub LLM.")
+    parser.add_argument("--sources", type=int, default=6, help="Number of generated sources.")
+    parser.add_argument("--source-words", type=int, default=400, help="Words per generated source.")
+    parser.add_argument("--parallel", type=int, default=3, help="Sources processed concurrently (synthesis init --batch --parallel).")
+    parser.add_argument("--rpm", type=int, default=600, help="Stub RPM limit (use 10 to include the production rate limit).")
+    parser.add_argument("--tpm", type=int, default=2000000, help="Stub TPM limit.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch vault for inspection.")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    vault_dir = tempfile.mkdtemp(prefix="bench_synthesis_")
+    build_scratch_vault(vault_dir, args.sources, args.source_words, args.seed)
+    responder = StubResponder(stub_settings_from_args(args))
+    server, url = start_stub_server(responder=responder)
+
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_LLM_BACKEND": "stub",
+        "GEMINI_STUB_URL": url,
+        "GEMINI_STUB_RPM": str(args.rpm),
+        "GEMINI_STUB_TPM": str(args.tpm),
+        "GEMINI_TEMP_DIR": os.path.join(vault_dir, ".bench_tmp"),
+        "GEMINI_RATE_LIMIT_STATE": os.path.join(vault_dir, ".bench_tmp", "rate_limits.sqlite"),
+        "GEMINI_CACHE_MODE": "bypass", # Measure the pipeline, not the response cache
+        "GIT_AUTHOR_NAME": "bench", "GIT_AUTHOR_EMAIL": "bench@localhost",
+        "GIT_COMMITTER_NAME": "bench", "GIT_COMMITTER_EMAIL": "bench@localhost",
+    })
+    os.makedirs(env["GEMINI_TEMP_DIR"])
+
+    print(f"{args.sources} sources x {args.source_words} words, {args.parallel} in parallel, stub latency {args.latency}s "
+          f"(+{args.jitter}s), 429 {args.rate_limit_rate:.0%}, errors {args.error_rate:.0%}, FAIL critiques {args.fail_rate:.0%}, "
+          f"broken plans {args.broken_plan_rate:.0%}, seed {args.seed}\nVault: {vault_dir}\n")
+
+    log_path = os.path.join(vault_dir, "bench.log")
+    start = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        result = subprocess.run([sys.executable, "0_Config/main_cli.py", "synthesis", "init", "--batch", "bench_sources", "--parallel", str(args.parallel)],
+                                cwd=vault_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    try:
+        with open(os.path.join(env["GEMINI_TEMP_DIR"], "synthesis_batch", "batch_status.json"), 'r', encoding='utf-8') as f:
+            entries = list(json.load(f)["sources"].values())
+    except (OSError, ValueError, KeyError):
+        entries = []
+    applied = [entry for entry in entries if entry["status"] == "applied"]
+    latencies = [entry["seconds"] for entry in applied]
+
+    print(f"Wall time   : {elapsed:.1f}s (exit code {result.returncode})")
+    print(f"Applied     : {len(applied)}/{args.sources}")
+    print(f"Throughput  : {len(applied) / elapsed * 3600:.1f} sources/hour")
+    if latencies:
+        print(f"Latency     : p50 {statistics.median(latencies):.1f}s, p95 {percentile(latencies, 0.95):.1f}s, max {max(latencies):.1f}s per source")
+    print(responder.format_stats())
+
+    if args.keep or result.returncode != 0:
+        print(f"Log         : {log_path}")
+    else:
+        shutil.rmtree(vault_dir, ignore_errors=True)
@@ -1,23 +1,83 @@
 import sys
 import os
 
-# Bridge to the gemini_subagent submodule
 script_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.dirname(os.path.dirname(script_dir))
-if project_root not in sys.path:
-    sys.path.insert(0, project_root)
 
 try:
-    from gemini_subagent.sub_agent import call_sub_agent
+    from ..utils.response_cache import cached_call
+    from ..utils.rate_limiter import wait_for_capacity
+    from ..utils.token_estimator import estimate_tokens
+    from ..utils.llm_scheduler import is_light_tier_enabled, LIGHT_TIER
+    from ..utils.llm_sim import llm_call
+    from ..utils.context_cache import record_prompt
+    from ..utils.llm_backend import get_backend, has_llm_access
 except ImportError:
-    # Fallback for different execution contexts
-    sys.path.append(os.path.join(project_root, "gemini_subagent"))
-    try:
-        from sub_agent import call_sub_agent
-    except ImportError:
-        def call_sub_agent(prompt):
-            print("Error: gemini_subagent module not found.")
-            return None
+    # Standalone execution (python call_agent_task.py ...)
+    sys.path.insert(0, os.path.join(os.path.dirname(script_dir), "utils"))
+    from response_cache import cached_call
+    from rate_limiter import wait_for_capacity
+    from token_estimator import estimate_tokens
+    from llm_scheduler import is_light_tier_enabled, LIGHT_TIER
+    from context_cache import record_prompt
+    from llm_backend import get_backend, has_llm_access
+    llm_call = None # llm_sim needs package-relative imports; light-tier tasks fall back to the Sub-Agent
+
+SUB_AGENT_MODEL = os.environ.get("GEMINI_SUBAGENT_MODEL", "gemini_subagent")
+
+def _estimate_request_tokens(prompt, input_files=None):
+    """Prompt tokens plus ~1 token per 4 bytes of every attached input file."""
+    tokens = estimate_tokens(prompt)
+    for path in (input_files or {}).values():
+        try:
+            tokens += os.path.getsize(path) // 4
+        except OSError:
+            pass
+    return tokens
+
+def _inline_input_files(prompt, input_files):
+    """Appends each input file's content under its alias, for tasks sent without the Sub-Agent."""
+    parts = [prompt]
+    for alias, path in (input_files or {}).items():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except OSError:
+            content = ""
+        parts.append(f"--- Start of {alias} ---\n{content}\n--- End of {alias} ---")
+    return "\n\n".join(parts)
+
+def _call_light_tier(prompt, input_files=None):
+    """Runs a self-contained task on the light model tier. Returns None on failure."""
+    print("[Status] Light-tier task: sending directly to the light model tier.")
+    result = llm_call(_inline_input_files(prompt, input_files), tier=LIGHT_TIER)
+    if not result or result.startswith("Error"):
+        print(f"Light-tier call failed ({result}). Falling back to the Sub-Agent.")
+        return None
+    return result
+
+def call_sub_agent(prompt, input_files=None, tier=None):
+    """
+    Dispatches a task to the gemini_subagent, reusing a cached response when the
+    prompt, model and input file contents are identical to an earlier call.
+    tier="light" marks cheap, self-contained tasks (keyword extraction, critiques); when an
+    API key is configured they go straight to the light model tier with their input files inlined.
+    """
+    if tier == LIGHT_TIER and llm_call and is_light_tier_enabled() and has_llm_access():
+        result = _call_light_tier(prompt, input_files)
+        if result:
+            return result
+
+    backend = get_backend()
+
+    def dispatch():
+        # Sub-Agent calls share the cross-process RPM/TPM budget with every other running CLI
+        wait_for_capacity(backend.sub_agent_limiter(SUB_AGENT_MODEL), _estimate_request_tokens(prompt, input_files), "Sub-Agent call")
+        usage = record_prompt(prompt)
+        if usage["prefix"]:
+            print(f"[Status] Sub-Agent prompt: {usage['static_tokens']} static (prefix {usage['prefix']}) + {usage['variable_tokens']} variable tokens.")
+        return backend.sub_agent(prompt, input_files=input_files)
+
+    return cached_call(dispatch, prompt, backend.qualify(SUB_AGENT_MODEL), input_files)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -8,8 +8,7 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 # Add utils to sys.path for standalone execution
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "utils")))
-from rag_cli_utils import extract_metadata_and_first_section
-from file_utils import read_file_content
+from rag_cli_utils import consolidate_rag_files
 
 def consolidate_rag(relevant_files_path, output_path=None):
     """
@@ -26,24 +25,7 @@ def consolidate_rag(relevant_files_path, output_path=None):
         print(f"Error reading {relevant_files_path}: {e}")
         return False
 
-    consolidated_content = []
-    vault_root = os.getcwd()
-
-    for rel_path in relevant_files:
-        full_path = os.path.join(vault_root, rel_path)
-        content = read_file_content(full_path)
-        
-        if not content:
-            print(f"Warning: Could not read {rel_path}. Skipping.")
-            continue
-
-        processed = extract_metadata_and_first_section(content)
-        
-        consolidated_content.append(f"\n\n--- Start RAG content from {rel_path} ---")
-        consolidated_content.append(processed)
-        consolidated_content.append(f"\n--- End RAG content from {rel_path} ---")
-
-    final_output = "".join(consolidated_content)
+    final_output = consolidate_rag_files(relevant_files, os.getcwd())
 
     if output_path:
         try:
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import argparse
+
+# Add utils to sys.path for standalone execution
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "utils")))
+from llm_stub import StubResponder, load_stub_settings, start_stub_server
+
+# Runs the deterministic stub LLM (utils/llm_stub.py) as a local HTTP server, so any number of
+# CLI processes can share it:
+#   python 0_Config/scripts/llm_stub_server.py --port 8765 --latency 1.5 --fail-rate 0.3
+#   GEMINI_LLM_BACKEND=stub GEMINI_STUB_URL=http://127.0.0.1:8765 python 0_Config/main_cli.py synthesis init --source ...
+
+def add_stub_arguments(parser):
+    """The stub's behaviour knobs, shared with bench_synthesis.py. Defaults come from GEMINI_STUB_*."""
+    defaults = load_stub_settings()
+    parser.add_argument("--seed", type=int, default=defaults["seed"], help="RNG seed; the same seed and inputs give the same run.")
+    parser.add_argument("--latency", type=float, default=defaults["latency"], help="Base latency per call in seconds.")
+    parser.add_argument("--jitter", type=float, default=defaults["jitter"], help="Extra uniform random latency in seconds.")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults["rate_limit_rate"], help="Fraction of calls answered with 429.")
+    parser.add_argument("--error-rate", type=float, default=defaults["error_rate"], help="Fraction of calls that fail (HTTP 500).")
+    parser.add_argument("--fail-rate", type=float, default=defaults["fail_rate"], help="Fraction of critiques with VERDICT: FAIL.")
+    parser.add_argument("--broken-plan-rate", type=float, default=defaults["broken_plan_rate"], help="Fraction of integration plans that are invalid JSON.")
+
+def stub_settings_from_args(args) -> dict:
+    return {name: getattr(args, name) for name in load_stub_settings()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the deterministic stub LLM over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    responder = StubResponder(stub_settings_from_args(args))
+    server, url = start_stub_server(args.host, args.port, responder)
+    print(f"Stub LLM listening on {url}")
+    print(f"Use it with: GEMINI_LLM_BACKEND=stub GEMINI_STUB_URL={url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n{responder.format_stats()}")
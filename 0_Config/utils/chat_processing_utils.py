@@ -3,6 +3,7 @@ import datetime
 import re
 import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .file_utils import read_file_content # Ensure this is the correct import
 
 def _format_preferences_prompt(preferences: str) -> str:
@@ -21,30 +22,38 @@ If a natural and relevant connection to these preferences arises directly from t
 ---
 """
 
-def _construct_synthesis_prompt(perspective_name: str, input_content: str, preferences: str, rag_context: str) -> str:
-    template_map = {
-        "World View": "Templates/World_View_Meta_Prompt.md",
-        "Human Realm": "Templates/Human_Realm_Meta_Prompt.md",
-        "Value Challenge": "Templates/Value_Challenge_Meta_Prompt.md",
-        "Implementation Plan": "Templates/Implementation_Plan_Meta_Prompt.md",
-    }
-    
-    template_path = template_map.get(perspective_name)
-    if not template_path:
+# Perspective -> (meta-prompt template, focus shown in progress messages), in overview order
+PERSPECTIVES = {
+    "World View": ("Templates/World_View_Meta_Prompt.md", "Deltas"),
+    "Human Realm": ("Templates/Human_Realm_Meta_Prompt.md", "Needs"),
+    "Value Challenge": ("Templates/Value_Challenge_Meta_Prompt.md", "Alignment"),
+    "Implementation Plan": ("Templates/Implementation_Plan_Meta_Prompt.md", "Actions"),
+}
+
+def _load_perspective_templates() -> dict:
+    """Reads every perspective template once. Maps perspective name -> template content (or None if unreadable)."""
+    return {name: read_file_content(template_path) for name, (template_path, _) in PERSPECTIVES.items()}
+
+def _construct_synthesis_prompt(perspective_name: str, input_content: str, preferences_prompt: str, rag_context: str, templates: dict) -> str:
+    """preferences_prompt is the already formatted section from _format_preferences_prompt; templates come from _load_perspective_templates."""
+    if perspective_name not in PERSPECTIVES:
         return f"Error: No template found for perspective '{perspective_name}'."
 
-    template_content = read_file_content(template_path) # Using the existing read_file_content
+    template_content = templates.get(perspective_name)
     if not template_content:
-        return f"Error: Could not read template file {template_path} for perspective '{perspective_name}'."
+        return f"Error: Could not read template file {PERSPECTIVES[perspective_name][0]} for perspective '{perspective_name}'."
 
-    # Integrate preferences prompt formatting
-    full_prompt = _format_preferences_prompt(preferences)
-    
     # Inject RAG context and input content into the template
-    full_prompt += template_content.replace("<RAG_CONTEXT_PLACEHOLDER>", rag_context).replace("<INPUT_CONTENT_PLACEHOLDER>", input_content)
-    
-    return full_prompt
-from .file_utils import read_file_content
+    return preferences_prompt + template_content.replace("<RAG_CONTEXT_PLACEHOLDER>", rag_context).replace("<INPUT_CONTENT_PLACEHOLDER>", input_content)
+
+def _synthesize_perspective(perspective_name: str, prompt: str, topic_slug: str, api_key: str = None) -> str:
+    """Runs one perspective and saves its note. Returns the note path, or None."""
+    output = llm_call(prompt, api_key=api_key)
+    if output.startswith("Error:"):
+        print(f"  {perspective_name} failed: {output}")
+        return None
+    return save_synthesis_note(topic_slug, perspective_name, output)
+
 from .llm_sim import llm_call
 from .config_parsers import load_user_preferences, parse_project_context
 from .moc_management import update_gemini_index_moc, update_preference_index_moc
@@ -290,49 +299,36 @@ def process_chat_file(file_path: str, api_key: str = None):
 
     synthesis_notes_paths = {}
 
-    # 1. World View
-    print("  Synthesizing World View (Deltas)...")
-    world_view_prompt = _construct_synthesis_prompt("World View", content, preferences_for_llm, rag_context_content)
-    if world_view_prompt.startswith("Error:"):
-        print(world_view_prompt)
-    else:
-        world_view_output = llm_call(world_view_prompt, api_key=api_key)
-        if not world_view_output.startswith("Error:"):
-            path = save_synthesis_note(topic_slug, "World View", world_view_output)
-            if path: synthesis_notes_paths["World View"] = path
-
-    # 2. Human Realm
-    print("  Synthesizing Human Realm (Needs)...")
-    human_realm_prompt = _construct_synthesis_prompt("Human Realm", content, preferences_for_llm, rag_context_content)
-    if human_realm_prompt.startswith("Error:"):
-        print(human_realm_prompt)
-    else:
-        human_realm_output = llm_call(human_realm_prompt, api_key=api_key)
-        if not human_realm_output.startswith("Error:"):
-            path = save_synthesis_note(topic_slug, "Human Realm", human_realm_output)
-            if path: synthesis_notes_paths["Human Realm"] = path
-
-    # 3. Value Challenge
-    print("  Synthesizing Value Challenge (Alignment)...")
-    value_challenge_prompt = _construct_synthesis_prompt("Value Challenge", content, preferences_for_llm, rag_context_content)
-    if value_challenge_prompt.startswith("Error:"):
-        print(value_challenge_prompt)
-    else:
-        value_challenge_output = llm_call(value_challenge_prompt, api_key=api_key)
-        if not value_challenge_output.startswith("Error:"):
-            path = save_synthesis_note(topic_slug, "Value Challenge", value_challenge_output)
-            if path: synthesis_notes_paths["Value Challenge"] = path
-
-    # 4. Implementation Plan
-    print("  Synthesizing Implementation Plan (Actions)...")
-    implementation_plan_prompt = _construct_synthesis_prompt("Implementation Plan", content, preferences_for_llm, rag_context_content)
-    if implementation_plan_prompt.startswith("Error:"):
-        print(implementation_plan_prompt)
-    else:
-        implementation_plan_output = llm_call(implementation_plan_prompt, api_key=api_key)
-        if not implementation_plan_output.startswith("Error:"):
-            path = save_synthesis_note(topic_slug, "Implementation Plan", implementation_plan_output)
-            if path: synthesis_notes_paths["Implementation Plan"] = path
+    # Templates and the preferences section are shared by all perspectives
+    templates = _load_perspective_templates()
+    preferences_prompt = _format_preferences_prompt(preferences_for_llm)
+
+    # 1-4. World View, Human Realm, Value Challenge and Implementation Plan run concurrently;
+    # llm_call's shared rate limiter paces the requests. Each note is saved as soon as it completes.
+    with ThreadPoolExecutor(max_workers=len(PERSPECTIVES)) as executor:
+        futures = {}
+        for perspective_name, (_, focus) in PERSPECTIVES.items():
+            prompt = _construct_synthesis_prompt(perspective_name, content, preferences_prompt, rag_context_content, templates)
+            if prompt.startswith("Error:"):
+                print(prompt)
+                continue
+            print(f"  Synthesizing {perspective_name} ({focus})...")
+            futures[executor.submit(_synthesize_perspective, perspective_name, prompt, topic_slug, api_key)] = perspective_name
+
+        completed = {}
+        for future in as_completed(futures):
+            try:
+                path = future.result()
+            except Exception as e:
+                print(f"  {futures[future]} failed: {e}")
+                continue
+            if path:
+                completed[futures[future]] = path
+
+    # Keep the overview in perspective order, whatever order the calls finished in
+    for perspective_name in PERSPECTIVES:
+        if perspective_name in completed:
+            synthesis_notes_paths[perspective_name] = completed[perspective_name]
 
     # 5. Create Overview Note
     if synthesis_notes_paths:
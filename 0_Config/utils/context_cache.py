@@ -0,0 +1,236 @@
+import os
+import time
+import sqlite3
+import hashlib
+import datetime
+import threading
+import collections
+
+try:
+    from .token_estimator import estimate_tokens
+except ImportError:
+    # Standalone execution
+    from token_estimator import estimate_tokens
+
+# Stable prompt prefixes and provider-side context caching.
+# Prompt builders put the shared, byte-identical system prefix (the mandates) first and end it with
+# PREFIX_DELIMITER; everything after it varies per call. The LLM layer splits on the delimiter, asks
+# the provider to cache the prefix once (Gemini CachedContent) and sends only the variable part.
+# Every call's static vs. variable token counts are recorded, so the savings can be measured.
+
+PREFIX_DELIMITER = "\n\n<!-- END OF SHARED INSTRUCTIONS -->\n\n"
+
+CONTEXT_CACHE_ENV = "GEMINI_CONTEXT_CACHE" # on | off
+DEFAULT_CACHE_TTL_SECONDS = 3600
+DEFAULT_MIN_CACHE_TOKENS = 1024 # Providers refuse to cache smaller prefixes
+MAX_CALL_LOG = 1000
+REGISTRY_FILENAME = "context_caches.sqlite"
+EXPIRY_HEADROOM_SECONDS = 60 # Never hand out an entry this close to its expiry
+CREATE_RETRY_SECONDS = 60 # After a transient create failure, send full prompts this long before retrying
+
+# What GenerativeModel.from_cached_content needs; the same whether created here or found in the registry
+CachedPrefix = collections.namedtuple("CachedPrefix", ["name", "model"])
+
+stats_lock = threading.Lock()
+prefix_stats = {"calls": 0, "static_tokens": 0, "variable_tokens": 0, "cached_tokens": 0}
+call_log = [] # per-call {"prefix", "static_tokens", "variable_tokens", "cached_tokens"}
+
+def join_stable_prefix(prefix: str, body: str) -> str:
+    return f"{prefix}{PREFIX_DELIMITER}{body}"
+
+def split_stable_prefix(prompt: str) -> (str, str):
+    """Returns (prefix, body); prefix is empty when the prompt has no stable prefix."""
+    prefix, delimiter, body = prompt.partition(PREFIX_DELIMITER)
+    if not delimiter:
+        return "", prompt
+    return prefix, body
+
+def prefix_hash(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:12]
+
+def measure_prompt(prompt: str) -> (int, int):
+    """(static tokens, variable tokens) of a prompt, by the offline estimate."""
+    prefix, body = split_stable_prefix(prompt)
+    return estimate_tokens(prefix), estimate_tokens(body)
+
+def record_prompt(prompt: str, cached_tokens: int = 0) -> dict:
+    """Records one sent prompt's static/variable split and how much of it the provider served from cache."""
+    prefix, _ = split_stable_prefix(prompt)
+    static_tokens, variable_tokens = measure_prompt(prompt)
+    entry = {
+        "prefix": prefix_hash(prefix) if prefix else None,
+        "static_tokens": static_tokens,
+        "variable_tokens": variable_tokens,
+        "cached_tokens": cached_tokens,
+    }
+    with stats_lock:
+        prefix_stats["calls"] += 1
+        prefix_stats["static_tokens"] += static_tokens
+        prefix_stats["variable_tokens"] += variable_tokens
+        prefix_stats["cached_tokens"] += cached_tokens
+        call_log.append(entry)
+        del call_log[:-MAX_CALL_LOG]
+    return entry
+
+def get_prefix_stats() -> dict:
+    with stats_lock:
+        return dict(prefix_stats, per_call=list(call_log))
+
+def format_prefix_stats() -> str:
+    """Summary of this process's prompts, or an empty string if none were sent."""
+    stats = get_prefix_stats()
+    if not stats["calls"]:
+        return ""
+    total = stats["static_tokens"] + stats["variable_tokens"]
+    share = 100.0 * stats["static_tokens"] / total if total else 0.0
+    return (f"Prompt Prefix: {stats['calls']} calls, {stats['static_tokens']} static + {stats['variable_tokens']} variable tokens "
+            f"({share:.0f}% static), {stats['cached_tokens']} served from the provider context cache.")
+
+def read_cached_tokens(response) -> int:
+    """Prompt tokens the provider served from its context cache (explicit or implicit), 0 if not reported."""
+    usage = getattr(response, 'usage_metadata', None)
+    return int(getattr(usage, 'cached_content_token_count', 0) or 0) if usage else 0
+
+def is_context_cache_enabled() -> bool:
+    return os.environ.get(CONTEXT_CACHE_ENV, "on").lower() != "off"
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def _is_capability_error(error: Exception) -> bool:
+    """True for errors saying the model cannot cache this prefix (not for 429s or network errors)."""
+    if getattr(error, 'code', None) in (400, 404, 501):
+        return True
+    return type(error).__name__ in ("InvalidArgument", "NotFound", "FailedPrecondition", "MethodNotImplemented")
+
+class GeminiContextCache:
+    """
+    Registry of Gemini CachedContent entries, one per (API key, model, prefix). Entry names are
+    kept in a small SQLite file in GEMINI_TEMP_DIR as well, so later CLI processes reuse an entry
+    until its TTL runs out instead of creating (and paying for) a new one.
+    A model that rejects caching is remembered for the process, and its requests go out uncached
+    (the provider may still apply implicit caching). Entries are created outside the registry
+    lock; only requests for the same entry wait for its creation.
+    """
+    def __init__(self, ttl_seconds: int = None, min_tokens: int = None, path: str = None):
+        self.ttl_seconds = ttl_seconds or _get_int_env("GEMINI_CONTEXT_CACHE_TTL", DEFAULT_CACHE_TTL_SECONDS)
+        self.min_tokens = min_tokens or _get_int_env("GEMINI_CONTEXT_CACHE_MIN_TOKENS", DEFAULT_MIN_CACHE_TOKENS)
+        self.path = path or os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), REGISTRY_FILENAME)
+        self.entries = {} # (key hash, model, prefix hash) -> (CachedPrefix, expires at)
+        self.unsupported = set()
+        self.retry_at = {} # (key hash, model, prefix hash) -> time after a transient create failure
+        self._entry_locks = {}
+        self._lock = threading.Lock()
+
+    def _cache_key(self, prefix: str, model_name: str, api_key: str = None) -> tuple:
+        key_hash = hashlib.sha256((api_key or "").encode('utf-8')).hexdigest()[:12]
+        return key_hash, model_name, prefix_hash(prefix)
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (cache_key TEXT PRIMARY KEY, name TEXT, model TEXT, expires REAL)")
+        return conn
+
+    def _load(self, cache_key: tuple):
+        """(CachedPrefix, expires at) recorded by any process, or None."""
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT name, model, expires FROM entries WHERE cache_key = ?", (":".join(cache_key),)).fetchone()
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError):
+            return None
+        return (CachedPrefix(row[0], row[1]), row[2]) if row else None
+
+    def _save(self, cache_key: tuple, entry) -> None:
+        try:
+            conn = self._connect()
+            try:
+                if entry:
+                    conn.execute("INSERT OR REPLACE INTO entries (cache_key, name, model, expires) VALUES (?, ?, ?, ?)",
+                                 (":".join(cache_key), entry[0].name, entry[0].model, entry[1]))
+                else:
+                    conn.execute("DELETE FROM entries WHERE cache_key = ?", (":".join(cache_key),))
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Warning: Failed to update the context cache registry: {e}")
+
+    @staticmethod
+    def _is_live(entry) -> bool:
+        return bool(entry) and entry[1] - EXPIRY_HEADROOM_SECONDS > time.time()
+
+    def get(self, prefix: str, model_name: str, api_key: str = None, cache_client=None):
+        """
+        Returns a CachedPrefix (name, model) holding prefix, or None when caching is off, too small or unavailable.
+        cache_client is the API key's CacheServiceClient; the entry is created with it, not the SDK's global client.
+        """
+        if not is_context_cache_enabled() or cache_client is None or model_name in self.unsupported or estimate_tokens(prefix) < self.min_tokens:
+            return None
+        cache_key = self._cache_key(prefix, model_name, api_key)
+        with self._lock:
+            entry = self.entries.get(cache_key)
+            if self._is_live(entry):
+                return entry[0]
+            if self.retry_at.get(cache_key, 0) > time.time():
+                return None
+            entry_lock = self._entry_locks.setdefault(cache_key, threading.Lock())
+
+        with entry_lock:
+            # Created meanwhile by another thread, or by an earlier process
+            with self._lock:
+                entry = self.entries.get(cache_key)
+            if not self._is_live(entry):
+                entry = self._load(cache_key)
+            if self._is_live(entry):
+                with self._lock:
+                    self.entries[cache_key] = entry
+                return entry[0]
+            if model_name in self.unsupported:
+                return None
+
+            try:
+                from google.ai import generativelanguage_v1beta as glm
+                cached = cache_client.create_cached_content(request=glm.CreateCachedContentRequest(
+                    cached_content=glm.CachedContent(
+                        model=model_name,
+                        display_name=f"pkm-prefix-{cache_key[2]}",
+                        system_instruction=glm.Content(parts=[glm.Part(text=prefix)]),
+                        ttl=datetime.timedelta(seconds=self.ttl_seconds),
+                    )))
+            except Exception as e:
+                with self._lock:
+                    if _is_capability_error(e):
+                        print(f"[Status] Context caching unavailable for {model_name} ({e}). Sending full prompts.")
+                        self.unsupported.add(model_name)
+                    else:
+                        print(f"[Status] Could not create a context cache for {model_name} ({e}). Sending full prompts for {CREATE_RETRY_SECONDS}s.")
+                        self.retry_at[cache_key] = time.time() + CREATE_RETRY_SECONDS
+                return None
+
+            entry = (CachedPrefix(cached.name, cached.model), time.time() + self.ttl_seconds)
+            with self._lock:
+                self.entries[cache_key] = entry
+            self._save(cache_key, entry)
+            return entry[0]
+
+    def invalidate(self, prefix: str, model_name: str, api_key: str = None) -> None:
+        cache_key = self._cache_key(prefix, model_name, api_key)
+        with self._lock:
+            self.entries.pop(cache_key, None)
+        self._save(cache_key, None)
+
+context_cache = None
+context_cache_lock = threading.Lock()
+
+def get_context_cache() -> GeminiContextCache:
+    global context_cache
+    with context_cache_lock:
+        if context_cache is None:
+            context_cache = GeminiContextCache()
+        return context_cache
@@ -0,0 +1,267 @@
+import os
+import re
+import math
+import threading
+from collections import Counter
+
+# Local keyword extraction for RAG retrieval, a fast alternative to the Sub-Agent round trip.
+# Candidate phrases come from RAKE (runs of content words between stopwords and punctuation), tags,
+# wikilinks and the note title. Each is weighted by its inverse document frequency over the entries
+# of GEMINI_INDEX, so words every note shares rank low, and boosted by tag dimension (#value/, #need/...).
+# CJK runs are segmented against the vault's own CJK vocabulary, with character bigrams as fallback.
+# GEMINI_KEYWORDS_ENGINE (set by --keywords-engine) picks local, agent or hybrid extraction.
+
+KEYWORDS_ENGINE_ENV = "GEMINI_KEYWORDS_ENGINE"
+KEYWORDS_ENGINES = ["agent", "local", "hybrid"]
+MIN_CONFIDENCE_ENV = "GEMINI_KEYWORDS_MIN_CONFIDENCE" # Below this, hybrid mode asks the agent
+DEFAULT_MIN_CONFIDENCE = 0.5
+
+DEFAULT_INDEX_PATH = "0_Config/Context/GEMINI_INDEX.md"
+MAX_KEYWORDS = 8
+MAX_PHRASE_WORDS = 3
+MIN_KEYWORDS_FOR_CONFIDENCE = 3
+
+# Tag dimension (see the tagging mandate in prompts/mandates.py) -> score multiplier
+TAG_BOOSTS = {"value": 2.0, "need": 2.0, "preference": 1.5, "action": 1.2, "log": 1.0}
+DEFAULT_TAG_BOOST = 1.2
+LINK_BOOST = 1.5 # Wikilinked concepts (and CJK terms found in the index) already exist in the vault
+TITLE_BOOST = 1.5
+
+STOPWORDS = set("""
+a about above after again against all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each even few for from further get got had has have having he her here hers herself
+him himself his how i if in into is it its itself just let like made make many may me might more most much must my myself
+no nor not now of off on once one only or other our ours ourselves out over own really same says see she should so some
+still such than that the their theirs them themselves then there these they thing things this those through to too under
+until up upon us use used using very via was way we well were what when where which while who whom why will with within
+without would yet you your yours yourself yourselves
+""".split())
+# Common verbs and fillers, so RAKE phrases stay noun-like
+STOPWORDS |= set("""
+add adds allow allows ask asked become becomes begin believe believes bring build call came change come comes consider
+continue create creates describe describes feel feels find finds give gives go goes going help helps hold keep keeps know
+knows lead leads look looks mean means meant need needs seem seems show shows start stay stays take takes tell tend think
+thinks try tries turn turns want wants work works reduce reduces increase increases matter matters remain remains
+always never often sometimes usually maybe perhaps rather quite already actually basically especially instead
+""".split())
+# Synthesis template vocabulary, present in every draft
+STOPWORDS |= {"stream", "insights", "insight", "user-validated", "unaffirmed", "llm", "literature", "information",
+              "preliminary", "synthesis", "key", "facts", "beliefs", "personal", "observations", "logic", "core",
+              "motivation", "vibe", "unconfirmed", "external", "context", "provided", "none", "narrative",
+              "structured", "extraction", "references", "user", "note", "notes"}
+
+CJK_CHARS = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+CJK_RUN_PATTERN = re.compile(f"[{CJK_CHARS}]+")
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9'\-]*[A-Za-z0-9]|[A-Za-z]")
+TOKEN_PATTERN = re.compile(rf"[A-Za-z][A-Za-z0-9'\-]*[A-Za-z0-9]|[A-Za-z]|[{CJK_CHARS}]+|[.,;:!?()\[\]{{}}\"“”。，、；：！？（）【】「」]")
+TAG_PATTERN = re.compile(r"(?<![\w&])#([A-Za-z][\w\-]*(?:/[\w\-]+)*)")
+WIKILINK_PATTERN = re.compile(r"\[\[([^\]|#]+)(?:#[^\]|]*)?(?:\|[^\]]*)?\]\]")
+FRONTMATTER_PATTERN = re.compile(r"^---\s*\n(.*?)\n---\s*\n", re.DOTALL)
+YAML_TAGS_PATTERN = re.compile(r"^tags:\s*\[?(.*?)\]?\s*$", re.MULTILINE)
+
+index_lock = threading.Lock()
+index_stats_cache = {} # index path -> (mtime, stats)
+
+def get_keywords_engine() -> str:
+    engine = os.environ.get(KEYWORDS_ENGINE_ENV, "agent").lower()
+    return engine if engine in KEYWORDS_ENGINES else "agent"
+
+def set_keywords_engine(engine: str) -> None:
+    """Sets the engine for this process and every subprocess it spawns."""
+    os.environ[KEYWORDS_ENGINE_ENV] = engine
+
+def get_min_confidence() -> float:
+    try:
+        return float(os.environ.get(MIN_CONFIDENCE_ENV, DEFAULT_MIN_CONFIDENCE))
+    except ValueError:
+        return DEFAULT_MIN_CONFIDENCE
+
+def _segment_cjk(run: str, vocabulary: set, max_length: int) -> list:
+    """Forward maximum matching against the vault's CJK terms; unknown stretches become character bigrams."""
+    segments, unknown, i = [], "", 0
+    while i < len(run):
+        match = next((run[i:i + n] for n in range(min(max_length, len(run) - i), 1, -1) if run[i:i + n] in vocabulary), None)
+        if match:
+            if unknown:
+                segments.extend(_bigrams(unknown))
+                unknown = ""
+            segments.append(match)
+            i += len(match)
+        else:
+            unknown += run[i]
+            i += 1
+    if unknown:
+        segments.extend(_bigrams(unknown))
+    return segments
+
+def _bigrams(run: str) -> list:
+    return [run] if len(run) <= 2 else [run[i:i + 2] for i in range(len(run) - 1)]
+
+def _index_terms(text: str, vocabulary: set, max_length: int) -> set:
+    terms = {w.lower() for w in WORD_PATTERN.findall(text) if w.lower() not in STOPWORDS}
+    for run in CJK_RUN_PATTERN.findall(text):
+        terms.update(_segment_cjk(run, vocabulary, max_length))
+    return terms
+
+def load_index_stats(index_path: str = DEFAULT_INDEX_PATH) -> dict:
+    """
+    Document frequencies over the index entries (one per wikilinked line: note path, tags, aliases, summary).
+    Returns {"documents": N, "df": Counter, "cjk_vocabulary": set, "cjk_max": int}; cached until the index changes.
+    """
+    try:
+        mtime = os.path.getmtime(index_path)
+    except OSError:
+        return {"documents": 0, "df": Counter(), "cjk_vocabulary": set(), "cjk_max": 0}
+    with index_lock:
+        cached = index_stats_cache.get(index_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            entries = [line for line in f.read().splitlines() if "[[" in line]
+    except OSError:
+        entries = []
+
+    # CJK vocabulary: whole CJK runs of note names, tags and aliases (short enough to be terms)
+    vocabulary = {run for line in entries for run in CJK_RUN_PATTERN.findall(line) if 2 <= len(run) <= 8}
+    max_length = max((len(term) for term in vocabulary), default=0)
+    df = Counter()
+    for line in entries:
+        df.update(_index_terms(line.replace("_", " ").replace("/", " "), vocabulary, max_length))
+
+    stats = {"documents": len(entries), "df": df, "cjk_vocabulary": vocabulary, "cjk_max": max_length}
+    with index_lock:
+        index_stats_cache[index_path] = (mtime, stats)
+    return stats
+
+def _idf(term: str, stats: dict) -> float:
+    """Rare index terms weigh most; terms the index lacks stay neutral, since they cannot retrieve anything."""
+    df = stats["df"].get(term, 0)
+    if not df:
+        return 1.0
+    return math.log((stats["documents"] + 1) / (df + 1)) + 1.0
+
+def _is_identifier(token: str) -> bool:
+    """Hashes and IDs (a07d4c, 20240101abc) rather than words."""
+    return sum(c.isdigit() for c in token) * 3 >= len(token)
+
+def _rake_phrases(text: str, stats: dict) -> list:
+    """Candidate phrases: runs of up to MAX_PHRASE_WORDS content words, split at stopwords and punctuation."""
+    phrases, current = [], []
+    for token in TOKEN_PATTERN.findall(text):
+        if CJK_RUN_PATTERN.fullmatch(token):
+            if current:
+                phrases.append(current)
+                current = []
+            phrases.extend([segment] for segment in _segment_cjk(token, stats["cjk_vocabulary"], stats["cjk_max"]))
+        elif WORD_PATTERN.fullmatch(token) and token.lower() not in STOPWORDS and len(token) > 2 and not _is_identifier(token):
+            current.append(token)
+            if len(current) == MAX_PHRASE_WORDS:
+                phrases.append(current)
+                current = []
+        elif current:
+            phrases.append(current)
+            current = []
+    if current:
+        phrases.append(current)
+    return phrases
+
+def _prepare_text(content: str) -> (str, list, list, str):
+    """Splits a note into (body text, tags, wikilink targets, title) with Markdown noise removed."""
+    tags, title = [], ""
+    frontmatter = FRONTMATTER_PATTERN.match(content)
+    if frontmatter:
+        yaml_tags = YAML_TAGS_PATTERN.search(frontmatter.group(1))
+        if yaml_tags:
+            tags.extend(t.strip().strip("'\"#") for t in yaml_tags.group(1).split(",") if t.strip())
+        content = content[frontmatter.end():]
+
+    content = re.sub(r"```.*?```", " ", content, flags=re.DOTALL)
+    content = re.sub(r"https?://\S+", " ", content)
+    tags.extend(TAG_PATTERN.findall(content))
+    links = [link.split("/")[-1].strip() for link in WIKILINK_PATTERN.findall(content)]
+
+    lines = []
+    for line in content.splitlines():
+        heading = re.match(r"^(#{1,6})\s+(.*)", line)
+        if heading:
+            # Section headings are template structure; the first level-1 heading is the title
+            if len(heading.group(1)) == 1 and not title:
+                title = heading.group(2).strip()
+            continue
+        lines.append(line)
+    body = TAG_PATTERN.sub(" . ", "\n".join(lines))
+    body = WIKILINK_PATTERN.sub(lambda m: f" . {m.group(1).split('/')[-1]} . ", body)
+    return body, tags, links, title
+
+def _tag_candidate(tag: str) -> (str, float):
+    """'value/low-latency' -> ('low latency', boost of the value dimension)."""
+    parts = tag.split("/")
+    dimension = parts[0].lower()
+    if len(parts) == 1:
+        return parts[0].replace("-", " ").replace("_", " "), DEFAULT_TAG_BOOST
+    if dimension.startswith("type") or dimension.startswith("source") or dimension.startswith("status"):
+        return "", 0.0 # Bookkeeping tags, not topics
+    return parts[-1].replace("-", " ").replace("_", " "), TAG_BOOSTS.get(dimension, DEFAULT_TAG_BOOST)
+
+def extract_keywords_local(content: str, index_path: str = DEFAULT_INDEX_PATH, max_keywords: int = MAX_KEYWORDS) -> (list, float):
+    """
+    Ranks candidate keywords for content. Returns (keywords, confidence): confidence is the share of
+    the keywords that appear in the vault index (and so can retrieve RAG context), 0 if too few were found.
+    """
+    stats = load_index_stats(index_path)
+    body, tags, links, title = _prepare_text(content)
+
+    # RAKE word scores: degree / frequency over the candidate phrases
+    phrases = _rake_phrases(body, stats)
+    frequency, degree = Counter(), Counter()
+    for phrase in phrases:
+        for word in phrase:
+            frequency[word.lower()] += 1
+            degree[word.lower()] += len(phrase)
+
+    scores, display = Counter(), {}
+    def add(words: list, boost: float, base: float = None):
+        key = " ".join(w.lower() for w in words)
+        if not key or key in STOPWORDS:
+            return
+        if base is None:
+            base = sum(degree[w.lower()] / frequency[w.lower()] if frequency[w.lower()] else 1.0 for w in words)
+        idf = sum(_idf(w.lower(), stats) for w in words) / len(words)
+        scores[key] += base * idf * boost
+        display.setdefault(key, " ".join(words))
+
+    cjk_counts = Counter(phrase[0] for phrase in phrases if CJK_RUN_PATTERN.fullmatch(phrase[0]))
+    for phrase in phrases:
+        if phrase[0] in cjk_counts:
+            # Known vault terms count like links; unknown bigrams only when they repeat
+            if phrase[0] in stats["cjk_vocabulary"]:
+                add(phrase, LINK_BOOST, base=2.0)
+            elif cjk_counts[phrase[0]] > 1:
+                add(phrase, 1.0)
+        else:
+            add(phrase, 1.0)
+    for tag in tags:
+        text, boost = _tag_candidate(tag)
+        if text:
+            add(text.split(), boost, base=2.0)
+    for link in links:
+        add(link.replace("_", " ").split(), LINK_BOOST, base=2.0)
+    if title:
+        for phrase in _rake_phrases(title, stats):
+            add(phrase, TITLE_BOOST)
+
+    keywords = []
+    for key, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+        # Skip phrases already covered by a higher-ranked one
+        if any(key in chosen.lower() or chosen.lower() in key for chosen in keywords):
+            continue
+        keywords.append(display[key])
+        if len(keywords) == max_keywords:
+            break
+
+    if len(keywords) < MIN_KEYWORDS_FOR_CONFIDENCE or not stats["documents"]:
+        return keywords, 0.0
+    known = sum(1 for keyword in keywords if all(stats["df"].get(w, 0) for w in _index_terms(keyword, stats["cjk_vocabulary"], stats["cjk_max"])))
+    return keywords, known / len(keywords)
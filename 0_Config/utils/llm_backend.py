@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import asyncio
+import threading
+import urllib.error
+import urllib.request
+from abc import ABC, abstractmethod
+
+try:
+    from .rate_limiter import get_shared_limiter, RPM_LIMIT, TPM_LIMIT
+    from .llm_scheduler import get_api_keys
+    from .llm_stub import StubResponder, StubRateLimitError, StubError
+except ImportError:
+    # Standalone execution
+    from rate_limiter import get_shared_limiter, RPM_LIMIT, TPM_LIMIT
+    from llm_scheduler import get_api_keys
+    from llm_stub import StubResponder, StubRateLimitError, StubError
+
+# Pluggable LLM backends behind llm_call (generate) and call_sub_agent (sub_agent).
+# GEMINI_LLM_BACKEND selects one per process: "gemini" (default) talks to the Gemini API and the
+# gemini_subagent submodule; "stub" answers from the deterministic local stand-in in llm_stub.py,
+# in-process or via the HTTP server at GEMINI_STUB_URL (scripts/llm_stub_server.py), so whole
+# synthesis runs can be exercised and benchmarked offline.
+
+BACKEND_ENV = "GEMINI_LLM_BACKEND"
+STUB_URL_ENV = "GEMINI_STUB_URL"
+
+class LLMBackend(ABC):
+    """
+    generate: async (prompt, model_name, api_key) -> (text, prompt_tokens, output_tokens, cached_tokens),
+    raising on errors (RateLimitError-like errors for 429s).
+    sub_agent: (prompt, input_files) -> response text, or None on failure.
+    A backend missing either cannot be instantiated.
+    """
+    name = "base"
+    requires_api_key = False
+
+    @abstractmethod
+    async def generate(self, prompt: str, model_name: str, api_key: str = None):
+        ...
+
+    @abstractmethod
+    def sub_agent(self, prompt: str, input_files: dict = None):
+        ...
+
+    def qualify(self, model_name: str) -> str:
+        """Model name for cache keys and limiter names, so a backend never shares another's entries."""
+        return model_name
+
+    def client_limits(self) -> (int, int):
+        """(RPM, TPM) for requests that are not routed through per-key endpoints."""
+        return RPM_LIMIT, TPM_LIMIT
+
+    def sub_agent_limiter(self, model_name: str):
+        return get_shared_limiter(self.qualify(model_name))
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+    requires_api_key = True
+
+    def __init__(self):
+        self._sub_agent = None
+
+    async def generate(self, prompt, model_name, api_key=None):
+        try:
+            from .llm_client import gemini_transport
+        except ImportError:
+            from llm_client import gemini_transport
+        return await gemini_transport(prompt, model_name, api_key)
+
+    def _load_sub_agent(self):
+        # Bridge to the gemini_subagent submodule at the vault root
+        project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if project_root not in sys.path:
+            sys.path.insert(0, project_root)
+        try:
+            from gemini_subagent.sub_agent import call_sub_agent
+        except ImportError:
+            # Fallback for different execution contexts
+            sys.path.append(os.path.join(project_root, "gemini_subagent"))
+            try:
+                from sub_agent import call_sub_agent
+            except ImportError:
+                def call_sub_agent(prompt, input_files=None):
+                    print("Error: gemini_subagent module not found.")
+                    return None
+        return call_sub_agent
+
+    def sub_agent(self, prompt, input_files=None):
+        if self._sub_agent is None:
+            self._sub_agent = self._load_sub_agent()
+        if input_files:
+            return self._sub_agent(prompt, input_files=input_files)
+        return self._sub_agent(prompt)
+
+class StubBackend(LLMBackend):
+    """The local stand-in; talks to the HTTP stub server when url is set, otherwise answers in-process."""
+    name = "stub"
+
+    def __init__(self, url: str = None, responder: StubResponder = None):
+        self.url = (url or "").rstrip("/") or None
+        self.responder = responder if responder or self.url else StubResponder()
+
+    def _post(self, path: str, payload: dict) -> dict:
+        request = urllib.request.Request(f"{self.url}{path}", data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise StubRateLimitError("429 RESOURCE_EXHAUSTED (stub)") from e
+            raise StubError(f"{e.code} (stub)") from e
+
+    def _respond(self, prompt: str, inputs: dict = None) -> dict:
+        if self.url:
+            return self._post("/generate" if inputs is None else "/sub_agent", {"prompt": prompt, "input_files": inputs})
+        return self.responder.respond(prompt, inputs)
+
+    async def generate(self, prompt, model_name, api_key=None):
+        try:
+            result = await asyncio.to_thread(self._respond, prompt)
+        except StubRateLimitError as e:
+            try:
+                from .llm_client import RateLimitError
+            except ImportError:
+                from llm_client import RateLimitError
+            raise RateLimitError(str(e)) from e
+        return result["text"], result["prompt_tokens"], result["output_tokens"], result["cached_tokens"]
+
+    def sub_agent(self, prompt, input_files=None):
+        inputs = {}
+        for alias, path in (input_files or {}).items():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    inputs[alias] = f.read()
+            except OSError:
+                inputs[alias] = ""
+        try:
+            return self._respond(prompt, inputs)["text"]
+        except (StubRateLimitError, StubError, OSError) as e:
+            # The real Sub-Agent reports failures by returning nothing
+            print(f"Error: Stub Sub-Agent call failed: {e}")
+            return None
+
+    def qualify(self, model_name):
+        return f"stub:{model_name}"
+
+    def client_limits(self):
+        try:
+            return int(os.environ.get("GEMINI_STUB_RPM", RPM_LIMIT)), int(os.environ.get("GEMINI_STUB_TPM", TPM_LIMIT))
+        except ValueError:
+            return RPM_LIMIT, TPM_LIMIT
+
+    def sub_agent_limiter(self, model_name):
+        rpm, tpm = self.client_limits()
+        return get_shared_limiter(self.qualify(model_name), rpm, tpm)
+
+BACKENDS = {"gemini": GeminiBackend, "stub": lambda: StubBackend(os.environ.get(STUB_URL_ENV))}
+
+backend = None
+backend_lock = threading.Lock()
+
+def get_backend() -> LLMBackend:
+    """The process-wide backend named by GEMINI_LLM_BACKEND."""
+    global backend
+    with backend_lock:
+        if backend is None:
+            name = os.environ.get(BACKEND_ENV, "gemini").lower()
+            if name not in BACKENDS:
+                print(f"Warning: Unknown {BACKEND_ENV} '{name}'. Using gemini.")
+                name = "gemini"
+            backend = BACKENDS[name]()
+        return backend
+
+def set_backend(new_backend: LLMBackend) -> None:
+    """Replaces the process-wide backend (and the LLM client built on it)."""
+    global backend
+    with backend_lock:
+        backend = new_backend
+    try:
+        from . import llm_client
+    except ImportError:
+        import llm_client
+    llm_client.reset_default_client()
+
+def has_llm_access(api_key: str = None) -> bool:
+    """True when llm_call can send requests: an API key is configured, or the backend needs none."""
+    return bool(api_key or get_api_keys()) or not get_backend().requires_api_key
@@ -0,0 +1,219 @@
+import os
+import random
+import asyncio
+import threading
+import concurrent.futures
+
+try:
+    from .token_estimator import estimate_prompt_tokens, record_actual_usage, read_usage_metadata
+    from .rate_limiter import RateLimiter
+    from .llm_scheduler import LLMScheduler, STANDARD_TIER
+    from .context_cache import split_stable_prefix, get_context_cache, read_cached_tokens, record_prompt
+    from .llm_backend import get_backend
+except ImportError:
+    # Standalone execution (e.g. scripts/bench_llm_client.py)
+    from token_estimator import estimate_prompt_tokens, record_actual_usage, read_usage_metadata
+    from rate_limiter import RateLimiter
+    from llm_scheduler import LLMScheduler, STANDARD_TIER
+    from context_cache import split_stable_prefix, get_context_cache, read_cached_tokens, record_prompt
+    from llm_backend import get_backend
+
+# Async LLM client on top of the RPM/TPM token buckets in rate_limiter.py, the key/model
+# routing in llm_scheduler.py and the backend selected in llm_backend.py.
+# Capacity is reserved under a short lock; the wait and the network call happen outside it,
+# so many requests can be in flight at once while the limits still hold.
+
+DEFAULT_MODEL_NAME = "models/gemini-2.5-flash"
+
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_CAP_SECONDS = 60.0
+
+class RateLimitError(Exception):
+    """Raised by transports for provider 429 / quota-exhausted responses."""
+
+def is_rate_limit_error(error: Exception) -> bool:
+    if isinstance(error, RateLimitError):
+        return True
+    if getattr(error, 'code', None) == 429 or getattr(error, 'status_code', None) == 429:
+        return True
+    return type(error).__name__ in ("ResourceExhausted", "TooManyRequests") or "429" in str(error)
+
+gemini_clients = {}
+gemini_clients_lock = threading.Lock()
+
+def get_gemini_clients(api_key: str = None):
+    """
+    (generative client, cache client) bound to one API key. genai.configure() sets a process-global
+    key, so concurrent requests on different keys could go out on the wrong one; each key gets its
+    own clients instead.
+    """
+    with gemini_clients_lock:
+        if api_key not in gemini_clients:
+            from google.ai import generativelanguage_v1beta as glm
+            client_options = {"api_key": api_key} if api_key else None
+            gemini_clients[api_key] = (glm.GenerativeServiceClient(client_options=client_options),
+                                       glm.CacheServiceClient(client_options=client_options))
+        return gemini_clients[api_key]
+
+async def gemini_transport(prompt: str, model_name: str, api_key: str = None) -> (str, int, int, int):
+    """
+    Sends one prompt via the google.generativeai SDK, with the clients of the given key.
+    A stable prompt prefix is served from a provider-side context cache when the model supports it;
+    only the variable part is sent with the request then.
+    Returns (text, prompt_tokens, output_tokens, cached_tokens); token counts are 0 when not reported.
+    """
+    import google.generativeai as genai
+
+    key = api_key or os.environ.get("GEMINI_API_KEY")
+    generative_client, cache_client = get_gemini_clients(key)
+    prefix, body = split_stable_prefix(prompt)
+    cached_content = get_context_cache().get(prefix, model_name, key, cache_client) if prefix else None
+    response = None
+    if cached_content is not None:
+        try:
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+            model._client = generative_client # The SDK would otherwise use its global client
+            response = await asyncio.to_thread(model.generate_content, body)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                raise
+            # e.g. the cache expired on the provider side; resend the full prompt
+            get_context_cache().invalidate(prefix, model_name, key)
+    if response is None:
+        model = genai.GenerativeModel(model_name)
+        model._client = generative_client
+        response = await asyncio.to_thread(model.generate_content, prompt)
+
+    # The API response structure can vary, check for common attributes
+    if hasattr(response, 'text'):
+        text = response.text.strip()
+    elif hasattr(response, 'parts') and response.parts:
+        text = "".join(part.text for part in response.parts if hasattr(part, 'text')).strip()
+    else:
+        raise ValueError(f"Unexpected API response format: {response}")
+
+    prompt_tokens, output_tokens = read_usage_metadata(response)
+    return text, prompt_tokens, output_tokens, read_cached_tokens(response)
+
+class AsyncLLMClient:
+    """
+    Rate-limited LLM client. `transport` is an async callable
+    (prompt, model_name, api_key) -> (text, prompt_tokens, output_tokens[, cached_tokens]),
+    by default the configured backend's generate.
+    With a scheduler, each request is routed across the configured keys/models for its tier;
+    otherwise every request uses `model_name` and the single `limiter`.
+    """
+    def __init__(self, transport=None, limiter: RateLimiter = None, model_name: str = DEFAULT_MODEL_NAME,
+                 max_retries: int = MAX_RETRIES, backoff_base: float = BACKOFF_BASE_SECONDS, backoff_cap: float = BACKOFF_CAP_SECONDS,
+                 scheduler: LLMScheduler = None):
+        self.transport = transport or get_backend().generate
+        self.limiter = limiter or RateLimiter()
+        self.model_name = model_name
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "queued": 0, "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0}
+
+    def _record_queue_wait(self, wait: float) -> None:
+        self.stats["queued"] += 1
+        self.stats["queue_wait_seconds"] += wait
+        self.stats["max_queue_wait_seconds"] = max(self.stats["max_queue_wait_seconds"], wait)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _reserve(self, prompt: str, tier: str, api_key: str):
+        """Returns (endpoint or None, model_name, api_key, limiter, estimated_tokens, wait_seconds)."""
+        if self.scheduler:
+            endpoint, estimated, wait = self.scheduler.reserve(prompt, tier, api_key)
+            if endpoint:
+                return endpoint, endpoint.model_name, endpoint.api_key, endpoint.limiter, estimated, wait
+        estimated = estimate_prompt_tokens(prompt, self.model_name)
+        return None, self.model_name, api_key, self.limiter, estimated, self.limiter.reserve(estimated)
+
+    async def generate(self, prompt: str, api_key: str = None, tier: str = STANDARD_TIER) -> str:
+        """Returns the response text, or an "Error ..." string like llm_call always has."""
+        for attempt in range(self.max_retries + 1):
+            endpoint, model_name, key, limiter, estimated_tokens, wait = self._reserve(prompt, tier, api_key)
+            if wait > 0:
+                self._record_queue_wait(wait)
+                print(f"[Status] Rate limiter: {model_name} queued for {wait:.1f}s.")
+                await asyncio.sleep(wait)
+
+            self.stats["requests"] += 1
+            try:
+                result = await self.transport(prompt, model_name, key)
+            except Exception as e:
+                # The request used none of the reserved capacity; retries reserve their own
+                limiter.refund(estimated_tokens)
+                if is_rate_limit_error(e) and attempt < self.max_retries:
+                    self.stats["rate_limited"] += 1
+                    delay = self._backoff_delay(attempt)
+                    if endpoint:
+                        # Other keys/models may still have capacity; only this endpoint waits
+                        self.scheduler.cool_down(endpoint, delay)
+                        print(f"[Status] Rate limited (429) on key {endpoint.label} / {model_name}. Cooling it down for {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})...")
+                    else:
+                        print(f"[Status] Rate limited (429). Retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})...")
+                        await asyncio.sleep(delay)
+                    continue
+                self.stats["errors"] += 1
+                return f"Error calling Gemini API: {e}"
+
+            text, prompt_tokens, output_tokens = result[:3]
+            record_prompt(prompt, result[3] if len(result) > 3 else 0)
+            if prompt_tokens:
+                record_actual_usage(model_name, prompt, prompt_tokens)
+            limiter.settle(estimated_tokens, (prompt_tokens or estimated_tokens) + output_tokens)
+            if endpoint:
+                self.scheduler.record_usage(endpoint, prompt_tokens or estimated_tokens, output_tokens, wait)
+            return text
+
+        return "Error calling Gemini API: retries exhausted."
+
+    def generate_sync(self, prompt: str, api_key: str = None, tier: str = STANDARD_TIER) -> str:
+        return run_sync(self.generate(prompt, api_key, tier))
+
+def run_sync(coroutine):
+    """Runs a coroutine to completion from synchronous code, even inside a running event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+default_client = None
+default_client_lock = threading.Lock()
+
+def get_default_client() -> AsyncLLMClient:
+    """Process-wide client shared by every llm_call so all threads draw from the same buckets."""
+    global default_client
+    with default_client_lock:
+        if default_client is None:
+            backend = get_backend()
+            if backend.requires_api_key:
+                default_client = AsyncLLMClient(transport=backend.generate, scheduler=LLMScheduler())
+            else:
+                # Keyless backends (the local stub) get one limiter and never touch the real keys' budgets
+                default_client = AsyncLLMClient(transport=backend.generate, limiter=RateLimiter(*backend.client_limits()))
+        return default_client
+
+def reset_default_client() -> None:
+    """Drops the shared client, e.g. after the backend changed; the next call builds a new one."""
+    global default_client
+    with default_client_lock:
+        default_client = None
+
+def format_client_stats() -> str:
+    """Summary of this process's LLM calls, or an empty string if none were made."""
+    if default_client is None or not default_client.stats["requests"]:
+        return ""
+    stats = default_client.stats
+    summary = (f"LLM Calls: {stats['requests']} sent, {stats['rate_limited']} rate limited (429), "
+               f"{stats['queued']} queued for {stats['queue_wait_seconds']:.1f}s total (max {stats['max_queue_wait_seconds']:.1f}s).")
+    key_usage = default_client.scheduler.format_usage() if default_client.scheduler else ""
+    return f"{summary}\n{key_usage}" if key_usage else summary
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+try:
+    from .token_estimator import estimate_prompt_tokens
+    from .rate_limiter import get_shared_limiter, RPM_LIMIT, TPM_LIMIT
+except ImportError:
+    # Standalone execution
+    from token_estimator import estimate_prompt_tokens
+    from rate_limiter import get_shared_limiter, RPM_LIMIT, TPM_LIMIT
+
+# Multi-key, multi-model request scheduler.
+# Every (API key, model) pair is an endpoint with its own RPM/TPM limiter and price. A request names
+# a tier ("standard" or "light"); it is routed to the tier endpoint that has capacity soonest,
+# so throughput grows with the number of configured keys.
+
+STANDARD_TIER = "standard"
+LIGHT_TIER = "light"
+
+# Limits per key and price in USD per 1M tokens (input, output). Override/extend with GEMINI_MODEL_PROFILES (JSON file).
+MODEL_PROFILES = {
+    "models/gemini-2.5-flash": {"rpm": RPM_LIMIT, "tpm": TPM_LIMIT, "input_cost": 0.30, "output_cost": 2.50},
+    "models/gemini-2.5-flash-lite": {"rpm": 15, "tpm": 250000, "input_cost": 0.10, "output_cost": 0.40},
+}
+
+DEFAULT_STANDARD_MODEL = "models/gemini-2.5-flash"
+DEFAULT_LIGHT_MODEL = "models/gemini-2.5-flash-lite"
+
+def get_api_keys() -> list:
+    """API keys from GEMINI_API_KEYS (comma-separated), plus GEMINI_API_KEY if not already listed."""
+    keys = [k.strip() for k in os.environ.get("GEMINI_API_KEYS", "").split(",") if k.strip()]
+    single_key = os.environ.get("GEMINI_API_KEY")
+    if single_key and single_key not in keys:
+        keys.append(single_key)
+    return keys
+
+def get_tier_models() -> dict:
+    """
+    {tier: [models in preference order]}. The light tier overflows to the standard model;
+    GEMINI_LIGHT_MODEL=none disables it (light requests then use the standard tier).
+    """
+    standard = os.environ.get("GEMINI_MODEL", DEFAULT_STANDARD_MODEL)
+    light = os.environ.get("GEMINI_LIGHT_MODEL", DEFAULT_LIGHT_MODEL)
+    tiers = {STANDARD_TIER: [standard]}
+    tiers[LIGHT_TIER] = [standard] if light.lower() == "none" else [light, standard]
+    return tiers
+
+def is_light_tier_enabled() -> bool:
+    return os.environ.get("GEMINI_LIGHT_MODEL", DEFAULT_LIGHT_MODEL).lower() != "none"
+
+def load_model_profiles() -> dict:
+    profiles = {name: dict(profile) for name, profile in MODEL_PROFILES.items()}
+    profiles_path = os.environ.get("GEMINI_MODEL_PROFILES")
+    if profiles_path:
+        try:
+            with open(profiles_path, 'r', encoding='utf-8') as f:
+                for name, profile in json.load(f).items():
+                    profiles.setdefault(name, {}).update(profile)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Warning: Could not load model profiles from {profiles_path}: {e}")
+    return profiles
+
+def key_label(api_key: str) -> str:
+    """Short, non-secret label for reports."""
+    return f"...{api_key[-4:]}" if len(api_key) > 8 else "key"
+
+class Endpoint:
+    """One (API key, model) pair with its own limiter, price and usage counters."""
+    def __init__(self, api_key: str, model_name: str, profile: dict):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.label = key_label(api_key)
+        self.input_cost = profile.get("input_cost", 0.0)
+        self.output_cost = profile.get("output_cost", 0.0)
+        # The key's hash (never the key itself) names the shared limiter state
+        key_hash = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+        self.limiter = get_shared_limiter(f"{key_hash}:{model_name}", profile.get("rpm", RPM_LIMIT), profile.get("tpm", TPM_LIMIT))
+        self.cooldown_until = 0.0
+        self.dispatched = 0
+
+    def estimate_cost(self, prompt_tokens: int, output_tokens: int) -> float:
+        return (prompt_tokens * self.input_cost + output_tokens * self.output_cost) / 1_000_000
+
+class LLMScheduler:
+    """Routes each request to the tier endpoint with the earliest available capacity."""
+    def __init__(self, api_keys: list = None, tier_models: dict = None, profiles: dict = None):
+        self.api_keys = api_keys if api_keys is not None else get_api_keys()
+        self.tier_models = tier_models or get_tier_models()
+        self.profiles = profiles or load_model_profiles()
+        self.endpoints = {} # (api_key, model_name) -> Endpoint
+        self.usage = {} # key label -> counters
+        self._lock = threading.Lock()
+
+    def _endpoint(self, api_key: str, model_name: str) -> Endpoint:
+        if (api_key, model_name) not in self.endpoints:
+            profile = self.profiles.get(model_name, {"rpm": RPM_LIMIT, "tpm": TPM_LIMIT})
+            self.endpoints[(api_key, model_name)] = Endpoint(api_key, model_name, profile)
+        return self.endpoints[(api_key, model_name)]
+
+    def candidates(self, tier: str, api_key: str = None) -> list:
+        """Endpoints for tier in preference order; an explicit api_key restricts routing to that key."""
+        keys = [api_key] if api_key else self.api_keys
+        models = self.tier_models.get(tier) or self.tier_models[STANDARD_TIER]
+        return [self._endpoint(key, model) for model in models for key in keys]
+
+    def reserve(self, prompt: str, tier: str = STANDARD_TIER, api_key: str = None):
+        """
+        Picks the endpoint that can send soonest (ties: cheaper, then less used) and reserves capacity on it.
+        Returns (endpoint, estimated_tokens, wait_seconds), or (None, 0, 0) if no API key is configured.
+        """
+        with self._lock:
+            endpoints = self.candidates(tier, api_key)
+            if not endpoints:
+                return None, 0, 0.0
+
+            now = time.time()
+            best = None
+            for order, endpoint in enumerate(endpoints):
+                estimated = estimate_prompt_tokens(prompt, endpoint.model_name)
+                wait = max(endpoint.limiter.peek(estimated), endpoint.cooldown_until - now, 0)
+                rank = (round(wait, 1), endpoint.estimate_cost(estimated, 0), endpoint.dispatched, order)
+                if best is None or rank < best[0]:
+                    best = (rank, endpoint, estimated)
+
+            _, endpoint, estimated = best
+            wait = max(endpoint.limiter.reserve(estimated), endpoint.cooldown_until - now, 0)
+            endpoint.dispatched += 1
+            return endpoint, estimated, wait
+
+    def cool_down(self, endpoint: Endpoint, seconds: float) -> None:
+        """Steers routing away from an endpoint that just returned 429."""
+        with self._lock:
+            endpoint.cooldown_until = max(endpoint.cooldown_until, time.time() + seconds)
+            self._usage(endpoint)["rate_limited"] += 1
+
+    def _usage(self, endpoint: Endpoint) -> dict:
+        return self.usage.setdefault(endpoint.label, {"requests": 0, "prompt_tokens": 0, "output_tokens": 0, "cost": 0.0, "queue_wait_seconds": 0.0, "rate_limited": 0, "models": set()})
+
+    def record_usage(self, endpoint: Endpoint, prompt_tokens: int, output_tokens: int, queue_wait: float) -> None:
+        with self._lock:
+            usage = self._usage(endpoint)
+            usage["requests"] += 1
+            usage["prompt_tokens"] += prompt_tokens
+            usage["output_tokens"] += output_tokens
+            usage["cost"] += endpoint.estimate_cost(prompt_tokens, output_tokens)
+            usage["queue_wait_seconds"] += queue_wait
+            usage["models"].add(endpoint.model_name.split("/")[-1])
+
+    def format_usage(self) -> str:
+        """Per-key usage lines, or an empty string when nothing was sent."""
+        with self._lock:
+            lines = []
+            for label, usage in sorted(self.usage.items()):
+                lines.append(f"  Key {label}: {usage['requests']} requests, {usage['prompt_tokens']} in / {usage['output_tokens']} out tokens, "
+                             f"~${usage['cost']:.4f}, queued {usage['queue_wait_seconds']:.1f}s, 429s {usage['rate_limited']} "
+                             f"({', '.join(sorted(usage['models'])) or '-'})")
+            return "\n".join(lines)
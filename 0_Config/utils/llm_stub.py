@@ -0,0 +1,240 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from .token_estimator import estimate_tokens
+    from .context_cache import split_stable_prefix
+except ImportError:
+    # Standalone execution
+    from token_estimator import estimate_tokens
+    from context_cache import split_stable_prefix
+
+# Deterministic local stand-in for Gemini and the Sub-Agent (GEMINI_LLM_BACKEND=stub).
+# Answers are canned per task (preliminary drafts, PASS/FAIL critiques, valid or broken JSON plans,
+# keyword lists, refinement patches), derived from the prompt and input contents. Latency, errors, FAIL verdicts and
+# broken plans are drawn from a RNG seeded by GEMINI_STUB_SEED and the request itself, so a run
+# repeats exactly. The same responder serves in-process calls and the HTTP server below.
+
+STUB_ENV_PREFIX = "GEMINI_STUB_"
+
+# name -> default; each is read from GEMINI_STUB_<NAME>
+STUB_SETTINGS = {
+    "seed": 0,
+    "latency": 0.0, # Base seconds per call
+    "jitter": 0.0, # Extra uniform random seconds
+    "rate_limit_rate": 0.0, # Fraction of calls answered with 429
+    "error_rate": 0.0, # Fraction of calls that fail outright (HTTP 500 / Sub-Agent returns nothing)
+    "fail_rate": 0.0, # Fraction of critiques with "VERDICT: FAIL"
+    "broken_plan_rate": 0.0, # Fraction of integration plans that are not valid JSON
+}
+
+STOPWORDS = {"this", "that", "with", "from", "have", "they", "what", "when", "which", "there", "their", "about",
+             "would", "could", "should", "into", "then", "than", "them", "were", "been", "also", "just", "more",
+             "some", "very", "your", "will", "like", "only", "does", "here", "user", "file", "note", "notes"}
+# Words of the stub's own templates, so drafts built from drafts keep the source's topics
+STOPWORDS |= {"believe", "central", "connect", "connects", "clarity", "define", "terms", "matters", "think", "keep",
+              "returning", "stream", "insights", "user-validated", "unaffirmed", "information", "literature", "context",
+              "external", "provided", "unconfirmed", "none", "preliminary", "synthesis", "facts", "beliefs", "personal",
+              "observations", "logic", "core", "motivation", "vibe", "narrative", "structured", "extraction",
+              "references", "stub", "value", "type", "literature-note", "source", "created", "title", "aliases",
+              "tags", "revision", "want", "active", "keywords"}
+
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z\-]{3,}|[一-鿿]{2,}")
+TASK_PATTERN = re.compile(r"^# TASK: (.+)$", re.MULTILINE)
+INLINE_FILE_PATTERN = re.compile(r"--- Start of (.+?) ---\n(.*?)\n--- End of \1 ---", re.DOTALL)
+
+class StubRateLimitError(Exception):
+    pass
+
+class StubError(Exception):
+    pass
+
+def load_stub_settings() -> dict:
+    settings = {}
+    for name, default in STUB_SETTINGS.items():
+        try:
+            settings[name] = type(default)(os.environ.get(STUB_ENV_PREFIX + name.upper(), default))
+        except ValueError:
+            settings[name] = default
+    return settings
+
+def _top_words(text: str, count: int = 5) -> list:
+    words = Counter(w for w in WORD_PATTERN.findall(text) if w.lower() not in STOPWORDS)
+    return [w for w, _ in sorted(words.items(), key=lambda item: (-item[1], item[0]))[:count]] or ["Stub"]
+
+def classify_prompt(prompt: str) -> str:
+    """The task a prompt asks for: the "# TASK:" header of the variable part, or a few legacy markers."""
+    _, body = split_stable_prefix(prompt)
+    match = TASK_PATTERN.search(body)
+    if match:
+        return match.group(1).strip()
+    if "Extract search keywords" in body:
+        return "KEYWORDS"
+    return "GENERIC"
+
+class StubResponder:
+    def __init__(self, settings: dict = None):
+        self.settings = settings or load_stub_settings()
+        self.seen = Counter() # request digest -> times asked, so retries draw fresh outcomes
+        self.prefixes = set()
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _rng(self, prompt: str, inputs: dict) -> random.Random:
+        digest = hashlib.sha256(f"{self.settings['seed']}\0{prompt}".encode('utf-8'))
+        for alias in sorted(inputs):
+            digest.update(f"\0{alias}\0{inputs[alias]}".encode('utf-8'))
+        key = digest.hexdigest()
+        with self._lock:
+            self.seen[key] += 1
+            attempt = self.seen[key]
+        return random.Random(f"{key}:{attempt}")
+
+    def respond(self, prompt: str, inputs: dict = None) -> dict:
+        """
+        Answers one request: {"text", "prompt_tokens", "output_tokens", "cached_tokens", "task", "latency"}.
+        inputs maps aliases to file contents (Sub-Agent calls); for llm_call they are parsed
+        from the inlined "--- Start of <alias> ---" blocks. Raises StubRateLimitError / StubError
+        for injected failures, after the drawn latency has passed.
+        """
+        inputs = dict(inputs or {})
+        for alias, content in INLINE_FILE_PATTERN.findall(prompt):
+            inputs.setdefault(alias, content)
+        rng = self._rng(prompt, inputs)
+        latency = self.settings["latency"] + rng.uniform(0, self.settings["jitter"])
+        outcome = rng.random()
+        task = classify_prompt(prompt)
+        time.sleep(latency)
+
+        with self._lock:
+            self.stats["requests"] += 1
+            if outcome < self.settings["rate_limit_rate"]:
+                self.stats["rate_limited"] += 1
+                raise StubRateLimitError("429 RESOURCE_EXHAUSTED (stub)")
+            if outcome < self.settings["rate_limit_rate"] + self.settings["error_rate"]:
+                self.stats["errors"] += 1
+                raise StubError("500 INTERNAL (stub)")
+            self.stats[task] += 1
+
+            # A prefix sent before counts as cached, like the provider's implicit prefix caching
+            prefix, _ = split_stable_prefix(prompt)
+            cached_tokens = estimate_tokens(prefix) if prefix and prefix in self.prefixes else 0
+            if prefix:
+                self.prefixes.add(prefix)
+
+        text = self._answer(task, inputs, rng)
+        return {
+            "text": text,
+            "prompt_tokens": estimate_tokens(prompt) + sum(estimate_tokens(c) for c in inputs.values()),
+            "output_tokens": estimate_tokens(text),
+            "cached_tokens": cached_tokens,
+            "task": task,
+            "latency": latency,
+        }
+
+    def _answer(self, task: str, inputs: dict, rng: random.Random) -> str:
+        text = "\n".join(inputs[alias] for alias in sorted(inputs))
+        words = _top_words(text)
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:6]
+
+        if task.endswith("CRITIQUE"):
+            verdict = "FAIL" if rng.random() < self.settings["fail_rate"] else "PASS"
+            feedback = f"Restore the missing details about {words[0]}." if verdict == "FAIL" else "No changes needed."
+            return (f"# {task.title()} (Stub)\n\n## VERDICT: {verdict}\n\n## Evidence\n"
+                    f"*   Checked {len(text)} characters of input ({digest}).\n\n## Feedback\n{feedback}\n")
+        if task == "KEYWORDS":
+            return ", ".join(words)
+        if task in ("SAFE INTEGRATION PLAN", "INTEGRATION PLAN REFINEMENT"):
+            return self._plan(words, digest, broken=task == "SAFE INTEGRATION PLAN" and rng.random() < self.settings["broken_plan_rate"])
+        if task.endswith("REFINEMENT (PATCH)"):
+            return self._patch(task, inputs, digest)
+        if task.endswith("REFINEMENT"):
+            draft = next((inputs[a] for a in sorted(inputs) if "draft" in a.lower()), text)
+            return f"{draft.rstrip()}\n\n<!-- stub revision {digest} -->\n"
+        if task == "FINAL SYNTHESIS NOTE":
+            title = " ".join(w.capitalize() for w in words[:3])
+            tags = " ".join(f"#value/{w.lower()}" for w in words[:2])
+            return (f"---\ntitle: {title}\ncreated: 2000-01-01\ntags: [type/literature-note, source/synthesis]\naliases: []\n---\n"
+                    f"# {title}\n\n## Narrative\nI keep returning to {', '.join(words)}. {tags}\n\n"
+                    f"## Structured Extraction\n" + "".join(f"*   I think [[{w}]] matters.\n" for w in words) +
+                    f"\n## Literature & External Context\n*   Stub context ({digest}).\n\n## References\n*   [[{words[0]}]]\n")
+        if task == "PRELIMINARY SYNTHESIS":
+            return ("# Preliminary Synthesis\n\n## STREAM A: User-Validated Insights (The \"ME\" Stream)\n\n### Key Facts & Beliefs\n" +
+                    "".join(f"*   I believe {w} is central. #value/{w.lower()}\n" for w in words) +
+                    f"\n### Personal Observations & Logic\n*   I connect {' and '.join(words[:2])}.\n\n"
+                    f"### Core Motivation & Vibe\n*   I want clarity ({digest}).\n\n"
+                    "## STREAM B: Unaffirmed LLM Information (The \"LITERATURE\" Stream)\n\n### Unconfirmed LLM Insights\n*   None.\n\n"
+                    "### External Context Provided by LLM\n*   None.\n")
+        return f"Stub response for {task.lower()} ({digest}): {', '.join(words)}"
+
+    def _plan(self, words: list, digest: str, broken: bool) -> str:
+        plan = [{
+            "type": "new_note",
+            "title": f"{words[0].capitalize()} {digest}",
+            "directory": "3_Permanent_Notes",
+            "content": f"I define {words[0]} in my own terms.\nIt connects to [[{words[-1]}]].",
+            "tags": f"value/{words[0].lower()}",
+        }]
+        if broken:
+            return "Here is the plan:\n```json\n" + json.dumps(plan, ensure_ascii=False)[:-2] + "\n```"
+        return json.dumps(plan, ensure_ascii=False, indent=2)
+
+    def _patch(self, task: str, inputs: dict, digest: str) -> str:
+        """A minimal edit of the draft: a marker in its first section, or a revised first plan item."""
+        draft = next((inputs[a] for a in sorted(inputs) if "draft" in a.lower() or a.endswith(".json")), "")
+        if task.startswith("INTEGRATION PLAN"):
+            try:
+                plan = json.loads(draft)
+                ops = [{"op": "replace", "path": "/0/content", "value": f"{plan[0]['content']}\n<!-- stub revision {digest} -->"}]
+            except (ValueError, LookupError, TypeError):
+                ops = []
+            return json.dumps(ops, ensure_ascii=False)
+        heading = next((line for line in draft.split("\n") if line.startswith("#")), None)
+        ops = [{"op": "append_to_section", "heading": heading, "content": f"<!-- stub revision {digest} -->"}] if heading else []
+        return "```json\n" + json.dumps(ops, ensure_ascii=False) + "\n```"
+
+    def format_stats(self) -> str:
+        with self._lock:
+            tasks = ", ".join(f"{task.lower()} {n}" for task, n in sorted(self.stats.items()) if task not in ("requests", "rate_limited", "errors"))
+            return (f"Stub LLM: {self.stats['requests']} requests, {self.stats['rate_limited']} rate limited, "
+                    f"{self.stats['errors']} errors ({tasks or 'none answered'}).")
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /generate {"prompt"} and POST /sub_agent {"prompt", "input_files": {alias: content}}
+    answer {"text", "prompt_tokens", "output_tokens", "cached_tokens"}; injected failures are 429 / 500.
+    """
+    responder = None
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        try:
+            result = self.responder.respond(body.get("prompt", ""), body.get("input_files"))
+            status, payload = 200, result
+        except StubRateLimitError as e:
+            status, payload = 429, {"error": str(e)}
+        except StubError as e:
+            status, payload = 500, {"error": str(e)}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, responder: StubResponder = None):
+    """Serves a StubResponder over HTTP in a background thread. Returns (server, url)."""
+    handler = type("BoundStubRequestHandler", (StubRequestHandler,), {"responder": responder or StubResponder()})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
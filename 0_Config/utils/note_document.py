@@ -0,0 +1,272 @@
+import re
+import copy
+import yaml
+
+# Parsed note: one linear scan of a note's text records the YAML frontmatter, the Markdown headings
+# (outside code fences) and the "Edited on [[YYYY-MM-DD]]" version markers, all as character offsets.
+# Sections, the References section and version blocks are derived from those offsets. Edits are
+# recorded as splices against the original text and applied together by render(), so an operation
+# can combine a body edit and a frontmatter update on a single parse. successor() returns the parsed
+# result of those edits, shifting the offsets instead of parsing again when the edits allow it.
+
+FRONTMATTER_OPEN_PATTERN = re.compile(r"\A(?:[ \t]*\r?\n)*[ \t]*(---)[ \t]*\r?\n")
+FRONTMATTER_CLOSE_PATTERN = re.compile(r"^[ \t]*---[ \t]*\r?$", re.MULTILINE)
+HEADING_PATTERN = re.compile(r"(#{1,6})[ \t]+([^\n]*?)[ \t]*#*[ \t]*\r?(?:\n|\Z)")
+FENCE_MARKERS = ("```", "~~~")
+VERSION_MARKER_PATTERN = re.compile(r"Edited on \[\[\d{4}-\d{2}-\d{2}\]\]")
+LINK_PATTERN = re.compile(r"\[\[[^\[\]\n]*\]\]")
+# Text that may start or end a heading, fence, frontmatter or version marker; insertions without it
+# leave the parse of the rest of the note unchanged
+STRUCTURE_MARKERS = ("#", "```", "~~~", "---", "Edited on")
+
+def _line_starts(text: str, prefix: str, start: int) -> list:
+    """Offsets of the lines at or after start (a line start) that begin with prefix."""
+    offsets = [start] if text.startswith(prefix, start) else []
+    position = text.find("\n" + prefix, start)
+    while position != -1:
+        offsets.append(position + 1)
+        position = text.find("\n" + prefix, position + 1)
+    return offsets
+
+class Heading:
+    """A heading line: start/end of the line (end includes the newline) and, once sections are
+    resolved, section_end (next heading of the same or a higher level) and content_end (next heading)."""
+    def __init__(self, level: int, title: str, start: int, end: int):
+        self.level = level
+        self.title = title
+        self.start = start
+        self.end = end
+        self.section_end = None
+        self.content_end = None
+
+class Note:
+    def __init__(self, text: str):
+        self.text = text
+        self.frontmatter_start = None # Offset of the opening '---'
+        self.frontmatter_inner = None # (start, end) of the YAML between the delimiters
+        self.frontmatter_close = None # Offset just after the closing '---' (before its newline)
+        self.body_start = 0 # Offset just after the closing delimiter line
+        self.headings = []
+        self.version_markers = [] # (start, end) of each "Edited on [[...]]" marker
+        self._metadata = None
+        self._links = None
+        self._splices = []
+        self._frontmatter_edit = None # (splice order, metadata) of a set_frontmatter() edit
+        self._parse()
+
+    def _parse(self) -> None:
+        text = self.text
+        # Frontmatter: a '---' line preceded only by blank lines, up to the next '---' line
+        opening = FRONTMATTER_OPEN_PATTERN.match(text)
+        if opening:
+            closing = FRONTMATTER_CLOSE_PATTERN.search(text, opening.end())
+            if closing:
+                self.frontmatter_start = opening.start(1)
+                self.frontmatter_inner = (opening.end(), closing.start())
+                self.frontmatter_close = closing.start() + len(closing.group(0).rstrip())
+                self.body_start = min(closing.end() + 1, len(text))
+
+        # Headings and code fences, in order. Candidate lines are found with str.find, which is far
+        # cheaper than a line-anchored regex over the whole text.
+        candidates = [(offset, None) for offset in _line_starts(text, "#", self.body_start)]
+        for marker in FENCE_MARKERS:
+            candidates.extend((offset, marker) for offset in _line_starts(text, marker, self.body_start))
+        in_fence = None
+        for offset, fence in sorted(candidates):
+            if fence:
+                in_fence = None if in_fence == fence else (in_fence or fence)
+            elif not in_fence:
+                match = HEADING_PATTERN.match(text, offset)
+                if match:
+                    self.headings.append(Heading(len(match.group(1)), match.group(2), offset, match.end()))
+
+        self.version_markers = [m.span() for m in VERSION_MARKER_PATTERN.finditer(text, self.body_start)]
+        self._resolve_sections()
+
+    def _resolve_sections(self) -> None:
+        open_headings = []
+        for heading in self.headings:
+            while open_headings and open_headings[-1].level >= heading.level:
+                open_headings.pop().section_end = heading.start
+            open_headings.append(heading)
+        for heading in open_headings:
+            heading.section_end = len(self.text)
+        for heading, following in zip(self.headings, self.headings[1:] + [None]):
+            heading.content_end = following.start if following else len(self.text)
+
+    # --- Frontmatter ---
+
+    @property
+    def has_frontmatter(self) -> bool:
+        return self.frontmatter_inner is not None
+
+    @property
+    def frontmatter_text(self) -> str:
+        """The YAML between the delimiters ('' if the note has none)."""
+        return self.text[self.frontmatter_inner[0]:self.frontmatter_inner[1]] if self.has_frontmatter else ""
+
+    @property
+    def frontmatter_block(self) -> str:
+        """The frontmatter from the opening to the closing '---' ('' if the note has none)."""
+        return self.text[self.frontmatter_start:self.frontmatter_close] if self.has_frontmatter else ""
+
+    @property
+    def metadata(self) -> dict:
+        """The frontmatter parsed as YAML (parsed once; raises yaml.YAMLError if invalid)."""
+        if self._metadata is None:
+            self._metadata = (yaml.safe_load(self.frontmatter_text) if self.has_frontmatter else None) or {}
+        return self._metadata
+
+    @property
+    def body(self) -> str:
+        return self.text[self.body_start:]
+
+    # --- Links ---
+
+    @property
+    def links(self) -> set:
+        """Every [[wikilink]] in the text as written (built on first use, kept by successor())."""
+        if self._links is None:
+            self._links = set(LINK_PATTERN.findall(self.text))
+        return self._links
+
+    def contains(self, fragment: str) -> bool:
+        """Whether the text contains fragment; a single [[wikilink]] is a set lookup in links."""
+        if LINK_PATTERN.fullmatch(fragment):
+            return fragment in self.links
+        return fragment in self.text
+
+    # --- Sections ---
+
+    @property
+    def first_heading(self) -> Heading:
+        return self.headings[0] if self.headings else None
+
+    def find_heading(self, title: str, max_level: int = 6) -> Heading:
+        """The first heading titled title (case-insensitive) of at most max_level, or None."""
+        wanted = title.strip().lower()
+        return next((h for h in self.headings if h.level <= max_level and h.title.lower() == wanted), None)
+
+    @property
+    def references(self) -> Heading:
+        """The '# References' / '## References' heading, or None."""
+        return self.find_heading("references", max_level=2)
+
+    def version_blocks(self) -> list:
+        """
+        The body split into versions: the text before the first "Edited on" marker (if any) and one
+        block per marker, each running up to the next marker. Blocks are stripped like the body.
+        """
+        body = self.body.strip()
+        if not self.version_markers:
+            return [body] if body else []
+        offset = self.body_start + (len(self.body) - len(self.body.lstrip()))
+        starts = [start - offset for start, _ in self.version_markers]
+        blocks = [body[:starts[0]].strip()] if body[:starts[0]].strip() else []
+        for start, following in zip(starts, starts[1:] + [len(body)]):
+            blocks.append(body[start:following])
+        return blocks
+
+    # --- Editing ---
+
+    def splice(self, start: int, end: int, replacement: str) -> None:
+        """Records replacing text[start:end]. Splices may not overlap; render() applies them all."""
+        for other_start, other_end, _, _ in self._splices:
+            if start < other_end and other_start < end:
+                raise ValueError(f"Overlapping edits at {start}-{end} and {other_start}-{other_end}")
+        self._splices.append((start, end, len(self._splices), replacement))
+
+    def insert(self, offset: int, content: str) -> None:
+        """Inserts content at offset, starting it on a new line if offset is mid-line."""
+        if offset > 0 and self.text[offset - 1] != "\n":
+            content = "\n" + content
+        self.splice(offset, offset, content)
+
+    def set_frontmatter(self, yaml_text: str, metadata: dict = None) -> None:
+        """
+        Replaces everything up to the closing delimiter line (or inserts frontmatter) with yaml_text.
+        metadata, if given, is the dict yaml_text was dumped from; successor() keeps it instead of parsing the YAML again.
+        """
+        block = f"---\n{yaml_text}---\n"
+        self.splice(0, self.body_start if self.has_frontmatter else 0, block)
+        self._frontmatter_edit = (len(self._splices) - 1, metadata)
+
+    @property
+    def modified(self) -> bool:
+        return bool(self._splices)
+
+    def render(self) -> str:
+        """The text with every recorded splice applied."""
+        if not self._splices:
+            return self.text
+        parts, position = [], 0
+        for start, end, _, replacement in sorted(self._splices):
+            parts.append(self.text[position:start])
+            parts.append(replacement)
+            position = end
+        parts.append(self.text[position:])
+        return "".join(parts)
+
+    def _plain_insertion(self, start: int, end: int, replacement: str) -> bool:
+        """Whether a splice inserts whole lines into the body without any structure markers."""
+        return (start == end and start >= self.body_start and (start == 0 or self.text[start - 1] == "\n")
+                and replacement.endswith("\n") and not any(marker in replacement for marker in STRUCTURE_MARKERS))
+
+    def successor(self) -> "Note":
+        """
+        The parsed Note of render(). Plain line insertions in the body (see STRUCTURE_MARKERS) and a
+        set_frontmatter() edit shift the recorded offsets; any other edit parses the new text.
+        """
+        if not self._splices:
+            return self
+        text = self.render()
+        frontmatter_order, metadata = self._frontmatter_edit or (None, None)
+        frontmatter_block = None
+        for start, end, order, replacement in self._splices:
+            if order == frontmatter_order:
+                frontmatter_block = replacement
+            elif not self._plain_insertion(start, end, replacement) or (frontmatter_order is not None and start == 0):
+                return Note(text)
+
+        following = Note.__new__(Note)
+        following.text = text
+        following._splices = []
+        following._frontmatter_edit = None
+        edits = [(start, end - start, len(replacement)) for start, end, _, replacement in self._splices]
+        def shift(position, moves_with_insertion):
+            """New offset of a position; an insertion exactly at it moves it if it starts something."""
+            delta = 0
+            for start, removed, added in edits:
+                if position > start or (position == start and moves_with_insertion):
+                    delta += added - removed
+            return position + delta
+
+        if frontmatter_block is None:
+            for name in ["frontmatter_start", "frontmatter_inner", "frontmatter_close"]:
+                setattr(following, name, getattr(self, name))
+            following.body_start = shift(self.body_start, False)
+            following._metadata = self._metadata
+        else:
+            # The new frontmatter must end exactly where the block ends, as a parse would find it
+            opening = FRONTMATTER_OPEN_PATTERN.match(frontmatter_block)
+            closing = FRONTMATTER_CLOSE_PATTERN.search(frontmatter_block, opening.end()) if opening else None
+            if not closing or min(closing.end() + 1, len(text)) != len(frontmatter_block):
+                return Note(text)
+            following.frontmatter_start = opening.start(1)
+            following.frontmatter_inner = (opening.end(), closing.start())
+            following.frontmatter_close = closing.start() + len(closing.group(0).rstrip())
+            following.body_start = len(frontmatter_block)
+            following._metadata = copy.deepcopy(metadata) if metadata is not None else None
+
+        following.headings = []
+        for heading in self.headings:
+            moved = Heading(heading.level, heading.title, shift(heading.start, True), shift(heading.end, False))
+            moved.section_end = shift(heading.section_end, True)
+            moved.content_end = shift(heading.content_end, True)
+            following.headings.append(moved)
+        following.version_markers = [(shift(start, True), shift(end, False)) for start, end in self.version_markers]
+
+        following._links = None
+        if self._links is not None and not (frontmatter_block is not None and ("[[" in frontmatter_block or "[[" in self.text[:self.body_start])):
+            following._links = self._links.union(*(LINK_PATTERN.findall(replacement) for _, _, _, replacement in self._splices))
+        return following
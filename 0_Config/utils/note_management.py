@@ -1,6 +1,7 @@
 import re
 import os
 import datetime
+from .note_document import Note
 
 def create_structured_note(file_path: str, title: str, content: str, topics: list = None, tags: list = None, aliases: list = None):
     """
@@ -45,28 +46,12 @@ def extract_markdown_content(markdown_content: str, ignore_update_sections: bool
     Extracts the main content from a Markdown string, excluding YAML frontmatter,
     and specific sections like "References" or "Ambiguities and Contradictions".
     """
-    lines = markdown_content.splitlines()
-    cleaned_lines = []
-    in_frontmatter = False
-    frontmatter_delimiter_count = 0
-    
-    # First pass: remove YAML frontmatter and horizontal rules
-    temp_lines = []
-    for line in lines:
-        if line.strip() == "---":
-            frontmatter_delimiter_count += 1
-            if frontmatter_delimiter_count == 1:
-                in_frontmatter = True
-                continue
-            elif frontmatter_delimiter_count == 2 and in_frontmatter:
-                in_frontmatter = False
-                continue
-            elif not in_frontmatter: # It's a horizontal rule, skip it
-                continue
-        
-        if not in_frontmatter:
-            temp_lines.append(line)
-            
+    return _markdown_content(Note(markdown_content), ignore_update_sections)
+
+def _markdown_content(note: Note, ignore_update_sections: bool = False) -> str:
+    # First pass: drop the YAML frontmatter and horizontal rules
+    temp_lines = [line for line in note.body.splitlines() if line.strip() != "---"]
+
     # Second pass: remove specific sections
     final_content_lines = []
     ignoring = False
@@ -98,24 +83,11 @@ def get_yaml_frontmatter(markdown_content: str) -> dict:
     """
     Extracts YAML frontmatter from Markdown content.
     """
-    lines = markdown_content.splitlines()
-    frontmatter_lines = []
-    in_frontmatter = False
-    frontmatter_delimiter_count = 0
-
-    for line in lines:
-        if line.strip() == "---":
-            frontmatter_delimiter_count += 1
-            if frontmatter_delimiter_count == 1:
-                in_frontmatter = True
-                continue
-            elif frontmatter_delimiter_count == 2 and in_frontmatter:
-                in_frontmatter = False
-                break
-        
-        if in_frontmatter:
-            frontmatter_lines.append(line)
-            
+    return _frontmatter_pairs(Note(markdown_content))
+
+def _frontmatter_pairs(note: Note) -> dict:
+    frontmatter_lines = note.frontmatter_text.splitlines()
+
     if frontmatter_lines:
         try:
             # We will need a YAML parser. Since we cannot install libraries,
@@ -197,8 +169,9 @@ def update_existing_note(existing_note_path: str, new_content: str, source_refer
         return
 
     # Extract frontmatter and main content
-    frontmatter = get_yaml_frontmatter(full_existing_content)
-    main_content_before_update = extract_markdown_content(full_existing_content, ignore_update_sections=True)
+    existing_note = Note(full_existing_content)
+    frontmatter = _frontmatter_pairs(existing_note)
+    main_content_before_update = _markdown_content(existing_note, ignore_update_sections=True)
     
     current_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
 
@@ -391,47 +364,34 @@ def update_chat_status(chat_file_path: str, status: str) -> bool:
     """
     try:
         with open(chat_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+            note = Note(f.read())
     except FileNotFoundError:
         print(f"Error: File not found at {chat_file_path}")
         return False
 
-    frontmatter_start = -1
-    frontmatter_end = -1
-    in_frontmatter = False
-    
-    for i, line in enumerate(lines):
-        if line.strip() == "---":
-            if not in_frontmatter:
-                frontmatter_start = i
-                in_frontmatter = True
-            else:
-                frontmatter_end = i
-                break
-    
-    if frontmatter_start == -1 or frontmatter_end == -1:
+    status_line = f"status: {status}\n"
+    if not note.has_frontmatter:
         print(f"Warning: No valid YAML frontmatter found in {chat_file_path}. Appending status.")
-        # If no frontmatter, append a new one
-        new_frontmatter = ["---\n", f"status: {status}\n", "---\n"]
+        # If no frontmatter, add a new one
+        note.splice(0, 0, f"---\n{status_line}---\n")
         with open(chat_file_path, 'w', encoding='utf-8') as f:
-            f.writelines(new_frontmatter + lines)
+            f.write(note.render())
         return True
 
-    # Check if 'status' key already exists
-    status_found = False
-    for i in range(frontmatter_start + 1, frontmatter_end):
-        if lines[i].strip().startswith("status:"):
-            lines[i] = f"status: {status}\n"
-            status_found = True
+    # Replace the 'status' line if it exists, else insert it before the end of the frontmatter
+    position, frontmatter_end = note.frontmatter_inner
+    while position < frontmatter_end:
+        line_end = note.text.find("\n", position, frontmatter_end) + 1 or frontmatter_end
+        if note.text[position:line_end].strip().startswith("status:"):
+            note.splice(position, line_end, status_line)
             break
-    
-    if not status_found:
-        # Insert 'status' key before the end of frontmatter
-        lines.insert(frontmatter_end, f"status: {status}\n")
+        position = line_end
+    else:
+        note.splice(frontmatter_end, frontmatter_end, status_line)
 
     try:
         with open(chat_file_path, 'w', encoding='utf-8') as f:
-            f.writelines(lines)
+            f.write(note.render())
         print(f"Successfully updated status in {chat_file_path} to '{status}'.")
         return True
     except Exception as e:
@@ -5,6 +5,12 @@ import os
 import datetime
 import collections # ADDED THIS LINE
 
+try:
+    from .note_document import Note
+except ImportError:
+    # Standalone execution
+    from note_document import Note
+
 def parse_gemini_index_moc(moc_content: str, moc_file_path: str) -> dict:
     """
     Parses the content of a MOC file to extract a mapping of
@@ -198,61 +204,111 @@ def extract_metadata_and_first_section(content: str) -> str:
     if not content:
         return ""
 
-    # 1. Identify YAML Frontmatter
-    yaml_end_pos = 0
-    if content.startswith("---"):
-        # Find ending ---
-        try:
-            # Look for the second --- using regex to ensure it's a standalone line
-            # We search from index 3 to skip the first one
-            match = re.search(r'^---$', content[3:], re.MULTILINE)
-            if match:
-                yaml_end_pos = match.end() + 3 
-            else:
-                pass # Malformed or unclosed YAML
-        except:
-            pass
-    
-    # 2. Find the first Header in the remaining content (The Main Body Start)
-    body_content_start_index = yaml_end_pos
-    body_content = content[body_content_start_index:]
-    
-    # Regex for headers: ^#{1,6} space
-    # Find the FIRST header match
-    first_header_match = re.search(r'^(#{1,6})\s', body_content, re.MULTILINE)
-    
-    if not first_header_match:
+    # The first Header after the YAML frontmatter (The Main Body Start)
+    note = Note(content)
+    first_heading = note.first_heading
+    if first_heading is None:
         # No headers found. Return the whole file (Metadata + Content).
         return content
 
-    header_level = len(first_header_match.group(1))
-    # Position of the first header relative to body_content
-    first_header_rel_pos = first_header_match.start()
-    
-    # 3. Find the NEXT header of the SAME level to determine where to cut
-    # We search starting strictly AFTER the start of the first header
-    regex_pattern = r'^#{' + str(header_level) + r'}\s'
-    
-    # Search in the substring following the first header's start
-    # We add 1 to skip the initial '#' character of the found header so we don't match it again
-    search_start_offset = first_header_rel_pos + 1
-    next_header_match = re.search(regex_pattern, body_content[search_start_offset:], re.MULTILINE)
-    
-    if next_header_match:
-        # Found a subsequent section of the same level.
-        # The cut point (relative to body_content) is:
-        # search_start_offset + match position
-        cut_point_rel = search_start_offset + next_header_match.start()
-        
-        # Calculate absolute cut point
-        absolute_cut_point = body_content_start_index + cut_point_rel
-        
-        return content[:absolute_cut_point].strip()
+    # Cut before the NEXT header of the SAME level
+    next_heading = next((h for h in note.headings[1:] if h.level == first_heading.level), None)
+    if next_heading:
+        return content[:next_heading.start].strip()
     else:
         # No subsequent section of the same level found.
         # Return everything (Metadata + First Section/Whole Body).
         return content
 
+def parse_rag_index_entries(moc_content: str, vault_root: str) -> dict:
+    """
+    Parses the GEMINI_INDEX content into a mapping of wikilink targets to
+    their vault-relative '.md' path and the full index line (tags/aliases context).
+    """
+    note_map = {}
+    wikilink_pattern = re.compile(r'\[\[(.*?)\]\]')
+
+    for line in moc_content.splitlines():
+        for match in wikilink_pattern.findall(line):
+            linked_content = match.split('|')[0]
+            normalized_linked_content = linked_content.replace('/', os.sep).replace('\\', os.sep)
+
+            if os.path.isabs(normalized_linked_content):
+                full_path_abs = os.path.normpath(normalized_linked_content)
+            elif normalized_linked_content.startswith(os.sep) or normalized_linked_content.startswith('/'):
+                full_path_abs = os.path.normpath(os.path.join(vault_root, normalized_linked_content[1:]))
+            else:
+                full_path_abs = os.path.normpath(os.path.join(vault_root, normalized_linked_content))
+
+            relative_path_no_ext = os.path.relpath(full_path_abs, vault_root)
+            file_path_for_map = relative_path_no_ext if relative_path_no_ext.endswith('.md') else relative_path_no_ext + '.md'
+
+            note_map[linked_content] = {
+                'path': file_path_for_map,
+                'context': line
+            }
+
+    return note_map
+
+def select_relevant_rag_files(keywords: list, note_map: dict, vault_root: str) -> list:
+    """
+    Returns the sorted vault-relative paths of Literature/Permanent notes whose
+    index entry matches any keyword. Multi-word keywords are an AND search over their words.
+    """
+    lower_keywords = [k.strip().lower() for k in keywords if k and k.strip()]
+    relevant_paths = set()
+
+    for wikilink_key, data in note_map.items():
+        file_path_with_ext = data['path']
+
+        # RESTRICTION: Only Literature and Permanent Notes
+        if not (file_path_with_ext.startswith('2_Literature_Notes') or file_path_with_ext.startswith('3_Permanent_Notes')):
+            continue
+
+        target_text = (wikilink_key + " " + file_path_with_ext + " " + data['context']).lower()
+
+        match_found = False
+        for keyword in lower_keywords:
+            if len(keyword) < 3:
+                continue
+            if ' ' in keyword:
+                words = [w for w in keyword.split() if len(w) > 2]
+                if words and all(word in target_text for word in words):
+                    match_found = True
+                    break
+            elif keyword in target_text:
+                match_found = True
+                break
+
+        if match_found and os.path.exists(os.path.join(vault_root, file_path_with_ext)):
+            relevant_paths.add(file_path_with_ext)
+
+    return sorted(relevant_paths)
+
+def consolidate_rag_files(relevant_files: list, vault_root: str) -> str:
+    """
+    Concatenates the YAML and first section of each listed file, wrapped in the
+    '--- Start/End RAG content from ... ---' markers the synthesis prompts expect.
+    """
+    consolidated_content = []
+    for rel_path in relevant_files:
+        try:
+            with open(os.path.join(vault_root, rel_path), 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            print(f"Warning: Could not read {rel_path} ({e}). Skipping.")
+            continue
+
+        if not content:
+            print(f"Warning: Could not read {rel_path}. Skipping.")
+            continue
+
+        consolidated_content.append(f"\n\n--- Start RAG content from {rel_path} ---")
+        consolidated_content.append(extract_metadata_and_first_section(content))
+        consolidated_content.append(f"\n--- End RAG content from {rel_path} ---")
+
+    return "".join(consolidated_content)
+
 
 if __name__ == "__main__":
     # Simulate moc_content from a file read
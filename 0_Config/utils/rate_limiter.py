@@ -0,0 +1,210 @@
+import os
+import time
+import sqlite3
+import threading
+
+# RPM/TPM token buckets for LLM traffic.
+# RateLimiter keeps its buckets in memory (one process); SharedRateLimiter keeps them in a small
+# SQLite file so every main_cli process and subprocess draws from the same budget.
+
+RPM_LIMIT = 10 # Requests Per Minute
+TPM_LIMIT = 200000 # Tokens Per Minute
+WINDOW_SECONDS = 60.0
+
+RATE_LIMIT_STATE_ENV = "GEMINI_RATE_LIMIT_STATE" # Path of the shared state file, or "off" for per-process limits
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at capacity / window_seconds.
+    reserve() deducts immediately (the balance may go negative) and returns how long the caller
+    must wait before its reservation is covered, which queues callers in arrival order.
+    """
+    def __init__(self, capacity: float, window_seconds: float = WINDOW_SECONDS):
+        self.capacity = float(capacity)
+        self.refill_per_second = self.capacity / window_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            # A single request larger than the bucket could never fit; cap it at a full bucket
+            self.tokens -= min(amount, self.capacity)
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+    def peek(self, amount: float) -> float:
+        """Seconds a reservation of amount would wait right now, without reserving it."""
+        with self._lock:
+            self._refill()
+            balance = self.tokens - min(amount, self.capacity)
+            return -balance / self.refill_per_second if balance < 0 else 0.0
+
+    def adjust(self, delta: float) -> None:
+        """Corrects an earlier reservation: positive delta consumes more, negative refunds."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+class RateLimiter:
+    """Separate request (RPM) and token (TPM) buckets for one API key / model, in this process only."""
+    def __init__(self, rpm_limit: int = RPM_LIMIT, tpm_limit: int = TPM_LIMIT, window_seconds: float = WINDOW_SECONDS):
+        self.rpm_bucket = TokenBucket(rpm_limit, window_seconds)
+        self.tpm_bucket = TokenBucket(tpm_limit, window_seconds)
+
+    def reserve(self, tokens: int) -> float:
+        """Reserves one request and `tokens` tokens; returns the seconds to wait before sending."""
+        return max(self.rpm_bucket.reserve(1), self.tpm_bucket.reserve(tokens))
+
+    def peek(self, tokens: int) -> float:
+        return max(self.rpm_bucket.peek(1), self.tpm_bucket.peek(tokens))
+
+    def settle(self, reserved_tokens: int, actual_tokens: int) -> None:
+        """Replaces the reserved token estimate with the actual prompt + output usage."""
+        if actual_tokens and actual_tokens != reserved_tokens:
+            self.tpm_bucket.adjust(actual_tokens - reserved_tokens)
+
+    def refund(self, reserved_tokens: int) -> None:
+        """Returns a reservation whose request used no capacity (a 429 or a failed call)."""
+        self.rpm_bucket.adjust(-1)
+        self.tpm_bucket.adjust(-min(reserved_tokens, self.tpm_bucket.capacity))
+
+def get_state_path() -> str:
+    default_path = os.path.join(os.path.expanduser("~"), ".cache", "gemini_vault", "rate_limits.sqlite")
+    return os.environ.get(RATE_LIMIT_STATE_ENV, default_path)
+
+class SharedRateLimiter:
+    """
+    RateLimiter with the same RPM/TPM semantics, but with the bucket balances stored in a SQLite
+    file. Each reservation is a BEGIN IMMEDIATE transaction, which takes the database write lock
+    across processes. Falls back to an in-process RateLimiter if the file cannot be used.
+    """
+    def __init__(self, name: str, rpm_limit: int = RPM_LIMIT, tpm_limit: int = TPM_LIMIT,
+                 window_seconds: float = WINDOW_SECONDS, path: str = None):
+        self.name = name
+        self.limits = {"rpm": float(rpm_limit), "tpm": float(tpm_limit)}
+        self.window_seconds = window_seconds
+        self.path = path or get_state_path()
+        self.fallback = None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+        return conn
+
+    def _update(self, amounts: dict) -> dict:
+        """Refills and deducts each bucket ({'rpm'|'tpm': amount}) in one locked transaction; returns the new balances."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time() # Wall clock: monotonic clocks are not comparable across processes
+            balances = {}
+            for bucket, amount in amounts.items():
+                key = f"{self.name}:{bucket}"
+                capacity = self.limits[bucket]
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (key,)).fetchone()
+                tokens, updated = row if row else (capacity, now)
+                tokens = min(capacity, tokens + max(now - updated, 0) * capacity / self.window_seconds)
+                tokens = min(capacity, tokens - amount)
+                conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+                balances[bucket] = tokens
+            conn.execute("COMMIT")
+            return balances
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _read_balances(self) -> dict:
+        conn = self._connect()
+        try:
+            now = time.time()
+            balances = {}
+            for bucket, capacity in self.limits.items():
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (f"{self.name}:{bucket}",)).fetchone()
+                tokens, updated = row if row else (capacity, now)
+                balances[bucket] = min(capacity, tokens + max(now - updated, 0) * capacity / self.window_seconds)
+            return balances
+        finally:
+            conn.close()
+
+    def _use_fallback(self, error) -> RateLimiter:
+        if self.fallback is None:
+            print(f"Warning: Shared rate limit state unavailable ({error}). Using per-process limits.")
+            self.fallback = RateLimiter(self.limits["rpm"], self.limits["tpm"], self.window_seconds)
+        return self.fallback
+
+    def reserve(self, tokens: int) -> float:
+        """Reserves one request and `tokens` tokens; returns the seconds to wait before sending."""
+        if self.fallback:
+            return self.fallback.reserve(tokens)
+        try:
+            balances = self._update({"rpm": 1, "tpm": min(tokens, self.limits["tpm"])})
+        except (sqlite3.Error, OSError) as e:
+            return self._use_fallback(e).reserve(tokens)
+        return max(max(-balance, 0) * self.window_seconds / self.limits[bucket] for bucket, balance in balances.items())
+
+    def peek(self, tokens: int) -> float:
+        """Seconds a reservation would wait right now, without reserving it."""
+        if self.fallback:
+            return self.fallback.peek(tokens)
+        try:
+            balances = self._read_balances()
+        except (sqlite3.Error, OSError) as e:
+            return self._use_fallback(e).peek(tokens)
+        amounts = {"rpm": 1, "tpm": min(tokens, self.limits["tpm"])}
+        return max(max(amounts[bucket] - balance, 0) * self.window_seconds / self.limits[bucket] for bucket, balance in balances.items())
+
+    def settle(self, reserved_tokens: int, actual_tokens: int) -> None:
+        """Replaces the reserved token estimate with the actual prompt + output usage."""
+        if not actual_tokens or actual_tokens == reserved_tokens:
+            return
+        if self.fallback:
+            return self.fallback.settle(reserved_tokens, actual_tokens)
+        try:
+            self._update({"tpm": actual_tokens - reserved_tokens})
+        except (sqlite3.Error, OSError) as e:
+            self._use_fallback(e)
+
+    def refund(self, reserved_tokens: int) -> None:
+        """Returns a reservation whose request used no capacity (a 429 or a failed call)."""
+        if self.fallback:
+            return self.fallback.refund(reserved_tokens)
+        try:
+            self._update({"rpm": -1, "tpm": -min(reserved_tokens, self.limits["tpm"])})
+        except (sqlite3.Error, OSError) as e:
+            self._use_fallback(e)
+
+shared_limiters = {}
+shared_limiters_lock = threading.Lock()
+
+def get_shared_limiter(name: str, rpm_limit: int = RPM_LIMIT, tpm_limit: int = TPM_LIMIT):
+    """
+    Returns the limiter for `name` (a model or Sub-Agent id), shared across processes unless
+    GEMINI_RATE_LIMIT_STATE=off.
+    """
+    with shared_limiters_lock:
+        if name not in shared_limiters:
+            if os.environ.get(RATE_LIMIT_STATE_ENV, "").lower() == "off":
+                shared_limiters[name] = RateLimiter(rpm_limit, tpm_limit)
+            else:
+                shared_limiters[name] = SharedRateLimiter(name, rpm_limit, tpm_limit)
+        return shared_limiters[name]
+
+def wait_for_capacity(limiter, tokens: int, label: str) -> float:
+    """Blocking reservation for synchronous callers; returns the queue wait in seconds."""
+    wait = limiter.reserve(tokens)
+    if wait > 0:
+        print(f"[Status] Rate limiter: {label} queued for {wait:.1f}s.")
+        time.sleep(wait)
+    return wait
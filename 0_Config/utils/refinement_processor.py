@@ -3,6 +3,12 @@ import os
 import yaml
 import datetime
 
+try:
+    from .note_document import Note
+except ImportError:
+    # Standalone execution
+    from note_document import Note
+
 # Assuming vault_root is the current working directory for simplicity in these utilities
 # In main application, vault_root should be passed or derived from project context.
 
@@ -104,10 +110,10 @@ def _parse_suggestion_block(block_content: str) -> dict:
 
     return suggestion_details
 
-def _add_to_update_history(file_content: str, section_name: str, old_content: str, source_file_path: str) -> str:
+def _add_to_update_history(note: Note, section_name: str, old_content: str, source_file_path: str) -> None:
     """
-    Adds old content of a section to an "Update History" section at the end of the note.
-    Creates the "Update History" section if it doesn't exist.
+    Records adding old content of a section to the note's "Update History" section (see note_document.py).
+    Creates the "Update History" section at the end of the note if it doesn't exist.
     """
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     # Make a wikilink to the refinement analysis file
@@ -122,18 +128,31 @@ Source: {source_link}
 {old_content.strip()}
 ```
 """
-    # Regex to find the Update History section, capture its content
-    update_history_pattern = re.compile(r'(## Update History\s*\n)(.*)', re.DOTALL)
-    history_match = update_history_pattern.search(file_content)
-
-    if history_match:
-        # Prepend to existing history entries (after the heading)
-        # Find the end of the history heading and insert the new entry
-        start_of_history_content = history_match.start(2)
-        return file_content[:start_of_history_content] + history_entry + "\n" + file_content[start_of_history_content:]
+    history_heading = note.find_heading("Update History")
+    text = note.text
+
+    if history_heading:
+        # Prepend to existing history entries, after the heading and the blank lines that follow it
+        whitespace_end = history_heading.end
+        while whitespace_end < len(text) and text[whitespace_end].isspace():
+            whitespace_end += 1
+        start_of_history_content = text.rfind("\n", history_heading.end - 1, whitespace_end) + 1
+        note.splice(start_of_history_content, start_of_history_content, history_entry + "\n")
     else:
         # Create new history section at the very end of the file
-        return file_content.strip() + f"\n\n## Update History\n{history_entry}"
+        content_end = max(len(text.rstrip()), note.body_start)
+        note.splice(content_end, len(text), f"\n\n## Update History\n{history_entry}")
+
+def _section_span(note: Note, heading) -> (str, int):
+    """
+    The heading line of a section (with its newline) and the end of its own content: the newline
+    before the next heading of any level, or the end of the note.
+    """
+    marker = note.text[heading.start:heading.end]
+    if not marker.endswith("\n"):
+        marker += "\n"
+    content_end = heading.content_end - 1 if heading.content_end < len(note.text) else len(note.text)
+    return marker, max(content_end, heading.end)
 
 
 def parse_refinement_analysis(refinement_analysis_content: str) -> tuple[list[dict], str, str]:
@@ -232,20 +251,16 @@ def execute_refinement_suggestion(suggestion: dict, vault_root: str, refinement_
             print(f"Error: Could not read {full_target_file_path} for UPDATE_NOTE. Skipping.")
             return
         
-        updated_content_for_note = existing_content # Use a new variable for content being updated
+        note = Note(existing_content) # Edits are recorded on the parsed note and rendered once
 
         # Citation for the new content
         source_link_target = os.path.splitext(os.path.basename(refinement_analysis_file_path))[0]
         citation = f"\n\n^(Source: [[{source_link_target}]])"
 
         if section.upper() == "FRONTMATTER":
-            frontmatter_match = re.match(r'---\s*\n(.*?)\n---\s*\n(.*)', existing_content, re.DOTALL)
-            if frontmatter_match:
-                frontmatter_str = frontmatter_match.group(1)
-                body_content = frontmatter_match.group(2)
+            if note.has_frontmatter:
                 try:
-                    frontmatter_data = yaml.safe_load(frontmatter_str)
-                    if frontmatter_data is None: frontmatter_data = {}
+                    frontmatter_data = note.metadata
                 except yaml.YAMLError as e:
                     print(f"Error parsing YAML frontmatter in {target_file_relative}: {e}. Skipping frontmatter update.")
                     return
@@ -261,10 +276,10 @@ def execute_refinement_suggestion(suggestion: dict, vault_root: str, refinement_
                     
                     frontmatter_data.update(update_data)
                     new_frontmatter_str = yaml.dump(frontmatter_data, default_flow_style=False, sort_keys=False, allow_unicode=True)
-                    updated_content_for_note = f"---\n{new_frontmatter_str}---\n{body_content}"
+                    note.set_frontmatter(new_frontmatter_str)
                     
                     # Add old frontmatter to history
-                    updated_content_for_note = _add_to_update_history(updated_content_for_note, f"FRONTMATTER", old_frontmatter_content, refinement_analysis_file_path)
+                    _add_to_update_history(note, f"FRONTMATTER", old_frontmatter_content, refinement_analysis_file_path)
 
                 except yaml.YAMLError as e:
                     print(f"Error parsing CONTENT_TO_ADD/REPLACE for FRONTMATTER in {target_file_relative}: {e}. Skipping.")
@@ -274,39 +289,41 @@ def execute_refinement_suggestion(suggestion: dict, vault_root: str, refinement_
                 return
         else:
             # Section-based update (Handles H1 to H6)
-            # This regex captures the section heading and its content until the next heading of same or higher level, or end of file
-            section_heading_pattern = re.compile(rf"(^#{{1,6}}\s*{re.escape(section)}\s*\n)(.*?)(?=\n#{{1,6}} |\Z)", re.DOTALL | re.MULTILINE)
-            section_match = section_heading_pattern.search(existing_content)
+            # The section's content runs until the next heading of any level, or end of file
+            heading = note.find_heading(section)
 
             current_section_content = ""
-            if section_match:
-                section_start_marker = section_match.group(1)
-                current_section_content = section_match.group(2)
+            if heading:
+                section_start_marker, section_content_end = _section_span(note, heading)
+                current_section_content = note.text[heading.end:section_content_end]
             else:
                 section_start_marker = f"## {section}\n" # If section not found, assume H2
                 
-            # Add existing section content to history BEFORE modifying
-            updated_content_for_note = _add_to_update_history(updated_content_for_note, section, current_section_content, refinement_analysis_file_path)
+            if action not in ("ADD_CONTENT", "REPLACE_SECTION"):
+                print(f"Warning: Unknown action '{action}' for UPDATE_NOTE section '{section}'. Skipping.")
+                return
 
             if action == "ADD_CONTENT":
-                new_section_content = current_section_content.strip() + "\n\n" + content_to_add_or_replace + citation
-                # Replace the content of the matched section, keeping the heading intact
-                if section_match:
-                    updated_content_for_note = section_heading_pattern.sub(f"{section_start_marker}{new_section_content.strip()}\n", existing_content)
-                else:
-                    # Append new section and its content
-                    updated_content_for_note += f"\n\n{section_start_marker}{new_section_content.strip()}\n"
-            elif action == "REPLACE_SECTION":
+                new_section_content = (current_section_content.strip() + "\n\n" + content_to_add_or_replace + citation).strip()
+            else:
                 # Replace the entire section content
-                if section_match:
-                    updated_content_for_note = section_heading_pattern.sub(f"{section_start_marker}{content_to_add_or_replace.strip()}{citation}\n", existing_content)
+                new_section_content = f"{content_to_add_or_replace.strip()}{citation}"
+
+            try:
+                # Add existing section content to history BEFORE modifying
+                _add_to_update_history(note, section, current_section_content, refinement_analysis_file_path)
+                if heading:
+                    # Replace the content of the matched section, keeping the heading intact
+                    note.splice(heading.start, section_content_end, f"{section_start_marker}{new_section_content}\n")
                 else:
                     # Append new section and its content
-                    updated_content_for_note += f"\n\n{section_start_marker}{content_to_add_or_replace.strip()}{citation}\n"
-            else:
-                print(f"Warning: Unknown action '{action}' for UPDATE_NOTE section '{section}'. Skipping.")
+                    note.splice(len(note.text), len(note.text), f"\n\n{section_start_marker}{new_section_content}\n")
+            except ValueError as e:
+                print(f"Error: Cannot update section '{section}' of {target_file_relative}: {e}. Skipping.")
                 return
 
+        updated_content_for_note = note.render()
+
         if _write_file_content(full_target_file_path, updated_content_for_note):
             print(f"Successfully updated note: {target_file_relative}")
 
@@ -429,24 +446,22 @@ def execute_refinement_suggestion(suggestion: dict, vault_root: str, refinement_
         updated_moc_content = existing_moc_content
         
         if action == "ADD_LINK":
-            section_heading_pattern = re.compile(rf"(^#{{1,6}}\s*{re.escape(section)}\s*\n)(.*?)(?=\n#{{1,6}} |\Z)", re.DOTALL | re.MULTILINE)
-            section_match = section_heading_pattern.search(existing_moc_content)
+            moc_note = Note(existing_moc_content)
+            heading = moc_note.find_heading(section)
 
             new_link = f"- [[{link_target}|{link_display_text}]]"
 
-            if section_match:
-                section_start_marker = section_match.group(1)
-                existing_section_content = section_match.group(2)
+            if heading:
+                section_start_marker, section_content_end = _section_span(moc_note, heading)
+                existing_section_content = moc_note.text[heading.end:section_content_end]
                 
                 # Check if the link already exists in the section
-                # Use a more robust check to find the link within existing_section_content
-                if re.search(re.escape(new_link), existing_section_content, re.DOTALL) is None: 
+                if new_link not in existing_section_content: 
                     # Replace the content of the matched section with new content including the link
-                    # Ensure new_section_content preserves existing structure and adds new link appropriately
                     # This might need refinement for list items vs. paragraphs. For now, simple append.
                     new_section_content_with_link = existing_section_content.strip() + "\n" + new_link
-                    updated_moc_content = section_heading_pattern.sub(f"{section_start_marker}{new_section_content_with_link.strip()}\n", existing_moc_content)
-                    if _write_file_content(full_target_file_path, updated_moc_content):
+                    moc_note.splice(heading.start, section_content_end, f"{section_start_marker}{new_section_content_with_link.strip()}\n")
+                    if _write_file_content(full_target_file_path, moc_note.render()):
                         print(f"Successfully added link to MOC: {target_file_relative} in section '{section}'")
                 else:
                     print(f"Link '{new_link}' already exists in {target_file_relative}. Skipping.")
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+# Content-addressed cache for LLM / Sub-Agent responses.
+# Keys are a SHA-256 over the model name, the prompt text and the contents of every input file,
+# so retries, --resume runs and repeated final/integrate invocations reuse earlier answers.
+
+CACHE_MODE_ENV = "GEMINI_CACHE_MODE" # use | bypass | refresh
+CACHE_DIR_ENV = "GEMINI_CACHE_DIR"
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+cache_lock = threading.Lock()
+cache_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+
+def _get_cache_dir() -> str:
+    default_dir = os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), "llm_cache")
+    return os.environ.get(CACHE_DIR_ENV, default_dir)
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+def get_cache_mode() -> str:
+    mode = os.environ.get(CACHE_MODE_ENV, "use").lower()
+    return mode if mode in ("use", "bypass", "refresh") else "use"
+
+def set_cache_mode(mode: str) -> None:
+    """Sets the cache mode for this process and every subprocess it spawns."""
+    os.environ[CACHE_MODE_ENV] = mode
+
+def compute_cache_key(prompt: str, model_name: str, input_files: dict = None) -> str:
+    """
+    Hashes the model name, prompt and the contents of every input file.
+    Input file aliases are part of the key because the prompt refers to them by name.
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(prompt.encode('utf-8'))
+
+    for alias in sorted(input_files or {}):
+        path = input_files[alias]
+        digest.update(b"\0" + alias.encode('utf-8') + b"\0")
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(65536), b""):
+                    digest.update(block)
+        except OSError:
+            digest.update(b"<missing>")
+
+    return digest.hexdigest()
+
+def get_cached_response(key: str):
+    """
+    Returns the cached response for key, or None on a miss, an expired entry or a non-'use' mode.
+    """
+    if get_cache_mode() != "use":
+        with cache_lock:
+            cache_stats["bypassed"] += 1
+        return None
+
+    entry_path = os.path.join(_get_cache_dir(), f"{key}.json")
+    ttl = _get_int_env("GEMINI_CACHE_TTL", DEFAULT_TTL_SECONDS)
+
+    try:
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        if time.time() - entry.get("created", 0) > ttl:
+            os.remove(entry_path)
+            entry = None
+    except (OSError, ValueError):
+        entry = None
+
+    with cache_lock:
+        if entry is None:
+            cache_stats["misses"] += 1
+            return None
+        cache_stats["hits"] += 1
+
+    # Touch so eviction is least-recently-used rather than oldest-created
+    try:
+        os.utime(entry_path, None)
+    except OSError:
+        pass
+    return entry.get("response")
+
+def store_response(key: str, model_name: str, response: str) -> None:
+    """Writes a response to the cache (atomically) and evicts entries beyond the size bounds."""
+    if get_cache_mode() == "bypass" or not response:
+        return
+
+    cache_dir = _get_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        entry_path = os.path.join(cache_dir, f"{key}.json")
+        temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"created": time.time(), "model": model_name, "response": response}, f)
+        os.replace(temp_path, entry_path)
+    except OSError as e:
+        print(f"Warning: Failed to write response cache entry: {e}")
+        return
+
+    with cache_lock:
+        cache_stats["stores"] += 1
+        _evict(cache_dir)
+
+def _evict(cache_dir: str) -> None:
+    """Removes least-recently-used entries until both the entry and byte limits are met."""
+    max_entries = _get_int_env("GEMINI_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+    max_bytes = _get_int_env("GEMINI_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+
+    entries = []
+    total_bytes = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total_bytes += stat.st_size
+
+    entries.sort()
+    while entries and (len(entries) > max_entries or total_bytes > max_bytes):
+        _, size, path = entries.pop(0)
+        try:
+            os.remove(path)
+            total_bytes -= size
+            cache_stats["evictions"] += 1
+        except OSError:
+            pass
+
+def cached_call(call_fn, prompt: str, model_name: str, input_files: dict = None, is_cacheable=None):
+    """
+    Returns a cached response for (prompt, model, input file contents) or performs call_fn()
+    and stores its result. is_cacheable(result) can veto storing (e.g. error strings).
+    """
+    key = compute_cache_key(prompt, model_name, input_files)
+    cached = get_cached_response(key)
+    if cached is not None:
+        print(f"[Cache] Hit ({key[:12]}). Skipping LLM call.")
+        return cached
+
+    result = call_fn()
+    if result and (is_cacheable is None or is_cacheable(result)):
+        store_response(key, model_name, result)
+    return result
+
+def get_cache_stats() -> dict:
+    with cache_lock:
+        return dict(cache_stats)
+
+def format_cache_stats() -> str:
+    stats = get_cache_stats()
+    return f"Response Cache: {stats['hits']} hits, {stats['misses']} misses, {stats['stores']} stored, {stats['evictions']} evicted (mode: {get_cache_mode()})."
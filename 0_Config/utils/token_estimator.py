@@ -0,0 +1,86 @@
+import os
+import re
+import json
+import threading
+
+# Offline token estimation for rate limiting and chunk sizing.
+# The heuristic is calibrated per model against the usage metadata returned with each response,
+# so TPM accounting needs no count_tokens round trip.
+
+CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]')
+
+CALIBRATION_SMOOTHING = 0.2 # Weight of the newest observation in the moving average
+MIN_CORRECTION = 0.25
+MAX_CORRECTION = 4.0
+
+calibration_lock = threading.Lock()
+correction_factors = None # {model_name: factor}, loaded lazily
+
+def estimate_tokens(text: str) -> int:
+    """
+    Uncalibrated estimate: CJK characters count roughly one token each,
+    everything else roughly four characters per token.
+    """
+    if not text:
+        return 0
+    cjk_count = len(CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+def _get_calibration_path() -> str:
+    return os.path.join(os.environ.get("GEMINI_TEMP_DIR", "."), "token_calibration.json")
+
+def _load_factors() -> dict:
+    global correction_factors
+    if correction_factors is None:
+        correction_factors = {}
+        try:
+            with open(_get_calibration_path(), 'r', encoding='utf-8') as f:
+                correction_factors = {k: float(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            pass
+    return correction_factors
+
+def get_correction_factor(model_name: str) -> float:
+    with calibration_lock:
+        return _load_factors().get(model_name, 1.0)
+
+def estimate_prompt_tokens(text: str, model_name: str) -> int:
+    """Heuristic estimate scaled by the model's learned correction factor."""
+    return max(int(round(estimate_tokens(text) * get_correction_factor(model_name))), 1)
+
+def record_actual_usage(model_name: str, text: str, actual_tokens: int) -> None:
+    """
+    Folds an observed (heuristic, actual) pair for model_name into its correction factor
+    and persists the factors so later processes start calibrated.
+    """
+    heuristic = estimate_tokens(text)
+    if not heuristic or not actual_tokens:
+        return
+
+    observed = min(max(actual_tokens / heuristic, MIN_CORRECTION), MAX_CORRECTION)
+    with calibration_lock:
+        factors = _load_factors()
+        previous = factors.get(model_name)
+        factors[model_name] = observed if previous is None else (1 - CALIBRATION_SMOOTHING) * previous + CALIBRATION_SMOOTHING * observed
+
+        path = _get_calibration_path()
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(factors, f, indent=2)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: Failed to save token calibration: {e}")
+
+def read_usage_metadata(response) -> (int, int):
+    """
+    Returns (prompt_tokens, output_tokens) from a Gemini response's usage_metadata,
+    or (0, 0) when the response does not carry it.
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    if not usage:
+        return 0, 0
+    prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+    output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+    return int(prompt_tokens), int(output_tokens)